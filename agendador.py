@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Arquivo: agendador.py
+
+# Agendador de tarefas da GUI: um pool limitado executa as tarefas na ordem
+# em que foram pedidas, cada uma com estado, progresso, cancelamento e o
+# próprio log. A tarefa em execução fica em uma ContextVar, então o 'print'
+# de qualquer função (inclusive em threads que copiam o contexto, como as do
+# asyncio.to_thread e do BaixadorConcorrente) vai para o log dela, sem trocar
+# o sys.stdout a cada tarefa. O cancelamento é cooperativo: as funções longas
+# chamam 'verificar_cancelamento()' nos pontos em que é seguro parar.
+
+import sys
+import time
+import itertools
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+NA_FILA = 'na fila'
+EXECUTANDO = 'executando'
+CONCLUIDA = 'concluída'
+FALHOU = 'falhou'
+CANCELADA = 'cancelada'
+
+# Linhas de log guardadas por tarefa
+MAX_LINHAS_LOG_TAREFA = 5000
+
+_TAREFA_ATUAL = contextvars.ContextVar('tarefa_atual', default=None)
+
+
+class TarefaCancelada(BaseException):
+    """
+    Levantada por 'verificar_cancelamento' quando a tarefa foi cancelada. Herda de BaseException
+    (como KeyboardInterrupt) para atravessar os 'except Exception' dos modos e parar a tarefa.
+    """
+
+
+def tarefa_atual():
+    """Tarefa em execução no contexto atual, ou None fora do agendador."""
+    return _TAREFA_ATUAL.get()
+
+
+def verificar_cancelamento():
+    """Levanta TarefaCancelada se a tarefa atual foi cancelada; fora do agendador não faz nada."""
+    tarefa = _TAREFA_ATUAL.get()
+    if tarefa is not None and tarefa.cancelamento.is_set():
+        raise TarefaCancelada()
+
+
+def informar_progresso(feito, total=None):
+    """Atualiza o progresso da tarefa atual (ex.: downloads concluídos de 'total')."""
+    tarefa = _TAREFA_ATUAL.get()
+    if tarefa is not None:
+        tarefa.progresso = (feito, total)
+        tarefa.agendador._notificar(tarefa)
+
+
+class Tarefa:
+    """Uma execução pedida ao agendador: estado, progresso (feito, total), log e tempos."""
+
+    def __init__(self, agendador, identificador, nome):
+        self.agendador = agendador
+        self.id = identificador
+        self.nome = nome
+        self.estado = NA_FILA
+        self.progresso = None
+        self.erro = None
+        self.log = deque(maxlen=MAX_LINHAS_LOG_TAREFA)
+        self.cancelamento = threading.Event()
+        self.criada_em = time.time()
+        self.inicio = None
+        self.fim = None
+        self.futuro = None
+        self._parcial = ''
+
+    @property
+    def ativa(self):
+        return self.estado in (NA_FILA, EXECUTANDO)
+
+    def texto_progresso(self):
+        if self.progresso is None:
+            return ''
+        feito, total = self.progresso
+        return f"{feito}/{total}" if total else str(feito)
+
+    def escrever(self, texto):
+        """Recebe a saída de 'print' e entrega ao agendador uma linha completa de cada vez."""
+        linhas = (self._parcial + texto).split('\n')
+        self._parcial = linhas.pop()
+        for linha in linhas:
+            if linha.strip():
+                self.log.append(linha)
+                self.agendador._notificar(self, linha)
+
+    def cancelar(self):
+        """Tira a tarefa da fila ou pede que ela pare no próximo ponto de verificação."""
+        self.cancelamento.set()
+        if self.futuro is not None and self.futuro.cancel():
+            self.estado = CANCELADA
+            self.fim = time.time()
+            self.agendador._notificar(self)
+
+
+class _SaidaPorTarefa:
+    """Substituto do sys.stdout que envia cada escrita para o log da tarefa do contexto atual."""
+
+    def __init__(self, original):
+        self.original = original
+
+    def write(self, texto):
+        tarefa = _TAREFA_ATUAL.get()
+        if tarefa is None:
+            return self.original.write(texto)
+        tarefa.escrever(texto)
+        return len(texto)
+
+    def flush(self):
+        if _TAREFA_ATUAL.get() is None:
+            self.original.flush()
+
+
+class AgendadorTarefas:
+    """
+    Fila de tarefas com no máximo 'max_workers' em execução. 'ao_atualizar(tarefa, linha)' é
+    chamado a partir das threads de trabalho a cada mudança de estado/progresso (linha None)
+    e a cada linha de log; quem mexe em widgets deve só enfileirar a notificação.
+    """
+
+    def __init__(self, max_workers=1, ao_atualizar=None):
+        self.ao_atualizar = ao_atualizar
+        self.tarefas = []
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        if not isinstance(sys.stdout, _SaidaPorTarefa):
+            sys.stdout = _SaidaPorTarefa(sys.stdout)
+
+    def _notificar(self, tarefa, linha=None):
+        if self.ao_atualizar:
+            self.ao_atualizar(tarefa, linha)
+
+    def enviar(self, nome, funcao, *args, **kwargs):
+        """Enfileira 'funcao(*args, **kwargs)' como uma nova tarefa e a devolve."""
+        with self._lock:
+            tarefa = Tarefa(self, next(self._ids), nome)
+            self.tarefas.append(tarefa)
+        tarefa.futuro = self._executor.submit(self._executar, tarefa, funcao, args, kwargs)
+        self._notificar(tarefa)
+        return tarefa
+
+    def _executar(self, tarefa, funcao, args, kwargs):
+        if tarefa.cancelamento.is_set():
+            # Cancelada depois de sair da fila do pool, quando 'futuro.cancel()' já não a alcança
+            tarefa.estado = CANCELADA
+            tarefa.fim = time.time()
+            self._notificar(tarefa)
+            return
+        token = _TAREFA_ATUAL.set(tarefa)
+        tarefa.estado = EXECUTANDO
+        tarefa.inicio = time.time()
+        self._notificar(tarefa)
+        try:
+            funcao(*args, **kwargs)
+            tarefa.estado = CONCLUIDA
+        except TarefaCancelada:
+            tarefa.estado = CANCELADA
+        except Exception as e:
+            tarefa.estado = FALHOU
+            tarefa.erro = str(e)
+            tarefa.escrever(f"Erro: {e}\n")
+        finally:
+            tarefa.escrever('\n')
+            tarefa.fim = time.time()
+            _TAREFA_ATUAL.reset(token)
+            self._notificar(tarefa)
+
+    def esquecer(self, tarefa):
+        """Tira uma tarefa terminada da lista, para processos longos não acumularem histórico."""
+        with self._lock:
+            if tarefa in self.tarefas:
+                self.tarefas.remove(tarefa)
+
+    def cancelar_todas(self):
+        for tarefa in list(self.tarefas):
+            if tarefa.ativa:
+                tarefa.cancelar()
+
+    def encerrar(self):
+        """Cancela tudo e libera o pool sem esperar as tarefas em execução."""
+        self.cancelar_todas()
+        self._executor.shutdown(wait=False, cancel_futures=True)
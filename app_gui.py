@@ -5,18 +5,28 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox
 import threading
-import requests
-from bs4 import BeautifulSoup
-import urllib.parse
+import queue
 import os
 import csv
 import io
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk
 import pandas as pd
 
 # Importa as funções do nosso outro arquivo
 # (Assumimos que extrator_ia.py está na mesma pasta que app_gui.py)
-from extrator_ia import treinar_modelo, prever_e_baixar, extract_features
+from extrator_ia import (treinar_modelo, prever_e_baixar, extrair_pagina, criar_sessao, sondar_imagem,
+                         carregar_modelo, adicionar_dimensoes_reais, triar_candidatos, LIMIAR_CONFIANCA_PADRAO)
+from cache_http import CacheHTTP
+from indice_conteudo import IndiceConteudo
+from caracteristicas_visuais import ExtratorVisual
+from servico import ClienteServico, imprimir_resultado, ENDERECO_PADRAO
+from metricas import METRICAS
+from agendador import AgendadorTarefas, CONCLUIDA, FALHOU, CANCELADA
+from armazenamento_dataset import DatasetSegmentado, COLUNAS_DATASET
+from treino_incremental import treinar_modelo_incremental
+from busca_hiperparametros import buscar_hiperparametros
 
 # ==============================================================================
 # SEÇÃO DE CONFIGURAÇÃO DE CAMINHOS ABSOLUTOS
@@ -27,75 +37,310 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 # Define os nomes das subpastas para organização
 DATA_DIR = os.path.join(BASE_DIR, "data")
 MODELS_DIR = os.path.join(BASE_DIR, "models")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+ARQUIVO_INDICE = os.path.join(DATA_DIR, "indice_conteudo.sqlite3")
+ARQUIVO_VISUAIS = os.path.join(DATA_DIR, "caracteristicas_visuais.sqlite3")
+ARQUIVO_METRICAS = os.path.join(DATA_DIR, "metricas.jsonl")
+ARQUIVO_PROMETHEUS = os.path.join(DATA_DIR, "metricas.prom")
+ENDERECO_SERVICO = ENDERECO_PADRAO  # Serviço residente (python servico.py) usado por "Prever & Baixar"
 
 # Cria os caminhos completos para os arquivos
-ARQUIVO_DATASET = os.path.join(DATA_DIR, "image_dataset_features.csv")
+DIRETORIO_DATASET = os.path.join(DATA_DIR, "dataset")
+ARQUIVO_DATASET = os.path.join(DATA_DIR, "image_dataset_features.csv")  # CSV antigo, importado uma única vez
 ARQUIVO_MODELO = os.path.join(MODELS_DIR, "image_model.joblib")
 
 # Cria as subpastas 'data' e 'models' se elas não existirem
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(MODELS_DIR, exist_ok=True)
 
+# Configuração do pipeline de miniaturas da janela de seleção
+TAMANHO_MINIATURA = (100, 100)
+LIMITE_BYTES_IMAGEM = 8 * 1024 * 1024  # Corpos maiores que isso são descartados
+MAX_DOWNLOADS_MINIATURA = 8
+MAX_MINIATURAS_EM_MEMORIA = 200  # LRU de PhotoImage da janela de seleção
+ALTURA_LINHA_SELECAO = 130  # Altura fixa (px) de cada linha da janela de seleção
+LINHAS_PRE_CARREGADAS = 10  # Miniaturas pedidas além das linhas visíveis
+
+# Intervalos (ms) das atualizações periódicas da janela principal
+INTERVALO_LOG_MS = 100
+INTERVALO_PAINEL_MS = 1000
+MAX_TAREFAS_SIMULTANEAS = 1  # Coleta, treino e previsão entram em fila em vez de rodarem ao mesmo tempo
+
 
+# ==============================================================================
+# SEÇÃO DO PIPELINE DE MINIATURAS
 # ==============================================================================
 
+def baixar_com_limite(sessao, url, limite_bytes=LIMITE_BYTES_IMAGEM, timeout=5, cache=None):
+    """Baixa o corpo de uma imagem em blocos, abortando se ultrapassar 'limite_bytes'."""
+    if cache:
+        # Parar no limite fecha os blocos: a conexão é liberada e nada vai para o cache
+        _, _, blocos = cache.obter_em_blocos(url, sessao, timeout=timeout)
+        buffer = io.BytesIO()
+        try:
+            for bloco in blocos:
+                buffer.write(bloco)
+                if buffer.tell() > limite_bytes:
+                    raise ValueError(f"imagem excede {limite_bytes} bytes")
+        finally:
+            blocos.close()
+        return buffer.getvalue()
+    with sessao.get(url, timeout=timeout, stream=True) as img_resp:
+        img_resp.raise_for_status()
+        tamanho_declarado = int(img_resp.headers.get('Content-Length') or 0)
+        if tamanho_declarado > limite_bytes:
+            raise ValueError(f"imagem muito grande ({tamanho_declarado} bytes)")
+        buffer = io.BytesIO()
+        for bloco in img_resp.iter_content(chunk_size=64 * 1024):
+            buffer.write(bloco)
+            if buffer.tell() > limite_bytes:
+                raise ValueError(f"imagem excede {limite_bytes} bytes")
+        return buffer.getvalue()
+
+
+def decodificar_miniatura(img_data, tamanho=TAMANHO_MINIATURA):
+    """Decodifica só o necessário para a miniatura (modo draft em JPEGs) e guarda as dimensões reais."""
+    img_obj = Image.open(io.BytesIO(img_data))
+    resultado = {'real_width': img_obj.width, 'real_height': img_obj.height, 'format': img_obj.format}
+    if img_obj.format == 'JPEG':
+        img_obj.draft('RGB', tamanho)
+    img_obj.thumbnail(tamanho)
+    resultado['imagem'] = img_obj
+    return resultado
+
+
+class PipelineMiniaturas:
+    """
+    Pipeline em dois estágios: downloads concorrentes (I/O) alimentam um pool de
+    decodificação (CPU). As miniaturas são pedidas sob demanda com 'solicitar(indices)',
+    e cada uma é entregue a 'ao_concluir(indice, resultado)' assim que fica pronta;
+    'resultado' é None quando a imagem falha e traz 'imagem' None quando só foi possível
+    sondar as dimensões pelo cabeçalho. Pedidos que saíram da área visível antes de
+    começar são descartados e podem ser feitos de novo depois. Com 'visuais'
+    (ExtratorVisual), os descritores de cada imagem decodificada vão para o cache visual.
+    """
+
+    def __init__(self, sessao, urls, ao_concluir, max_downloads=MAX_DOWNLOADS_MINIATURA, max_decodificadores=None,
+                 cache=None, visuais=None):
+        self.sessao = sessao
+        self.urls = urls
+        self.cache = cache
+        self.visuais = visuais
+        self.ao_concluir = ao_concluir
+        self.cancelado = threading.Event()
+        self._downloads = ThreadPoolExecutor(max_workers=max_downloads)
+        self._decodificacao = ThreadPoolExecutor(max_workers=max_decodificadores or os.cpu_count() or 2)
+        self._desejados = set()
+        self._em_andamento = set()
+        self._lock = threading.Lock()
+
+    def solicitar(self, indices):
+        """Passa a querer só as miniaturas de 'indices' e agenda as que ainda não estão a caminho."""
+        with self._lock:
+            self._desejados = set(indices)
+            novos = [indice for indice in indices if indice not in self._em_andamento]
+            self._em_andamento.update(novos)
+        for indice in novos:
+            self._downloads.submit(self._buscar, indice)
+
+    def _buscar(self, indice):
+        with self._lock:
+            if self.cancelado.is_set() or indice not in self._desejados:
+                self._em_andamento.discard(indice)
+                return
+        url = self.urls[indice]
+        try:
+            img_data = baixar_com_limite(self.sessao, url, cache=self.cache)
+            self._decodificacao.submit(self._decodificar, indice, img_data)
+        except Exception:
+            # Sem prévia (ex.: corpo acima do limite), mas ainda dá para ler as dimensões do cabeçalho
+            resultado = sondar_imagem(url, self.sessao, cache=self.cache)
+            if resultado:
+                resultado['imagem'] = None
+            self._finalizar(indice, resultado)
+
+    def _decodificar(self, indice, img_data):
+        if self.cancelado.is_set():
+            return self._finalizar(indice, None)
+        try:
+            resultado = decodificar_miniatura(img_data)
+        except Exception:
+            resultado = None
+        self._finalizar(indice, resultado)
+        if resultado and self.visuais and not self.cancelado.is_set():
+            # Aproveita os bytes já baixados em vez de baixar a imagem de novo no treino
+            try:
+                self.visuais.registrar(self.urls[indice], img_data)
+            except Exception:
+                pass
+
+    def _finalizar(self, indice, resultado):
+        with self._lock:
+            self._em_andamento.discard(indice)
+        if not self.cancelado.is_set():
+            self.ao_concluir(indice, resultado)
+
+    def encerrar(self):
+        """Cancela o que ainda não começou e libera os pools sem bloquear a interface."""
+        self.cancelado.set()
+        self._downloads.shutdown(wait=False, cancel_futures=True)
+        self._decodificacao.shutdown(wait=False, cancel_futures=True)
+
+
+# ==============================================================================
 
-# --- Classe da Janela de Seleção (sem alterações) ---
+
+# --- Classe da Janela de Seleção ---
 class SelectionWindow(tk.Toplevel):
-    # ... (cole aqui a classe SelectionWindow completa da resposta anterior)
-    def __init__(self, parent, image_list, callback):
+    """
+    Janela de seleção virtualizada: só as linhas visíveis têm widgets, que são reciclados
+    durante a rolagem. A seleção fica em um bytearray (um byte por imagem) e as miniaturas
+    são pedidas sob demanda por 'solicitar_miniaturas(indices)', ficando em um LRU limitado.
+    'pre_selecionadas' são os índices que já abrem marcados (ex.: positivos confiantes do modelo).
+    """
+
+    def __init__(self, parent, image_list, callback, ao_fechar=None, solicitar_miniaturas=None,
+                 pre_selecionadas=()):
         super().__init__(parent)
         self.title("Selecione as Imagens para o Dataset")
         self.geometry("800x600")
 
         self.image_list = image_list
         self.callback = callback
-        self.check_vars = []
-
-        canvas = tk.Canvas(self)
-        scrollbar = ttk.Scrollbar(self, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        for i, img_info in enumerate(self.image_list):
-            item_frame = ttk.Frame(scrollable_frame, borderwidth=1, relief="solid", padding=5)
-            item_frame.pack(fill="x", padx=10, pady=5)
-
-            var = tk.BooleanVar()
-            self.check_vars.append(var)
-            cb = ttk.Checkbutton(item_frame, text=f"[{i + 1}]", variable=var)
-            cb.pack(side="left", anchor="n", padx=10)
-
-            if img_info.get('thumbnail'):
-                img_label = ttk.Label(item_frame, image=img_info['thumbnail'])
-                img_label.pack(side="right", padx=10)
-
-            width = img_info.get('real_width') or img_info.get('width', 'N/A')
-            height = img_info.get('real_height') or img_info.get('height', 'N/A')
-
-            info_text = (f"URL: {img_info['url']}\nDimensões: {width} x {height}\n"
-                         f"Formato: {img_info.get('format', 'N/A')}\nAlt Text: {img_info.get('alt', 'N/A')}")
-            info_label = ttk.Label(item_frame, text=info_text, wraplength=550, justify="left")
-            info_label.pack(side="left", fill="x", expand=True)
+        self.ao_fechar = ao_fechar
+        self.solicitar_miniaturas = solicitar_miniaturas
+        self.selecionadas = bytearray(len(image_list))
+        for indice in pre_selecionadas:
+            self.selecionadas[indice] = 1
+        self.miniaturas = OrderedDict()  # indice -> PhotoImage (ou None quando não há prévia)
+        self.linhas = []  # Widgets reciclados; cada linha mostra a imagem 'indice'
 
         confirm_button = ttk.Button(self, text="Confirmar Seleção e Salvar", command=self.confirm_and_save)
-        confirm_button.pack(pady=10)
-        canvas.pack(side="left", fill="both", expand=True)
+        confirm_button.pack(side="bottom", pady=10)
+        self.canvas = tk.Canvas(self, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=lambda *pos: (scrollbar.set(*pos), self._renderizar()),
+                              scrollregion=(0, 0, 0, len(image_list) * ALTURA_LINHA_SELECAO),
+                              yscrollincrement=ALTURA_LINHA_SELECAO // 2)
+        self.canvas.bind("<Configure>", self._ao_redimensionar)
+        self._ligar_rolagem(self.canvas)
+        self.canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
+        self.protocol("WM_DELETE_WINDOW", self.fechar)
         self.transient(parent)
         self.grab_set()
 
+    def _ligar_rolagem(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+        widget.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        widget.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+
+    def _criar_linha(self):
+        item_frame = ttk.Frame(self.canvas, borderwidth=1, relief="solid", padding=5)
+        linha = {'frame': item_frame, 'indice': None, 'var': tk.IntVar()}
+        linha['check'] = ttk.Checkbutton(item_frame, variable=linha['var'],
+                                         command=lambda: self._alternar(linha))
+        linha['check'].pack(side="left", anchor="n", padx=10)
+        linha['imagem'] = ttk.Label(item_frame, text="Carregando...", width=14, anchor="center")
+        linha['imagem'].pack(side="right", padx=10)
+        linha['info'] = ttk.Label(item_frame, wraplength=550, justify="left")
+        linha['info'].pack(side="left", fill="x", expand=True)
+        for widget in (item_frame, linha['check'], linha['imagem'], linha['info']):
+            self._ligar_rolagem(widget)
+        linha['item'] = self.canvas.create_window(10, 0, window=item_frame, anchor="nw",
+                                                  width=max(self.canvas.winfo_width() - 20, 1),
+                                                  height=ALTURA_LINHA_SELECAO - 10)
+        return linha
+
+    def _alternar(self, linha):
+        self.selecionadas[linha['indice']] = linha['var'].get()
+
+    def _ao_redimensionar(self, event):
+        for linha in self.linhas:
+            self.canvas.itemconfigure(linha['item'], width=max(event.width - 20, 1))
+        self._renderizar()
+
+    def _renderizar(self):
+        """Posiciona as linhas recicladas sobre as imagens visíveis e pede as miniaturas que faltam."""
+        topo = int(self.canvas.canvasy(0))
+        primeira = max(topo // ALTURA_LINHA_SELECAO, 0)
+        ultima = min(len(self.image_list), (topo + self.canvas.winfo_height()) // ALTURA_LINHA_SELECAO + 1)
+        while len(self.linhas) < ultima - primeira:
+            self.linhas.append(self._criar_linha())
+        for k, linha in enumerate(self.linhas):
+            indice = primeira + k
+            if indice >= ultima:
+                self.canvas.itemconfigure(linha['item'], state="hidden")
+                continue
+            if linha['indice'] != indice:
+                self._preencher(linha, indice)
+            self.canvas.coords(linha['item'], 10, indice * ALTURA_LINHA_SELECAO + 5)
+            self.canvas.itemconfigure(linha['item'], state="normal")
+        if self.solicitar_miniaturas:
+            fim = min(len(self.image_list), ultima + LINHAS_PRE_CARREGADAS)
+            self.solicitar_miniaturas([i for i in range(primeira, fim) if i not in self.miniaturas])
+
+    def _preencher(self, linha, indice):
+        linha['indice'] = indice
+        linha['var'].set(self.selecionadas[indice])
+        linha['check'].configure(text=f"[{indice + 1}]")
+        linha['info'].configure(text=self._texto_info(self.image_list[indice]))
+        self._mostrar_miniatura(linha)
+
+    def _mostrar_miniatura(self, linha):
+        indice = linha['indice']
+        if indice not in self.miniaturas:
+            linha['imagem'].configure(image="", text="Carregando...")
+            return
+        self.miniaturas.move_to_end(indice)
+        foto = self.miniaturas[indice]
+        if foto is None:
+            linha['imagem'].configure(image="", text="Sem prévia")
+        else:
+            linha['imagem'].configure(image=foto, text="")
+
+    @staticmethod
+    def _texto_info(img_info):
+        width = img_info.get('real_width') or img_info.get('width', 'N/A')
+        height = img_info.get('real_height') or img_info.get('height', 'N/A')
+        texto = (f"URL: {img_info['url']}\nDimensões: {width} x {height}\n"
+                 f"Formato: {img_info.get('format', 'N/A')}\nAlt Text: {img_info.get('alt', 'N/A')}")
+        if img_info.get('probabilidade') is not None:
+            texto += f"\nConfiança do modelo: {img_info['probabilidade']:.0%}"
+        return texto
+
+    def atualizar_miniatura(self, indice, resultado):
+        """Chamado na thread da interface quando a miniatura 'indice' fica pronta (ou falha)."""
+        if not self.winfo_exists():
+            return
+        if resultado is not None:
+            img_info = self.image_list[indice]
+            for chave in ('real_width', 'real_height', 'format'):
+                img_info[chave] = resultado[chave]
+        foto = None
+        if resultado is not None and resultado['imagem'] is not None:
+            foto = ImageTk.PhotoImage(resultado['imagem'])
+        self.miniaturas[indice] = foto
+        while len(self.miniaturas) > MAX_MINIATURAS_EM_MEMORIA:
+            self.miniaturas.popitem(last=False)
+        for linha in self.linhas:
+            if linha['indice'] == indice:
+                linha['info'].configure(text=self._texto_info(self.image_list[indice]))
+                self._mostrar_miniatura(linha)
+
+    def fechar(self):
+        if self.ao_fechar:
+            self.ao_fechar()
+        self.destroy()
+
     def confirm_and_save(self):
         labeled_data = []
         for i, img_info in enumerate(self.image_list):
-            label = 1 if self.check_vars[i].get() else 0
-            img_info['selected'] = label
+            img_info['selected'] = self.selecionadas[i]
             img_info.pop('thumbnail', None)
             labeled_data.append(img_info)
         self.callback(labeled_data)
-        self.destroy()
+        self.fechar()
 
 
 # --- Classe Principal da Aplicação ---
@@ -104,7 +349,7 @@ class App(tk.Tk):
         super().__init__()
         # ... (cole aqui o método __init__ completo da resposta anterior)
         self.title("Extrator de Imagens com IA")
-        self.geometry("700x500")
+        self.geometry("750x680")
         self.frame = ttk.Frame(self, padding="10")
         self.frame.pack(fill=tk.BOTH, expand=True)
         ttk.Label(self.frame, text="URL da Página Web:").pack(anchor="w")
@@ -119,22 +364,155 @@ class App(tk.Tk):
         self.btn_treinar.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
         self.btn_prever = ttk.Button(button_frame, text="Prever & Baixar", command=self.iniciar_previsao)
         self.btn_prever.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
+        self.treino_incremental = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.frame, text="Treino incremental (processa só as linhas novas)",
+                        variable=self.treino_incremental).pack(anchor="w")
+        self.busca_hiperparametros = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.frame, text="Buscar hiperparâmetros (validação cruzada; mais lento, salva um relatório)",
+                        variable=self.busca_hiperparametros).pack(anchor="w")
+        self.usar_visuais = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.frame, text="Treinar também com o conteúdo das imagens (histogramas de cor)",
+                        variable=self.usar_visuais).pack(anchor="w")
+        self.usar_servico = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.frame, text=f"Prever pelo serviço residente ({ENDERECO_SERVICO})",
+                        variable=self.usar_servico).pack(anchor="w")
+        triagem_frame = ttk.Frame(self.frame)
+        triagem_frame.pack(anchor="w")
+        self.coleta_assistida = tk.BooleanVar(value=True)
+        ttk.Checkbutton(triagem_frame, text="Coleta assistida pelo modelo (mostra só as imagens incertas); limiar:",
+                        variable=self.coleta_assistida).pack(side=tk.LEFT)
+        self.limiar_confianca = tk.DoubleVar(value=LIMIAR_CONFIANCA_PADRAO)
+        ttk.Spinbox(triagem_frame, from_=0.5, to=0.99, increment=0.05, width=5,
+                    textvariable=self.limiar_confianca).pack(side=tk.LEFT, padx=5)
+        painel = ttk.LabelFrame(self.frame, text="Estatísticas", padding=5)
+        painel.pack(fill=tk.X, pady=5)
+        self.texto_estatisticas = tk.StringVar(value="Nenhuma atividade ainda.")
+        ttk.Label(painel, textvariable=self.texto_estatisticas, font="TkFixedFont", justify="left",
+                  wraplength=650).pack(anchor="w")
+        # Opcional, como o --metricas da linha de comando: o JSON-lines cresce a cada evento
+        self.exportar_metricas = tk.BooleanVar(value=False)
+        ttk.Checkbutton(painel, text="Exportar métricas (data/metricas.jsonl e data/metricas.prom)",
+                        variable=self.exportar_metricas, command=self.alternar_exportacao_metricas).pack(anchor="w")
+        painel_tarefas = ttk.LabelFrame(self.frame, text="Tarefas", padding=5)
+        painel_tarefas.pack(fill=tk.X, pady=5)
+        self.lista_tarefas = ttk.Treeview(painel_tarefas, columns=("tarefa", "estado", "progresso"), height=4)
+        self.lista_tarefas.heading("#0", text="#")
+        self.lista_tarefas.column("#0", width=40, stretch=False)
+        for coluna, titulo, largura in (("tarefa", "Tarefa", 300), ("estado", "Estado", 120),
+                                        ("progresso", "Progresso", 100)):
+            self.lista_tarefas.heading(coluna, text=titulo)
+            self.lista_tarefas.column(coluna, width=largura)
+        self.lista_tarefas.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        botoes_tarefas = ttk.Frame(painel_tarefas)
+        botoes_tarefas.pack(side=tk.RIGHT, padx=5)
+        ttk.Button(botoes_tarefas, text="Cancelar selecionada", command=self.cancelar_tarefa).pack(fill=tk.X)
+        ttk.Button(botoes_tarefas, text="Cancelar todas", command=self.cancelar_todas).pack(fill=tk.X, pady=5)
         ttk.Label(self.frame, text="Status:").pack(anchor="w")
         self.log_area = scrolledtext.ScrolledText(self.frame, wrap=tk.WORD, height=15)
         self.log_area.pack(fill=tk.BOTH, expand=True, pady=5)
         self.log_area.configure(state='disabled')
+        # As threads só enfileiram mensagens e chamadas; a thread da interface as processa em lotes
+        self.fila_interface = queue.Queue()
+        self.tarefas = {}
+        self.agendador = AgendadorTarefas(MAX_TAREFAS_SIMULTANEAS, ao_atualizar=self._ao_atualizar_tarefa)
+        self.after(INTERVALO_LOG_MS, self.drenar_fila)
+        self.protocol("WM_DELETE_WINDOW", self.fechar)
+        self.after(INTERVALO_PAINEL_MS, self.atualizar_painel)
+        self.cache = CacheHTTP(CACHE_DIR)
+        self.indice = IndiceConteudo(ARQUIVO_INDICE)
+        self.visuais = ExtratorVisual(ARQUIVO_VISUAIS)
+        self.dataset = DatasetSegmentado(DIRETORIO_DATASET)
+        if len(self.dataset) == 0 and os.path.exists(ARQUIVO_DATASET):
+            self.dataset.importar_csv(ARQUIVO_DATASET)
+        # Aquece o modelo em segundo plano para que o primeiro "Prever & Baixar" não pague o unpickle
+        if os.path.exists(ARQUIVO_MODELO):
+            self.enviar_tarefa("Carregar modelo", carregar_modelo, ARQUIVO_MODELO)
 
     def log(self, message):
-        # ... (função log sem alterações)
-        self.log_area.configure(state='normal')
-        self.log_area.insert(tk.END, message + "\n")
-        self.log_area.configure(state='disabled')
-        self.log_area.see(tk.END)
+        """Pode ser chamada de qualquer thread: a mensagem aparece no próximo 'drenar_fila'."""
+        self.fila_interface.put(('log', message))
 
-    def run_task_in_thread(self, task_function, *args):
-        # ... (função run_task_in_thread sem alterações)
-        thread = threading.Thread(target=task_function, args=args)
-        thread.start()
+    def na_interface(self, funcao):
+        """Agenda 'funcao()' na thread da interface; seguro para chamar de qualquer thread."""
+        self.fila_interface.put(('chamar', funcao))
+
+    def _ao_atualizar_tarefa(self, tarefa, linha):
+        # Chamado pelas threads do agendador: só enfileira
+        if linha is None:
+            self.fila_interface.put(('tarefa', tarefa))
+        else:
+            self.fila_interface.put(('log', f"[#{tarefa.id}] {linha}"))
+
+    def drenar_fila(self):
+        """Processa tudo o que as threads enfileiraram desde a última vez, com uma inserção só no log."""
+        mensagens = []
+        tarefas = {}
+        while True:
+            try:
+                tipo, valor = self.fila_interface.get_nowait()
+            except queue.Empty:
+                break
+            if tipo == 'log':
+                mensagens.append(valor)
+            elif tipo == 'tarefa':
+                tarefas[valor.id] = valor
+            else:
+                valor()
+        for tarefa in tarefas.values():
+            self._mostrar_tarefa(tarefa, mensagens)
+        if mensagens:
+            self.log_area.configure(state='normal')
+            self.log_area.insert(tk.END, "\n".join(mensagens) + "\n")
+            self.log_area.configure(state='disabled')
+            self.log_area.see(tk.END)
+        self.after(INTERVALO_LOG_MS, self.drenar_fila)
+
+    def _mostrar_tarefa(self, tarefa, mensagens):
+        valores = (tarefa.nome, tarefa.estado, tarefa.texto_progresso())
+        item = str(tarefa.id)
+        if self.lista_tarefas.exists(item):
+            self.lista_tarefas.item(item, values=valores)
+        else:
+            self.lista_tarefas.insert("", 0, iid=item, text=item, values=valores)
+            self.tarefas[tarefa.id] = tarefa
+        if tarefa.estado in (CONCLUIDA, FALHOU, CANCELADA) and tarefa.fim and not getattr(tarefa, 'anunciada', False):
+            tarefa.anunciada = True
+            duracao = f" em {tarefa.fim - tarefa.inicio:.1f}s" if tarefa.inicio else ""
+            mensagens.append(f"--- [#{tarefa.id}] {tarefa.nome}: {tarefa.estado.upper()}{duracao} ---")
+
+    def enviar_tarefa(self, nome, funcao, *args):
+        """Coloca 'funcao(*args)' na fila do agendador; o 'print' dela vai para o log com o número da tarefa."""
+        return self.agendador.enviar(nome, funcao, *args)
+
+    def cancelar_tarefa(self):
+        for item in self.lista_tarefas.selection():
+            tarefa = self.tarefas.get(int(item))
+            if tarefa and tarefa.ativa:
+                self.log(f"Cancelando a tarefa #{tarefa.id} ({tarefa.nome})...")
+                tarefa.cancelar()
+
+    def cancelar_todas(self):
+        self.log("Cancelando todas as tarefas...")
+        self.agendador.cancelar_todas()
+
+    def fechar(self):
+        self.agendador.encerrar()
+        self.destroy()
+
+    def alternar_exportacao_metricas(self):
+        if self.exportar_metricas.get():
+            METRICAS.registrar_em(ARQUIVO_METRICAS)
+        else:
+            METRICAS.parar_registro()
+
+    def atualizar_painel(self):
+        """Atualiza o painel de estatísticas e, se pedido, exporta as métricas, no ritmo de INTERVALO_PAINEL_MS."""
+        self.texto_estatisticas.set(METRICAS.resumo())
+        if self.exportar_metricas.get():
+            METRICAS.descarregar()
+            # Sem atividade, o arquivo do Prometheus não é regravado
+            METRICAS.salvar_prometheus(ARQUIVO_PROMETHEUS)
+        self.after(INTERVALO_PAINEL_MS, self.atualizar_painel)
 
     def iniciar_coleta(self):
         # ... (cole aqui a função iniciar_coleta completa da resposta anterior)
@@ -144,98 +522,91 @@ class App(tk.Tk):
             return
 
         self.log(f"--- Buscando e processando imagens em: {url} (Isso pode demorar)... ---")
+        assistida = self.coleta_assistida.get() and os.path.exists(ARQUIVO_MODELO)
+        limiar = self.limiar_confianca.get()
 
         def scrape_and_process_images():
             try:
-                resp = requests.get(url)
-                resp.raise_for_status()
-                soup = BeautifulSoup(resp.text, 'html.parser')
-
-                features_list = []
-                image_tags = soup.find_all('img')
-
-                for i, img_tag in enumerate(image_tags):
-                    self.log(f"Processando imagem {i + 1}/{len(image_tags)}...")
-                    features = extract_features(img_tag, resp.url)
-                    if not features: continue
-
-                    try:
-                        img_resp = requests.get(features['url'], timeout=5, stream=True)
-                        img_resp.raise_for_status()
-                        img_data = img_resp.raw.read()
-                        img_obj = Image.open(io.BytesIO(img_data))
-                        features['real_width'] = img_obj.width
-                        features['real_height'] = img_obj.height
-                        features['format'] = img_obj.format
-                        img_obj.thumbnail((100, 100))
-                        features['thumbnail'] = ImageTk.PhotoImage(img_obj)
-                    except Exception:
-                        features['thumbnail'] = None
-
-                    features_list.append(features)
+                sessao = criar_sessao(MAX_DOWNLOADS_MINIATURA)
+                _, features_list = extrair_pagina(url, sessao, self.cache)
 
                 if not features_list:
                     self.log("Nenhuma imagem processável foi encontrada.")
                     return
 
-                self.log("--- Processamento concluído. Abrindo janela de seleção... ---")
-                self.after(0, lambda: SelectionWindow(self, features_list, self.salvar_dados_coletados))
+                self.log(f"--- {len(features_list)} imagens encontradas. Abrindo janela de seleção... ---")
+                if not assistida:
+                    self.na_interface(lambda: self.abrir_selecao(sessao, features_list))
+                    return
+
+                triagem = triar_candidatos(carregar_modelo(ARQUIVO_MODELO), features_list, limiar, sessao,
+                                           self.cache, visuais=self.visuais)
+                for features, probabilidade in zip(features_list, triagem['probabilidades']):
+                    features['probabilidade'] = probabilidade
+                automaticas = [dict(features_list[i], selected=0) for i in triagem['negativas']]
+                revisao = [features_list[i] for i in triagem['incertas'] + triagem['positivas']]
+                self.log(f"Triagem pelo modelo (limiar {limiar:g}): {len(triagem['positivas'])} pré-marcada(s), "
+                         f"{len(automaticas)} negativa(s) automática(s), {len(triagem['incertas'])} incerta(s).")
+                if not revisao:
+                    self.salvar_dados_coletados(automaticas)
+                    return
+                pre_selecionadas = range(len(triagem['incertas']), len(revisao))
+                self.na_interface(lambda: self.abrir_selecao(sessao, revisao, pre_selecionadas, automaticas))
 
             except Exception as e:
                 self.log(f"Erro ao buscar imagens: {e}")
 
-        self.run_task_in_thread(scrape_and_process_images)
-
-    def salvar_dados_coletados(self, labeled_data):
-        """Função chamada pela janela de seleção para salvar os dados no CSV."""
-        # ALTERAÇÃO: Usa a variável global ARQUIVO_DATASET
-        self.log(f"Salvando {len(labeled_data)} entradas no arquivo '{ARQUIVO_DATASET}'...")
-
-        colunas_csv = [
-            'url', 'alt', 'width', 'height', 'extension', 'parent_tag',
-            'real_width', 'real_height', 'format', 'selected'
-        ]
-
-        df_novos_dados = pd.DataFrame(labeled_data)
-
-        # ALTERAÇÃO: Usa a variável global ARQUIVO_DATASET
-        if os.path.exists(ARQUIVO_DATASET):
-            df_existente = pd.read_csv(ARQUIVO_DATASET)
-            df_final = pd.concat([df_existente, df_novos_dados], ignore_index=True)
-            df_final.drop_duplicates(subset=['url'], keep='last', inplace=True)
-        else:
-            df_final = df_novos_dados
+        self.enviar_tarefa(f"Coleta: {url}", scrape_and_process_images)
 
-        for col in colunas_csv:
-            if col not in df_final.columns:
-                df_final[col] = None
+    def abrir_selecao(self, sessao, features_list, pre_selecionadas=(), automaticas=()):
+        """
+        Abre a janela de seleção na hora e dispara o pipeline que preenche as miniaturas.
+        'automaticas' são linhas já rotuladas pela triagem, salvas junto com as revisadas.
+        """
+        janela = None
 
-        df_final.to_csv(ARQUIVO_DATASET, index=False, columns=colunas_csv)
-        self.log(f"--- Sucesso! Dados salvos. Total de {len(df_final)} entradas no dataset. ---")
+        def entregar(indice, resultado):
+            # Chamado pelas threads do pipeline: repassa para a thread da interface
+            self.na_interface(lambda: janela.atualizar_miniatura(indice, resultado))
 
-    def task_wrapper(self, task_function, *args):
-        """Redireciona a saida 'print' das funções para a área de log da GUI."""
-        import sys
-        class IORedirector:
-            def __init__(self, widget): self.widget = widget
+        pipeline = PipelineMiniaturas(sessao, [features['url'] for features in features_list], entregar,
+                                      cache=self.cache, visuais=self.visuais)
+        janela = SelectionWindow(self, features_list,
+                                 lambda labeled_data: self.salvar_dados_coletados(labeled_data + list(automaticas)),
+                                 ao_fechar=pipeline.encerrar, solicitar_miniaturas=pipeline.solicitar,
+                                 pre_selecionadas=pre_selecionadas)
 
-            def write(self, str): self.widget.log(str.strip())
+    def salvar_dados_coletados(self, labeled_data):
+        """Função chamada pela janela de seleção para anexar os dados ao dataset segmentado."""
+        self.log(f"Salvando {len(labeled_data)} entradas no dataset '{DIRETORIO_DATASET}'...")
 
-            def flush(self): pass
+        def salvar():
+            # As miniaturas são carregadas sob demanda, então as imagens que não apareceram na
+            # tela ainda não têm as dimensões reais; elas são sondadas pelo cabeçalho aqui
+            adicionar_dimensoes_reais([img_info for img_info in labeled_data if 'real_width' not in img_info],
+                                      cache=self.cache)
+            df_novos_dados = pd.DataFrame(labeled_data)
+            self.dataset.anexar(df_novos_dados[[col for col in COLUNAS_DATASET if col in df_novos_dados.columns]])
+            self.log(f"--- Sucesso! Dados salvos. Total de {len(self.dataset)} entradas no dataset. ---")
+            self.log(self.cache.resumo())
 
-        original_stdout = sys.stdout
-        sys.stdout = IORedirector(self)
-        try:
-            task_function(*args)
-        finally:
-            sys.stdout = original_stdout
-        self.log("--- TAREFA CONCLUÍDA ---")
+        self.enviar_tarefa("Salvar coleta", salvar)
 
     def iniciar_treino(self):
         """Função do botão para iniciar o treinamento."""
         self.log("--- Iniciando Treinamento do Modelo... ---")
         # ALTERAÇÃO: Passa os caminhos absolutos para a função de treino
-        self.run_task_in_thread(self.task_wrapper, treinar_modelo, ARQUIVO_DATASET, ARQUIVO_MODELO)
+        visuais = self.visuais if self.usar_visuais.get() else None
+        if self.busca_hiperparametros.get():
+            self.enviar_tarefa("Busca de hiperparâmetros",
+                               lambda: buscar_hiperparametros(DIRETORIO_DATASET, ARQUIVO_MODELO, visuais=visuais,
+                                                              cache=self.cache))
+            return
+        if self.treino_incremental.get():
+            self.enviar_tarefa("Treino incremental", treinar_modelo_incremental, DIRETORIO_DATASET, ARQUIVO_MODELO)
+            return
+        self.enviar_tarefa("Treino", lambda: treinar_modelo(DIRETORIO_DATASET, ARQUIVO_MODELO, visuais=visuais,
+                                                            cache=self.cache))
 
     def iniciar_previsao(self):
         """Função do botão para iniciar a previsão."""
@@ -244,8 +615,22 @@ class App(tk.Tk):
             messagebox.showerror("Erro", "Por favor, insira uma URL válida.")
             return
         self.log(f"--- Iniciando Previsão da URL: {url} ---")
+        if self.usar_servico.get():
+            self.enviar_tarefa(f"Previsão (serviço): {url}", self.prever_pelo_servico, url)
+            return
         # ALTERAÇÃO: Passa a URL e o caminho absoluto do modelo para a função de previsão
-        self.run_task_in_thread(self.task_wrapper, prever_e_baixar, url, ARQUIVO_MODELO, BASE_DIR)
+        self.enviar_tarefa(f"Previsão: {url}", lambda: prever_e_baixar(url, ARQUIVO_MODELO, BASE_DIR,
+                                                                       cache=self.cache, indice=self.indice,
+                                                                       visuais=self.visuais))
+
+    def prever_pelo_servico(self, url):
+        """Entrega a URL ao serviço residente e acompanha o trabalho; cancelar a tarefa cancela o trabalho."""
+        cliente = ClienteServico(ENDERECO_SERVICO)
+        if not cliente.disponivel():
+            print(f"Serviço não encontrado em {ENDERECO_SERVICO}. Inicie-o com 'python servico.py'.")
+            return
+        for dados in cliente.aguardar(cliente.enviar([url])):
+            imprimir_resultado(dados)
 
 # --- Ponto de Entrada da Aplicação ---
 if __name__ == "__main__":
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Arquivo: armazenamento_dataset.py
+
+# Armazenamento do dataset de treinamento em segmentos append-only.
+# Cada sessão de rotulagem grava só um segmento novo (Parquet quando o
+# pyarrow está instalado, CSV tipado caso contrário) e atualiza um índice
+# SQLite url -> seq. A deduplicação "última escrita vence" acontece na
+# leitura usando esse índice, sem reescrever o dataset inteiro; a
+# compactação periódica junta os segmentos e descarta as linhas obsoletas.
+
+import os
+import sqlite3
+import threading
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    FORMATO_SEGMENTO = 'parquet'
+except ImportError:
+    FORMATO_SEGMENTO = 'csv'
+
+# Colunas do dataset e seus tipos. 'width'/'height' guardam o atributo bruto da tag (ex.: "1000px").
+TIPOS_COLUNAS = {
+    'url': 'object',
+    'alt': 'object',
+    'width': 'object',
+    'height': 'object',
+    'extension': 'object',
+    'parent_tag': 'object',
+    'real_width': 'float64',
+    'real_height': 'float64',
+    'format': 'object',
+    'selected': 'int8',
+}
+COLUNAS_DATASET = list(TIPOS_COLUNAS)
+
+
+def _tipar(df):
+    """Garante todas as colunas do esquema, na ordem e com os tipos definidos."""
+    for col in COLUNAS_DATASET:
+        if col not in df.columns:
+            df[col] = None
+    df = df[COLUNAS_DATASET + [c for c in df.columns if c not in TIPOS_COLUNAS]].copy()
+    for col, tipo in TIPOS_COLUNAS.items():
+        if tipo == 'object':
+            # Sempre texto: o CSV antigo traz width/height como float e a raspagem como "100px",
+            # e o Parquet não aceita os dois tipos na mesma coluna ao compactar
+            df[col] = df[col].map(str, na_action='ignore').astype(object).where(df[col].notna(), None)
+        elif tipo == 'float64':
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(tipo)
+    return df
+
+
+class DatasetSegmentado:
+    """
+    Dataset em um diretório: 'segmentos/' com os arquivos append-only e 'indice.sqlite3'
+    com a última versão (seq) de cada URL. Toda linha recebe um '_seq' crescente, que
+    sobrevive à compactação e permite ler só o que entrou depois de um ponto.
+    """
+
+    def __init__(self, diretorio, max_segmentos=32):
+        self.diretorio = diretorio
+        self.max_segmentos = max_segmentos
+        self.dir_segmentos = os.path.join(diretorio, 'segmentos')
+        os.makedirs(self.dir_segmentos, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(diretorio, 'indice.sqlite3'), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, seq INTEGER, segmento INTEGER);
+            CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor INTEGER);
+            INSERT OR IGNORE INTO meta VALUES ('proximo_seq', 1), ('proximo_segmento', 1);
+        """)
+        self._db.commit()
+
+    def _meta(self, chave):
+        return self._db.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()[0]
+
+    def _segmentos(self):
+        """Mapeia número -> caminho dos segmentos existentes (Parquet ou CSV, conforme foram gravados)."""
+        return {int(nome[4:10]): os.path.join(self.dir_segmentos, nome) for nome in sorted(os.listdir(self.dir_segmentos))
+                if nome.startswith('seg_') and not nome.endswith('.part')}
+
+    def _gravar_segmento(self, df, numero):
+        caminho = os.path.join(self.dir_segmentos, f"seg_{numero:06d}.{FORMATO_SEGMENTO}")
+        tmp_path = caminho + '.part'
+        if FORMATO_SEGMENTO == 'parquet':
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, caminho)
+
+    @staticmethod
+    def _ler_segmento(caminho, colunas=None):
+        if caminho.endswith('.parquet'):
+            return pd.read_parquet(caminho, columns=colunas)
+        return pd.read_csv(caminho, usecols=colunas, dtype={c: str for c, t in TIPOS_COLUNAS.items() if t == 'object'})
+
+    def anexar(self, df_novos_dados):
+        """Grava as linhas como um novo segmento e aponta o índice de cada URL para elas."""
+        if df_novos_dados.empty:
+            return 0
+        df = _tipar(df_novos_dados.drop_duplicates(subset=['url'], keep='last'))
+        with self._lock:
+            primeiro_seq = self._meta('proximo_seq')
+            numero = self._meta('proximo_segmento')
+            df['_seq'] = range(primeiro_seq, primeiro_seq + len(df))
+            self._gravar_segmento(df, numero)
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO urls VALUES (?, ?, ?)",
+                                     zip(df['url'], df['_seq'].tolist(), [numero] * len(df)))
+                self._db.execute("UPDATE meta SET valor = ? WHERE chave = 'proximo_seq'", (primeiro_seq + len(df),))
+                self._db.execute("UPDATE meta SET valor = ? WHERE chave = 'proximo_segmento'", (numero + 1,))
+            precisa_compactar = len(self._segmentos()) > self.max_segmentos
+        if precisa_compactar:
+            self.compactar()
+        return len(df)
+
+    def ler(self, desde_seq=0, colunas=None, incluir_seq=False):
+        """
+        Devolve a versão mais recente de cada URL. Com 'desde_seq', só as linhas gravadas
+        depois desse ponto; com 'colunas', lê apenas essas colunas dos segmentos.
+        """
+        with self._lock:
+            segmentos = [numero for (numero,) in self._db.execute(
+                "SELECT DISTINCT segmento FROM urls WHERE seq > ? ORDER BY segmento", (desde_seq,))]
+            vivos = pd.Index([seq for (seq,) in self._db.execute("SELECT seq FROM urls WHERE seq > ?", (desde_seq,))])
+            colunas_lidas = None if colunas is None else list(dict.fromkeys(list(colunas) + ['_seq']))
+            arquivos = self._segmentos()
+            partes = [self._ler_segmento(arquivos[numero], colunas_lidas) for numero in segmentos]
+        if not partes:
+            vazio = _tipar(pd.DataFrame(columns=COLUNAS_DATASET))[list(colunas or COLUNAS_DATASET)]
+            if incluir_seq:
+                vazio['_seq'] = pd.Series(dtype='int64')
+            return vazio
+        df = pd.concat(partes, ignore_index=True)
+        df = df[df['_seq'].isin(vivos)].sort_values('_seq', ignore_index=True)
+        if colunas is None:
+            df = _tipar(df)
+        if not incluir_seq:
+            df = df.drop(columns='_seq')
+        return df
+
+    def ultimo_seq(self):
+        with self._lock:
+            return self._meta('proximo_seq') - 1
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+
+    def __contains__(self, url):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM urls WHERE url = ?", (url,)).fetchone() is not None
+
+    def compactar(self):
+        """Junta todos os segmentos em um só, mantendo só a última versão de cada URL."""
+        with self._lock:
+            antigos = self._segmentos()
+            if len(antigos) <= 1:
+                return
+            df = self.ler(incluir_seq=True)
+            numero = self._meta('proximo_segmento')
+            self._gravar_segmento(df, numero)
+            with self._db:
+                self._db.execute("UPDATE urls SET segmento = ?", (numero,))
+                self._db.execute("UPDATE meta SET valor = ? WHERE chave = 'proximo_segmento'", (numero + 1,))
+            for caminho in antigos.values():
+                os.remove(caminho)
+        print(f"Dataset compactado: {len(antigos)} segmentos -> 1 ({len(df)} linhas).")
+
+    def importar_csv(self, caminho_csv):
+        """Importa um 'image_dataset_features.csv' do formato antigo como um novo segmento."""
+        df = pd.read_csv(caminho_csv)
+        total = self.anexar(df)
+        print(f"Importadas {total} entradas de '{caminho_csv}' para '{self.diretorio}'.")
+        return total
+
+
+def carregar_dataset(caminho, colunas=None):
+    """Lê o dataset de um diretório segmentado ou, para compatibilidade, de um CSV antigo."""
+    if os.path.isdir(caminho):
+        return DatasetSegmentado(caminho).ler(colunas=colunas)
+    return pd.read_csv(caminho, usecols=colunas)
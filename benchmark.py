@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# Arquivo: benchmark.py
+
+# Benchmark offline do pipeline raspagem -> features -> previsão -> download.
+# Um servidor HTTP local serve páginas sintéticas (quantidade, tamanho e
+# formato das imagens e latência configuráveis) e cada etapa é cronometrada
+# separadamente, incluindo o treino em datasets sintéticos de vários
+# tamanhos. Os resultados vão para um JSON, e '--comparar' mostra a
+# variação de cada etapa em relação a uma execução anterior.
+#
+# Exemplo:
+#   python benchmark.py --imagens 500 --latencia 0.01 --linhas 1000,100000 --saida bench.json
+#   python benchmark.py --comparar bench.json
+
+import os
+import io
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from armazenamento_dataset import DatasetSegmentado
+from descoberta_imagens import DescobridorImagens, features_de_candidato
+from extrator_ia import (clean_dataframe, extrair_features_em_lote, treinar_modelo, carregar_modelo,
+                         probabilidade_positiva, colunas_numericas_do_modelo, BaixadorConcorrente, criar_sessao)
+
+TIPOS_MIME = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+FORMATOS_PIL = {'jpg': 'JPEG', 'png': 'PNG', 'gif': 'GIF', 'webp': 'WEBP'}
+CATEGORIAS = ['fotos', 'galeria', 'icones', 'banners', 'avatars', 'thumbs']
+TAGS_PAI = ['div', 'a', 'figure', 'picture', 'span', 'li']
+
+
+# ==============================================================================
+# SERVIDOR DE FIXTURES
+# ==============================================================================
+
+def gerar_imagem(formato, largura, altura, semente=0):
+    """Imagem sintética com ruído (para o tamanho comprimido ser realista) no formato pedido."""
+    rng = np.random.default_rng(semente)
+    pequena = (rng.random((max(altura // 8, 1), max(largura // 8, 1), 3)) * 255).astype('uint8')
+    imagem = Image.fromarray(pequena).resize((largura, altura), Image.BILINEAR)
+    buffer = io.BytesIO()
+    imagem.save(buffer, FORMATOS_PIL[formato])
+    return buffer.getvalue()
+
+
+def gerar_pagina(numero, imagens, formatos):
+    """HTML com 'imagens' tags variadas: src, srcset, lazy-load, <picture> e atributos width/height."""
+    rng = random.Random(numero)
+    partes = [f"<html><head><title>Pagina sintetica {numero}</title></head><body>"]
+    for i in range(imagens):
+        formato = formatos[i % len(formatos)]
+        categoria = rng.choice(CATEGORIAS)
+        src = f"/img/{categoria}/{numero}_{i}.{formato}"
+        largura = rng.choice([16, 64, 300, 800, 1200])
+        tipo = i % 4
+        if tipo == 0:
+            tag = f'<img src="{src}" alt="{categoria} {i}" width="{largura}" height="{largura * 3 // 4}">'
+        elif tipo == 1:
+            tag = f'<img data-src="{src}" src="/img/placeholder.gif" alt="{categoria}">'
+        elif tipo == 2:
+            tag = f'<img srcset="{src}?w=1 1x, {src} 2x" src="{src}?w=1" width="{largura}">'
+        else:
+            tag = f'<picture><source srcset="{src}"><img src="{src}" alt="{categoria}"></picture>'
+        pai = rng.choice(['div', 'a', 'figure', 'span'])
+        partes.append(f'<{pai} class="item">{tag}</{pai}>')
+    partes.append("</body></html>")
+    return ''.join(partes).encode('utf-8')
+
+
+class ServidorFixture:
+    """
+    Servidor HTTP local em uma porta livre. '/pagina/<n>.html' devolve uma página sintética e
+    '/img/...' devolve a imagem do formato da extensão; toda resposta espera 'latencia' segundos.
+    """
+
+    def __init__(self, imagens=100, formatos=('jpg', 'png', 'webp'), tamanho=(640, 480), latencia=0.0):
+        self.imagens = imagens
+        self.formatos = list(formatos)
+        self.latencia = latencia
+        self.corpos_imagem = {formato: gerar_imagem(formato, *tamanho) for formato in TIPOS_MIME}
+        self._paginas = {}
+        servidor = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                caminho = self.path.split('?')[0]
+                if caminho.startswith('/pagina/') and caminho.endswith('.html'):
+                    corpo = servidor.pagina(int(caminho[len('/pagina/'):-len('.html')]))
+                    tipo = 'text/html; charset=utf-8'
+                elif caminho.startswith('/img/') and caminho.rsplit('.', 1)[-1] in TIPOS_MIME:
+                    extensao = caminho.rsplit('.', 1)[-1]
+                    corpo, tipo = servidor.corpos_imagem[extensao], TIPOS_MIME[extensao]
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self._http = ThreadingHTTPServer(('127.0.0.1', 0), Manipulador)
+        self._http.daemon_threads = True
+        self.url_base = f"http://127.0.0.1:{self._http.server_address[1]}"
+        self._thread = threading.Thread(target=self._http.serve_forever, daemon=True)
+
+    def pagina(self, numero):
+        if numero not in self._paginas:
+            self._paginas[numero] = gerar_pagina(numero, self.imagens, self.formatos)
+        return self._paginas[numero]
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._http.shutdown()
+        self._http.server_close()
+
+
+# ==============================================================================
+# DATASETS SINTÉTICOS
+# ==============================================================================
+
+def gerar_dataset_sintetico(linhas, semente=42):
+    """Dataset com o esquema do DatasetSegmentado e um rótulo que depende das features (com ruído)."""
+    rng = np.random.default_rng(semente)
+    categoria = rng.choice(CATEGORIAS, linhas)
+    extensao = rng.choice(['.jpg', '.png', '.gif', '.webp'], linhas)
+    largura = rng.choice([16, 64, 300, 800, 1200], linhas)
+    ids = np.arange(linhas).astype(str)
+    urls = ('https://exemplo' + pd.Series(rng.integers(0, 50, linhas)).astype(str) + '.com/'
+            + pd.Series(categoria) + '/img_' + pd.Series(ids) + pd.Series(extensao))
+    selecionada = (np.isin(categoria, ['fotos', 'galeria']) & (largura >= 300)) ^ (rng.random(linhas) < 0.05)
+    return pd.DataFrame({
+        'url': urls,
+        'alt': pd.Series(categoria) + ' ' + pd.Series(ids),
+        'width': pd.Series(largura).astype(str) + np.where(rng.random(linhas) < 0.3, 'px', ''),
+        'height': pd.Series(largura * 3 // 4).astype(str),
+        'extension': extensao,
+        'parent_tag': rng.choice(TAGS_PAI, linhas),
+        'real_width': largura.astype(float),
+        'real_height': (largura * 3 // 4).astype(float),
+        'format': pd.Series(extensao).str[1:].str.upper(),
+        'selected': selecionada.astype(int),
+    })
+
+
+# ==============================================================================
+# MEDIÇÃO
+# ==============================================================================
+
+def medir(resultados, etapa, funcao, repeticoes=3, itens=1):
+    """Roda 'funcao' 'repeticoes' vezes (com a saída silenciada) e registra os tempos da etapa."""
+    tempos = []
+    retorno = None
+    for _ in range(repeticoes):
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            retorno = funcao()
+            tempos.append(time.perf_counter() - inicio)
+    mediana = statistics.median(tempos)
+    resultados[etapa] = {'segundos': tempos, 'mediana': mediana, 'minimo': min(tempos), 'itens': itens,
+                         'itens_por_s': itens / mediana if mediana else None}
+    print(f"  {etapa:<32} mediana={mediana * 1000:10.2f} ms  itens={itens:<8} "
+          f"({resultados[etapa]['itens_por_s'] or 0:,.0f}/s)")
+    return retorno
+
+
+def versao_do_codigo():
+    """Commit atual (quando o projeto é um repositório git), para identificar os resultados."""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def executar_benchmark(imagens=200, paginas=3, formatos=('jpg', 'png', 'webp'), tamanho=(640, 480), latencia=0.0,
+                       linhas=(1000, 10000), repeticoes=3, workers=8):
+    """Executa todas as etapas e devolve o dicionário de resultados."""
+    etapas = {}
+    with ServidorFixture(imagens, formatos, tamanho, latencia) as servidor, \
+            tempfile.TemporaryDirectory(prefix='bench_') as tmp:
+        sessao = criar_sessao(workers)
+        urls_paginas = [f"{servidor.url_base}/pagina/{n}.html" for n in range(paginas)]
+        total_tags = imagens * paginas
+        print(f"--- Benchmark: {paginas} página(s) x {imagens} imagem(ns) em {servidor.url_base} ---")
+
+        corpos = medir(etapas, 'busca_pagina', lambda: [sessao.get(u, timeout=30).content for u in urls_paginas],
+                       repeticoes, paginas)
+
+        def analisar():
+            brutas = []
+            for url, corpo in zip(urls_paginas, corpos):
+                descobridor = DescobridorImagens(url, 'utf-8', bruto=True)
+                brutas.append(descobridor.alimentar(corpo) + descobridor.fechar())
+            return brutas
+        brutas = medir(etapas, 'parse_html', analisar, repeticoes, total_tags)
+
+        medir(etapas, 'extract_features', lambda: [features_de_candidato(src, base, alt, w, h, pai)
+                                                   for tuplas in brutas for base, src, alt, w, h, pai in tuplas],
+              repeticoes, total_tags)
+        df = medir(etapas, 'extract_features_em_lote', lambda: extrair_features_em_lote(brutas), repeticoes,
+                   total_tags)
+        df_limpo = medir(etapas, 'clean_dataframe', lambda: clean_dataframe(df.drop(columns='_pagina')),
+                         repeticoes, len(df))
+
+        for n in linhas:
+            caminho_dataset = os.path.join(tmp, f'dataset_{n}')
+            DatasetSegmentado(caminho_dataset).anexar(gerar_dataset_sintetico(n))
+            caminho_modelo = os.path.join(tmp, f'modelo_{n}.joblib')
+            medir(etapas, f'treinar_modelo_{n}', lambda: treinar_modelo(caminho_dataset, caminho_modelo), 1, n)
+
+        modelo = carregar_modelo(os.path.join(tmp, f'modelo_{min(linhas)}.joblib'))
+        for col in colunas_numericas_do_modelo(modelo):
+            if col not in df_limpo.columns:
+                df_limpo[col] = np.nan
+        probabilidades = medir(etapas, 'predict', lambda: probabilidade_positiva(modelo, df_limpo), repeticoes,
+                               len(df_limpo))
+
+        urls_imagens = df.loc[probabilidades > 0.5, 'url'].tolist() or df['url'].tolist()
+
+        def baixar():
+            destino = tempfile.mkdtemp(dir=tmp)
+            baixador = BaixadorConcorrente(sessao=sessao, max_workers=workers)
+            for i, url in enumerate(urls_imagens):
+                baixador.enviar(url, os.path.join(destino, f"{i}{os.path.splitext(url.split('?')[0])[1]}"))
+            return baixador.concluir()
+        downloads = medir(etapas, 'download_imagens', baixar, repeticoes, len(urls_imagens))
+        etapas['download_imagens']['mb_por_s'] = downloads['mb_por_s']
+
+    return {
+        'versao': versao_do_codigo(),
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'parametros': {'imagens': imagens, 'paginas': paginas, 'formatos': list(formatos), 'tamanho': list(tamanho),
+                       'latencia': latencia, 'linhas': list(linhas), 'repeticoes': repeticoes, 'workers': workers},
+        'etapas': etapas,
+    }
+
+
+def comparar_resultados(anterior, atual):
+    """Imprime a variação da mediana de cada etapa entre duas execuções (positivo = mais lento)."""
+    print(f"--- Comparação: {anterior.get('versao')} -> {atual.get('versao')} ---")
+    for etapa, dados in atual['etapas'].items():
+        if etapa not in anterior['etapas']:
+            continue
+        antes = anterior['etapas'][etapa]['mediana']
+        variacao = (dados['mediana'] - antes) / antes if antes else 0.0
+        print(f"  {etapa:<32} {antes * 1000:10.2f} ms -> {dados['mediana'] * 1000:10.2f} ms  ({variacao:+.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline do pipeline do extrator de imagens.")
+    parser.add_argument("--imagens", type=int, default=200, help="Imagens por página sintética.")
+    parser.add_argument("--paginas", type=int, default=3, help="Quantidade de páginas sintéticas.")
+    parser.add_argument("--formatos", default="jpg,png,webp", help="Formatos das imagens, separados por vírgula.")
+    parser.add_argument("--tamanho", default="640x480", help="Dimensões das imagens servidas (LxA).")
+    parser.add_argument("--latencia", type=float, default=0.0, help="Latência artificial (s) de cada resposta.")
+    parser.add_argument("--linhas", default="1000,10000",
+                        help="Tamanhos dos datasets sintéticos de treino, separados por vírgula (ex.: 1000,1000000).")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Repetições de cada etapa (vale a mediana).")
+    parser.add_argument("--workers", type=int, default=8, help="Downloads simultâneos.")
+    parser.add_argument("--saida", default="resultados_benchmark.json", help="Arquivo JSON com os resultados.")
+    parser.add_argument("--comparar", type=str, help="JSON de uma execução anterior para comparar.")
+    args = parser.parse_args()
+
+    resultados = executar_benchmark(
+        imagens=args.imagens, paginas=args.paginas, formatos=tuple(args.formatos.split(',')),
+        tamanho=tuple(int(v) for v in args.tamanho.lower().split('x')), latencia=args.latencia,
+        linhas=tuple(int(v) for v in args.linhas.split(',')), repeticoes=args.repeticoes, workers=args.workers)
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, indent=2)
+    print(f"--- Resultados salvos em '{args.saida}' ---")
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar_resultados(json.load(f), resultados)
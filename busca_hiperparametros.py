@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+# Arquivo: busca_hiperparametros.py
+
+# Modo de treinamento com busca de hiperparâmetros: GridSearchCV com validação
+# cruzada estratificada sobre as opções do featurizador (TF-IDF) e do
+# classificador, em paralelo em todos os núcleos. O Pipeline usa um
+# joblib.Memory, então o ColumnTransformer de cada combinação de parâmetros
+# do featurizador é ajustado uma vez por fold e reaproveitado por todos os
+# valores do classificador. O melhor modelo é salvo junto com um relatório
+# JSON ('<modelo>.relatorio.json') com as métricas de validação e os tempos.
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import joblib
+from sklearn.model_selection import GridSearchCV, StratifiedKFold, ParameterGrid
+
+from metricas import METRICAS
+from armazenamento_dataset import carregar_dataset
+from extrator_ia import preparar_dados_treino, criar_pipeline, criar_sessao, SUFIXO_ESTADO_INCREMENTAL
+
+SUFIXO_RELATORIO = '.relatorio.json'
+
+# Grade padrão: os parâmetros do featurizador ficam em cache; os do classificador são baratos
+GRADE_PADRAO = {
+    'preprocessor__url_text__max_features': [100, 300, 1000],
+    'preprocessor__url_text__ngram_range': [(1, 1), (1, 2)],
+    'preprocessor__alt_text__max_features': [50, 200],
+    'classifier__C': [0.1, 1.0, 10.0],
+}
+
+METRICAS_VALIDACAO = ['f1', 'accuracy', 'precision', 'recall', 'roc_auc']
+
+
+def buscar_hiperparametros(dataset_path='dataset', model_path='image_model.joblib', grade=None, cv=5, n_jobs=-1,
+                           cache_dir=None, visuais=None, cache=None):
+    """
+    Modo de Busca de Hiperparâmetros: valida cada combinação de 'grade' com 'cv' folds (F1 como
+    critério), treina o melhor modelo com todos os dados e o salva em 'model_path'. Os passos de
+    pré-processamento ficam em cache em 'cache_dir' (um diretório temporário quando omitido).
+    Com 'visuais' (ExtratorVisual), as características visuais entram como em 'treinar_modelo'.
+    Devolve o relatório salvo.
+    """
+    print(f"--- Modo de Busca de Hiperparâmetros: Usando '{dataset_path}' ---")
+    cache_temporario = cache_dir is None
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix='cache_pipeline_')
+    tempos = {}
+    try:
+        inicio = time.perf_counter()
+        df = carregar_dataset(dataset_path)
+        tempos['leitura_dataset'] = time.perf_counter() - inicio
+        if visuais is not None:
+            inicio = time.perf_counter()
+            df = visuais.adicionar_colunas(df, criar_sessao(), cache)
+            tempos['caracteristicas_visuais'] = time.perf_counter() - inicio
+
+        if df['selected'].nunique() < 2:
+            print("Erro: O dataset precisa conter exemplos de imagens selecionadas (1) e não selecionadas (0).")
+            return
+
+        inicio = time.perf_counter()
+        X, y, numerical_features = preparar_dados_treino(df)
+        tempos['preparacao'] = time.perf_counter() - inicio
+
+        # Não dá para ter mais folds do que exemplos da classe minoritária
+        folds = max(2, min(cv, int(y.value_counts().min())))
+        pipeline = criar_pipeline(numerical_features)
+        pipeline.set_params(memory=joblib.Memory(cache_dir, verbose=0))
+        grade = grade or GRADE_PADRAO
+        busca = GridSearchCV(pipeline, grade, scoring=METRICAS_VALIDACAO, refit='f1',
+                             cv=StratifiedKFold(n_splits=folds, shuffle=True, random_state=42),
+                             n_jobs=n_jobs, error_score='raise')
+        print(f"Validando {len(ParameterGrid(grade))} combinações com {folds} folds em {len(X)} linhas "
+              f"(n_jobs={n_jobs})...")
+
+        inicio = time.perf_counter()
+        with METRICAS.cronometrar('treino'):
+            busca.fit(X, y)
+        tempos['busca'] = time.perf_counter() - inicio
+        tempos['refit_melhor'] = busca.refit_time_
+
+        resultados = busca.cv_results_
+        melhor = busca.best_index_
+        tempos['ajuste_medio_por_fold'] = float(resultados['mean_fit_time'].mean())
+        tempos['avaliacao_media_por_fold'] = float(resultados['mean_score_time'].mean())
+
+        modelo = busca.best_estimator_
+        modelo.set_params(memory=None)  # O cache não vai junto com o modelo salvo
+        inicio = time.perf_counter()
+        joblib.dump(modelo, model_path)
+        tempos['salvamento'] = time.perf_counter() - inicio
+        # Um ajuste completo invalida o estado do treino incremental associado a este arquivo
+        if os.path.exists(model_path + SUFIXO_ESTADO_INCREMENTAL):
+            os.remove(model_path + SUFIXO_ESTADO_INCREMENTAL)
+
+        ranking = sorted(range(len(resultados['params'])), key=lambda i: resultados['rank_test_f1'][i])
+        relatorio = {
+            'dataset': os.path.abspath(dataset_path),
+            'linhas': int(len(X)),
+            'positivas': int(y.sum()),
+            'folds': folds,
+            'combinacoes': len(resultados['params']),
+            'melhores_parametros': {k: list(v) if isinstance(v, tuple) else v for k, v in busca.best_params_.items()},
+            'validacao': {nome: {'media': float(resultados[f'mean_test_{nome}'][melhor]),
+                                 'desvio': float(resultados[f'std_test_{nome}'][melhor])}
+                          for nome in METRICAS_VALIDACAO},
+            'ranking': [{'f1': float(resultados['mean_test_f1'][i]),
+                         'parametros': {k: list(v) if isinstance(v, tuple) else v
+                                        for k, v in resultados['params'][i].items()}}
+                        for i in ranking[:10]],
+            'tempos_segundos': tempos,
+        }
+        with open(model_path + SUFIXO_RELATORIO, 'w', encoding='utf-8') as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+        print(f"Melhores parâmetros: {busca.best_params_}")
+        for nome, valores in relatorio['validacao'].items():
+            print(f"  {nome:<10} {valores['media']:.3f} ± {valores['desvio']:.3f}")
+        print(f"Tempos: busca {tempos['busca']:.1f}s ({relatorio['combinacoes']} combinações x {folds} folds), "
+              f"refit {tempos['refit_melhor']:.1f}s")
+        print(f"--- Sucesso! Modelo salvo como '{model_path}' e relatório em '{model_path + SUFIXO_RELATORIO}' ---")
+        return relatorio
+
+    except FileNotFoundError:
+        print(f"Erro: Arquivo de dataset '{dataset_path}' não encontrado. Execute o modo de coleta primeiro.")
+    except Exception as e:
+        print(f"Ocorreu um erro na busca de hiperparâmetros: {e}")
+    finally:
+        if cache_temporario:
+            shutil.rmtree(cache_dir, ignore_errors=True)
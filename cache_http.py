@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+# Arquivo: cache_http.py
+
+# Cache local em disco compartilhado por extrator_ia.py e app_gui.py.
+# Guarda o HTML das páginas, os bytes das imagens e os metadados sondados.
+# Enquanto a resposta estiver fresca (Cache-Control: max-age ou Expires), a
+# cópia local é servida sem ir à rede; depois disso, é revalidada com
+# requisições condicionais (ETag / Last-Modified). Respostas sem validadores
+# nem prazo de validade são baixadas de novo a cada uso. O cache respeita um
+# orçamento de tamanho, descartando as entradas menos usadas (LRU).
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import email.utils
+import requests
+
+
+def validade(cabecalhos, agora=None):
+    """
+    Instante (epoch) até o qual a resposta pode ser servida sem revalidar, ou None.
+    Segue Cache-Control (no-cache/no-store/max-age, descontando o Age) e, na falta dele, Expires.
+    """
+    agora = time.time() if agora is None else agora
+    controle = (cabecalhos.get('Cache-Control') or '').lower()
+    if 'no-cache' in controle or 'no-store' in controle:
+        return None
+    max_age = re.search(r'(?:^|[,\s])max-age\s*=\s*"?(\d+)', controle)
+    if max_age:
+        idade = cabecalhos.get('Age') or '0'
+        return agora + int(max_age.group(1)) - (int(idade) if idade.isdigit() else 0)
+    if cabecalhos.get('Expires'):
+        try:
+            return email.utils.parsedate_to_datetime(cabecalhos['Expires']).timestamp()
+        except (TypeError, ValueError, IndexError):
+            return None  # Expires inválido (ex.: "0") conta como já expirado
+    return None
+
+
+class RespostaCache:
+    """Conteúdo devolvido pelo cache, venha ele do disco ou da rede."""
+
+    def __init__(self, conteudo, url_final, content_type=None, do_cache=False):
+        self.content = conteudo
+        self.url = url_final
+        self.content_type = content_type
+        self.do_cache = do_cache
+
+
+class CacheHTTP:
+    """
+    Cache de conteúdo indexado pela URL.
+    Os corpos ficam em arquivos nomeados pelo SHA-256 da URL; o índice (validadores,
+    tamanhos e último acesso) fica em um SQLite no mesmo diretório.
+    """
+
+    def __init__(self, diretorio, limite_bytes=512 * 1024 * 1024):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(diretorio, 'indice.sqlite3'), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entradas (
+                url TEXT PRIMARY KEY, url_final TEXT, etag TEXT, last_modified TEXT,
+                content_type TEXT, tamanho INTEGER, ultimo_acesso REAL);
+            CREATE TABLE IF NOT EXISTS metadados (url TEXT PRIMARY KEY, dados TEXT);
+        """)
+        # Caches criados antes da validade por max-age/Expires não têm a coluna
+        if 'expira' not in [coluna[1] for coluna in self._db.execute("PRAGMA table_info(entradas)")]:
+            self._db.execute("ALTER TABLE entradas ADD COLUMN expira REAL")
+            self._db.commit()
+        self.hits = 0
+        self.misses = 0
+        self.revalidacoes = 0
+        self.bytes_economizados = 0
+        # Consultas aos metadados sondados, contadas à parte: não economizam bytes de corpo
+        self.hits_metadados = 0
+        self.misses_metadados = 0
+
+    def _caminho(self, url):
+        return os.path.join(self.diretorio, hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def _ler_entrada(self, url):
+        with self._lock:
+            linha = self._db.execute(
+                "SELECT url_final, etag, last_modified, content_type, tamanho, expira FROM entradas WHERE url = ?",
+                (url,)).fetchone()
+        if linha and os.path.exists(self._caminho(url)):
+            return linha
+        return None
+
+    def _tocar(self, url, resp=None):
+        with self._lock:
+            self._db.execute("UPDATE entradas SET ultimo_acesso = ? WHERE url = ?", (time.time(), url))
+            expira = validade(resp.headers) if resp is not None else None
+            if expira is not None:
+                # Um 304 com max-age/Expires renova a validade da cópia local
+                self._db.execute("UPDATE entradas SET expira = ? WHERE url = ?", (expira, url))
+            self._db.commit()
+
+    def _gravar(self, url, resp, blocos):
+        """Grava os blocos no arquivo da entrada (via temporário) e registra os validadores da resposta."""
+        caminho = self._caminho(url)
+        tmp_path = f"{caminho}.{threading.get_ident()}.part"
+        tamanho = 0
+        try:
+            with open(tmp_path, 'wb') as f:
+                for bloco in blocos:
+                    f.write(bloco)
+                    tamanho += len(bloco)
+                    yield bloco
+            os.replace(tmp_path, caminho)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entradas (url, url_final, etag, last_modified, content_type, tamanho, "
+                "ultimo_acesso, expira) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, resp.url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'),
+                 resp.headers.get('Content-Type'), tamanho, time.time(), validade(resp.headers)))
+            self._db.commit()
+        self._despejar()
+
+    def _despejar(self):
+        """Remove as entradas acessadas há mais tempo até o cache caber em 'limite_bytes'."""
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(tamanho), 0) FROM entradas").fetchone()[0]
+            if total <= self.limite_bytes:
+                return
+            for url, tamanho in self._db.execute(
+                    "SELECT url, tamanho FROM entradas ORDER BY ultimo_acesso").fetchall():
+                if total <= self.limite_bytes:
+                    break
+                if os.path.exists(self._caminho(url)):
+                    os.remove(self._caminho(url))
+                self._db.execute("DELETE FROM entradas WHERE url = ?", (url,))
+                total -= tamanho
+            self._db.commit()
+
+    def _requisitar(self, url, sessao, timeout, stream):
+        """
+        GET condicional; devolve (entrada local ou None, resposta ou None). A resposta é None quando
+        a cópia local ainda está fresca (nem vai à rede) ou quando a rede falhou e há cópia local.
+        """
+        sessao = sessao or requests
+        entrada = self._ler_entrada(url)
+        cabecalhos = {}
+        if entrada:
+            _, etag, last_modified, _, _, expira = entrada
+            if expira is not None and expira > time.time():
+                return entrada, None
+            if etag:
+                cabecalhos['If-None-Match'] = etag
+            if last_modified:
+                cabecalhos['If-Modified-Since'] = last_modified
+
+        try:
+            resp = sessao.get(url, headers=cabecalhos, timeout=timeout, stream=stream)
+        except requests.RequestException:
+            if not entrada:
+                raise
+            resp = None
+        return entrada, resp
+
+    def _registrar_hit(self, url, entrada, resp):
+        with self._lock:
+            self.hits += 1
+            if resp is not None:
+                self.revalidacoes += 1
+            self.bytes_economizados += entrada[4]
+        self._tocar(url, resp)
+
+    def obter(self, url, sessao=None, timeout=10):
+        """
+        Devolve o conteúdo de 'url'. Se houver cópia local, faz um GET condicional e só
+        baixa de novo se o servidor disser que mudou; sem rede, serve a cópia antiga.
+        """
+        entrada, resp = self._requisitar(url, sessao, timeout, stream=False)
+        if entrada and (resp is None or resp.status_code == 304):
+            with open(self._caminho(url), 'rb') as f:
+                conteudo = f.read()
+            self._registrar_hit(url, entrada, resp)
+            return RespostaCache(conteudo, entrada[0], entrada[3], do_cache=True)
+
+        resp.raise_for_status()
+        with self._lock:
+            self.misses += 1
+        for _ in self._gravar(url, resp, [resp.content]):
+            pass
+        return RespostaCache(resp.content, resp.url, resp.headers.get('Content-Type'))
+
+    def obter_em_blocos(self, url, sessao=None, timeout=10, tamanho_bloco=64 * 1024):
+        """
+        Versão em streaming de 'obter': devolve (url_final, content_type, blocos) sem esperar o corpo.
+        Quando não há cópia válida, os blocos vêm da rede e vão sendo gravados no cache conforme
+        são consumidos; se o consumo for interrompido, nada é gravado.
+        """
+        entrada, resp = self._requisitar(url, sessao, timeout, stream=True)
+        if entrada and (resp is None or resp.status_code == 304):
+            if resp is not None:
+                resp.close()
+            self._registrar_hit(url, entrada, resp)
+            return entrada[0], entrada[3], self._blocos_do_arquivo(url, tamanho_bloco)
+
+        try:
+            resp.raise_for_status()
+        except requests.RequestException:
+            resp.close()
+            raise
+        with self._lock:
+            self.misses += 1
+        return resp.url, resp.headers.get('Content-Type'), self._blocos_da_rede(url, resp, tamanho_bloco)
+
+    def _blocos_da_rede(self, url, resp, tamanho_bloco):
+        # Fechar o gerador no meio (ex.: corpo acima do limite) descarta o temporário e libera a conexão
+        with resp:
+            yield from self._gravar(url, resp, resp.iter_content(tamanho_bloco))
+
+    def _blocos_do_arquivo(self, url, tamanho_bloco):
+        with open(self._caminho(url), 'rb') as f:
+            for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+                yield bloco
+
+    def conteudo_local(self, url):
+        """Devolve os bytes guardados para 'url' sem tocar na rede, ou None."""
+        if not self._ler_entrada(url):
+            return None
+        with open(self._caminho(url), 'rb') as f:
+            return f.read()
+
+    def metadados(self, url):
+        """Devolve os metadados sondados guardados para 'url' (dict) ou None."""
+        with self._lock:
+            linha = self._db.execute("SELECT dados FROM metadados WHERE url = ?", (url,)).fetchone()
+            if linha:
+                self.hits_metadados += 1
+                return json.loads(linha[0])
+            self.misses_metadados += 1
+        return None
+
+    def salvar_metadados(self, url, dados):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO metadados VALUES (?, ?)", (url, json.dumps(dados)))
+            self._db.commit()
+
+    def estatisticas(self):
+        """Contadores de uso do cache desde que ele foi aberto."""
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(tamanho), 0) FROM entradas").fetchone()[0]
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidacoes': self.revalidacoes,
+                'bytes_economizados': self.bytes_economizados,
+                'bytes_em_disco': total,
+                'hits_metadados': self.hits_metadados,
+                'misses_metadados': self.misses_metadados,
+            }
+
+    def resumo(self):
+        e = self.estatisticas()
+        return (f"Cache: {e['hits']} hit(s), {e['misses']} miss(es), "
+                f"{e['bytes_economizados'] / (1024 * 1024):.2f} MB economizados, "
+                f"{e['bytes_em_disco'] / (1024 * 1024):.2f} MB em disco; "
+                f"metadados: {e['hits_metadados']} hit(s), {e['misses_metadados']} miss(es).")
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+# Arquivo: caracteristicas_visuais.py
+
+# Características do conteúdo das imagens para o classificador: histogramas
+# de matiz/saturação/brilho e densidade de bordas (21 números) e, quando o
+# torchvision está instalado, um embedding da MobileNetV3-Small rodando na
+# CPU. Os descritores são calculados em lotes por um pool de processos e
+# guardados em um SQLite indexado pelo SHA-256 do conteúdo, então cada
+# imagem é descrita uma única vez, mesmo que apareça sob várias URLs. A
+# janela de seleção da GUI registra as imagens que já baixou para as
+# miniaturas, sem baixá-las de novo. Na previsão, a configuração (com ou sem
+# embedding) vem do número de colunas 'vis_*' que o modelo espera.
+
+import io
+import os
+import copy
+import hashlib
+import multiprocessing
+import sqlite3
+import threading
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+from PIL import Image, ImageFilter
+
+try:
+    import torch
+    import torchvision
+except ImportError:
+    torch = None
+
+# As colunas visuais do DataFrame são PREFIXO_VISUAL + índice ('vis_0', 'vis_1', ...)
+PREFIXO_VISUAL = 'vis_'
+BINS_MATIZ, BINS_SATURACAO, BINS_BRILHO = 12, 4, 4
+DIMENSAO_COR = BINS_MATIZ + BINS_SATURACAO + BINS_BRILHO + 1
+DIMENSAO_EMBEDDING = 576  # Saída do avgpool da MobileNetV3-Small
+# Muda quando o cálculo muda, para não misturar descritores de versões diferentes no cache
+VERSAO_DESCRITOR = 'cor-v2'  # v1 podia vir de miniaturas da GUI
+TAMANHO_LOTE_VISUAL = 32
+
+_MODELO_EMBEDDING = None  # Carregado uma vez por processo do pool
+
+
+def descritor_cor(imagem):
+    """Histogramas normalizados de matiz, saturação e brilho mais a densidade de bordas."""
+    imagem = imagem.convert('RGB')
+    imagem.thumbnail((64, 64))
+    hsv = np.asarray(imagem.convert('HSV'), dtype=np.uint16).reshape(-1, 3)
+    total = max(len(hsv), 1)
+    partes = [np.bincount(hsv[:, canal] * bins // 256, minlength=bins) / total
+              for canal, bins in enumerate((BINS_MATIZ, BINS_SATURACAO, BINS_BRILHO))]
+    bordas = np.asarray(imagem.convert('L').filter(ImageFilter.FIND_EDGES), dtype=np.float32).mean() / 255
+    return np.concatenate(partes + [[bordas]]).astype(np.float32)
+
+
+def _embeddings(imagens):
+    global _MODELO_EMBEDDING
+    if _MODELO_EMBEDDING is None:
+        torch.set_num_threads(1)  # O paralelismo vem do pool de processos
+        pesos = torchvision.models.MobileNet_V3_Small_Weights.DEFAULT
+        modelo = torchvision.models.mobilenet_v3_small(weights=pesos)
+        modelo.classifier = torch.nn.Identity()
+        _MODELO_EMBEDDING = (modelo.eval(), pesos.transforms())
+    modelo, transformar = _MODELO_EMBEDDING
+    with torch.no_grad():
+        return modelo(torch.stack([transformar(imagem.convert('RGB')) for imagem in imagens])).numpy()
+
+
+def _descrever_lote(conteudos, usar_embedding=False):
+    """Executado nos processos do pool: devolve um vetor (ou None, se não decodificar) por imagem."""
+    imagens = []
+    for conteudo in conteudos:
+        try:
+            imagem = Image.open(io.BytesIO(conteudo))
+            imagem.draft('RGB', (224, 224))  # Só tem efeito em JPEG: decodifica já reduzido
+            imagem.load()
+            imagens.append(imagem)
+        except Exception:
+            imagens.append(None)
+    vetores = [descritor_cor(imagem) if imagem is not None else None for imagem in imagens]
+    validas = [i for i, imagem in enumerate(imagens) if imagem is not None]
+    if usar_embedding and validas:
+        for i, embedding in zip(validas, _embeddings([imagens[i] for i in validas])):
+            vetores[i] = np.concatenate([vetores[i], embedding.astype(np.float32)])
+    return vetores
+
+
+class ExtratorVisual:
+    """
+    Cache SQLite de descritores visuais: 'descritores' (sha256 -> vetor) e 'urls' (url -> sha256).
+    'descrever' baixa só as imagens que ainda não têm descritor e os calcula em lotes no pool de
+    processos; 'registrar' aproveita bytes que já foram baixados para outro fim. O pool usa 'spawn',
+    já que quem chama (a GUI, o serviço) tem threads rodando e um fork herdaria seus locks.
+    """
+
+    def __init__(self, caminho, usar_embedding=False, max_processos=None, tamanho_lote=TAMANHO_LOTE_VISUAL):
+        if usar_embedding and torch is None:
+            print("Aviso: torchvision não está instalado; usando só os histogramas de cor.")
+            usar_embedding = False
+        self._configurar(usar_embedding)
+        self.max_processos = max_processos
+        self.tamanho_lote = tamanho_lote
+        self._pool = None
+        self._variante = None  # O mesmo cache com a outra configuração, criado por 'para_dimensao'
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(caminho, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS descritores (sha256 TEXT, versao TEXT, vetor BLOB, PRIMARY KEY (sha256, versao));
+            CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, sha256 TEXT);
+        """)
+        self._db.commit()
+
+    def _configurar(self, usar_embedding):
+        self.usar_embedding = usar_embedding
+        self.versao = VERSAO_DESCRITOR + ('+mobilenet_v3_small' if usar_embedding else '')
+        self.dimensao = DIMENSAO_COR + (DIMENSAO_EMBEDDING if usar_embedding else 0)
+        self.colunas = [f"{PREFIXO_VISUAL}{i}" for i in range(self.dimensao)]
+
+    def para_dimensao(self, dimensao):
+        """
+        Extrator que produz as 'dimensao' colunas visuais que um modelo espera, sobre o mesmo SQLite.
+        Levanta ValueError se nenhuma configuração gera esse número de colunas e RuntimeError se o
+        modelo usa o embedding e o torchvision não está instalado, em vez de deixar as colunas em NaN.
+        """
+        if dimensao == self.dimensao:
+            return self
+        usar_embedding = {DIMENSAO_COR: False, DIMENSAO_COR + DIMENSAO_EMBEDDING: True}.get(dimensao)
+        if usar_embedding is None:
+            raise ValueError(f"O modelo espera {dimensao} colunas visuais, mas o extrator gera "
+                             f"{DIMENSAO_COR} (cor) ou {DIMENSAO_COR + DIMENSAO_EMBEDDING} (cor + embedding).")
+        if usar_embedding and torch is None:
+            raise RuntimeError("O modelo foi treinado com o embedding visual (--embedding), "
+                               "mas o torchvision não está instalado.")
+        with self._lock:
+            if self._variante is None:
+                variante = copy.copy(self)  # Compartilha a conexão e o lock do SQLite
+                variante._configurar(usar_embedding)
+                variante._pool = None
+                variante._variante = self
+                self._variante = variante
+        return self._variante
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_processos,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def _vetores_conhecidos(self, urls):
+        with self._lock:
+            linhas = self._db.execute(
+                f"SELECT u.url, d.vetor FROM urls u JOIN descritores d ON d.sha256 = u.sha256 AND d.versao = ? "
+                f"WHERE u.url IN ({','.join('?' * len(urls))})", [self.versao, *urls]).fetchall()
+        return {url: np.frombuffer(vetor, dtype=np.float32) for url, vetor in linhas}
+
+    def _sha_conhecido(self, sha256):
+        with self._lock:
+            linha = self._db.execute("SELECT vetor FROM descritores WHERE sha256 = ? AND versao = ?",
+                                     (sha256, self.versao)).fetchone()
+        return None if linha is None else np.frombuffer(linha[0], dtype=np.float32)
+
+    def _gravar(self, pares_url_sha, novos):
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO descritores VALUES (?, ?, ?)",
+                                 [(sha, self.versao, vetor.astype(np.float32).tobytes()) for sha, vetor in novos])
+            self._db.executemany("INSERT OR REPLACE INTO urls VALUES (?, ?)", pares_url_sha)
+
+    def registrar(self, url, conteudo):
+        """
+        Guarda o descritor de uma imagem cujos bytes já estão em mãos (ex.: miniatura da GUI).
+        O descritor sai dos bytes completos, como em 'descrever', e não da miniatura: o cache é
+        indexado pelo SHA-256 do conteúdo e o mesmo valor é usado no treino e na previsão.
+        """
+        sha256 = hashlib.sha256(conteudo).hexdigest()
+        if self._sha_conhecido(sha256) is not None:
+            self._gravar([(url, sha256)], [])
+            return
+        vetor = _descrever_lote([conteudo], self.usar_embedding)[0]
+        if vetor is not None:
+            self._gravar([(url, sha256)], [(sha256, vetor)])
+
+    def conhecidos(self, urls):
+        """{url: vetor} das URLs que já estão no cache visual."""
+        urls = list(dict.fromkeys(urls))
+        vetores = {}
+        for inicio in range(0, len(urls), 500):  # Limite de parâmetros do SQLite
+            vetores.update(self._vetores_conhecidos(urls[inicio:inicio + 500]))
+        return vetores
+
+    def descrever(self, urls, sessao=None, cache=None, max_downloads=8, timeout=10):
+        """Devolve {url: vetor} para as URLs que puderam ser descritas, calculando só o que falta."""
+        vetores = self.conhecidos(urls)
+        faltando = [url for url in dict.fromkeys(urls) if url not in vetores]
+        if not faltando:
+            return vetores
+
+        def baixar(url):
+            try:
+                if cache:
+                    return cache.obter(url, sessao, timeout=timeout).content
+                resp = (sessao or requests).get(url, timeout=timeout)
+                resp.raise_for_status()
+                return resp.content
+            except Exception:
+                return None
+
+        print(f"Calculando características visuais de {len(faltando)} imagem(ns)...")
+        with ThreadPoolExecutor(max_workers=max_downloads) as executor:
+            conteudos = dict(zip(faltando, executor.map(baixar, faltando)))
+        vetores.update(self.descrever_conteudos(conteudos))
+        return vetores
+
+    def descrever_conteudos(self, conteudos):
+        """
+        Descreve bytes já baixados ({url: bytes ou None}) em lotes no pool de processos e os grava;
+        para quem baixa as imagens por conta própria (ex.: o modo em lote, pelo seu agendador).
+        """
+        vetores = {}
+        pares, por_sha = [], {}
+        for url, conteudo in conteudos.items():
+            if conteudo is None:
+                continue
+            sha256 = hashlib.sha256(conteudo).hexdigest()
+            pares.append((url, sha256))
+            conhecido = self._sha_conhecido(sha256)
+            if conhecido is not None:
+                vetores[url] = conhecido
+            else:
+                por_sha.setdefault(sha256, conteudo)
+
+        novos = []
+        if por_sha:
+            shas = list(por_sha)
+            lotes = [[por_sha[sha] for sha in shas[i:i + self.tamanho_lote]]
+                     for i in range(0, len(shas), self.tamanho_lote)]
+            calculados = [v for lote in self._executor().map(_descrever_lote, lotes, repeat(self.usar_embedding))
+                          for v in lote]
+            novos = [(sha, vetor) for sha, vetor in zip(shas, calculados) if vetor is not None]
+        self._gravar(pares, novos)
+        por_sha_calculado = dict(novos)
+        for url, sha256 in pares:
+            if url not in vetores and sha256 in por_sha_calculado:
+                vetores[url] = por_sha_calculado[sha256]
+        return vetores
+
+    def adicionar_colunas(self, df, sessao=None, cache=None, baixar=True):
+        """
+        Acrescenta as colunas 'vis_*' ao DataFrame (NaN nas imagens que não puderam ser descritas).
+        Com 'baixar' False, usa só o que já está no cache visual.
+        """
+        urls = df['url'].tolist()
+        vetores = self.descrever(urls, sessao, cache) if baixar else self.conhecidos(urls)
+        matriz = np.full((len(df), self.dimensao), np.nan, dtype=np.float32)
+        for i, url in enumerate(df['url']):
+            if url in vetores:
+                matriz[i] = vetores[url]
+        visuais = pd.DataFrame(matriz, columns=self.colunas, index=df.index)
+        return pd.concat([df.drop(columns=[c for c in self.colunas if c in df.columns]), visuais], axis=1)
+
+    def fechar(self):
+        for extrator in filter(None, (self, self._variante)):
+            if extrator._pool is not None:
+                extrator._pool.shutdown()
+                extrator._pool = None
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+# Arquivo: descoberta_imagens.py
+
+# Descoberta de imagens em streaming: o HTML é analisado conforme os blocos
+# chegam da rede (ou do cache), e cada imagem encontrada é entregue na hora,
+# sem montar a árvore inteira da página. Usa o HTMLPullParser do lxml quando
+# ele está instalado e o html.parser da biblioteca padrão caso contrário.
+#
+# Além de <img src>, cobre atributos de lazy-load, srcset, <picture>/<source>
+# e background-image em atributos style e em blocos <style>.
+
+import os
+import re
+import codecs
+import urllib.parse
+from html.parser import HTMLParser
+
+import requests
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Atributos usados por bibliotecas de lazy-load, em ordem de preferência
+ATRIBUTOS_LAZY = ('data-original', 'data-src', 'data-lazy-src', 'data-lazy', 'data-url', 'data-hi-res-src',
+                  'data-full-src', 'data-echo')
+ATRIBUTOS_SRCSET = ('data-srcset', 'data-lazy-srcset', 'srcset')
+TAGS_VAZIAS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+_REGEX_URL_CSS = re.compile(r'background(?:-image)?\s*:[^;{}]*?url\(\s*[\'"]?([^\'")]+?)[\'"]?\s*\)', re.IGNORECASE)
+_REGEX_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+def maior_do_srcset(srcset):
+    """Escolhe a URL de maior resolução de um srcset ("a.jpg 1x, b.jpg 2x" ou "a.jpg 320w, b.jpg 640w")."""
+    melhor, melhor_peso = None, -1.0
+    for candidato in srcset.split(','):
+        partes = candidato.strip().split()
+        if not partes:
+            continue
+        peso = 1.0
+        if len(partes) > 1 and partes[1][:-1].replace('.', '', 1).isdigit():
+            peso = float(partes[1][:-1])
+        if peso > melhor_peso:
+            melhor, melhor_peso = partes[0], peso
+    return melhor
+
+
+def features_de_candidato(src, base_url, alt='', width=None, height=None, parent_tag=None):
+    """Monta o dict de features de uma imagem a partir dos seus atributos já extraídos."""
+    if not src or src.startswith('data:'):
+        return None
+    absolute_url = urllib.parse.urljoin(base_url, src.strip())
+    return {
+        'url': absolute_url,
+        'extension': os.path.splitext(urllib.parse.urlparse(absolute_url).path)[1].lower(),
+        'alt': alt if alt is not None else '',
+        'width': width,
+        'height': height,
+        'parent_tag': parent_tag
+    }
+
+
+class _ParserPadrao(HTMLParser):
+    """Backend da biblioteca padrão: repassa os eventos ao DescobridorImagens mantendo a pilha de tags."""
+
+    def __init__(self, descobridor):
+        super().__init__(convert_charrefs=True)
+        self.descobridor = descobridor
+        self.pilha = []
+        self.texto = []
+
+    def handle_starttag(self, tag, attrs):
+        parent_tag = self.pilha[-1] if self.pilha else None
+        self.descobridor._abrir(tag, dict(attrs), parent_tag)
+        if tag not in TAGS_VAZIAS:
+            self.pilha.append(tag)
+            if tag in ('title', 'style'):
+                self.texto = []
+
+    def handle_data(self, data):
+        if self.pilha and self.pilha[-1] in ('title', 'style'):
+            self.texto.append(data)
+
+    def handle_endtag(self, tag):
+        if tag not in self.pilha:
+            return
+        while self.pilha:
+            aberta = self.pilha.pop()
+            if aberta == tag:
+                break
+        self.descobridor._fechar(tag, ''.join(self.texto) if tag in ('title', 'style') else None)
+
+    def alimentar(self, texto):
+        self.feed(texto)
+
+    def fechar(self):
+        self.close()
+
+
+class _ParserLxml:
+    """Backend lxml: HTMLPullParser com limpeza dos elementos já fechados para manter a memória baixa."""
+
+    def __init__(self, descobridor):
+        self.descobridor = descobridor
+        self.parser = etree.HTMLPullParser(events=('start', 'end'))
+
+    def _processar_eventos(self):
+        for evento, elem in self.parser.read_events():
+            if not isinstance(elem.tag, str):  # Comentários e instruções de processamento
+                continue
+            if evento == 'start':
+                parent = elem.getparent()
+                # O parser HTML4 do libxml2 não conhece alguns elementos vazios do HTML5 (ex.: <source>)
+                while parent is not None and parent.tag in TAGS_VAZIAS:
+                    parent = parent.getparent()
+                self.descobridor._abrir(elem.tag, dict(elem.attrib), parent.tag if parent is not None else None)
+            else:
+                texto = (elem.text or '') if elem.tag in ('title', 'style') else None
+                self.descobridor._fechar(elem.tag, texto)
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+    def alimentar(self, texto):
+        self.parser.feed(texto)
+        self._processar_eventos()
+
+    def fechar(self):
+        self.parser.close()
+        self._processar_eventos()
+
+
+class DescobridorImagens:
+    """
+    Recebe o HTML em blocos de bytes e gera as features de cada imagem assim que ela aparece.
+    Cada URL absoluta é entregue uma única vez por página. 'titulo' fica disponível quando o
+    <title> fecha e 'titulo_definido' indica que ele não vai mais mudar (já passou do <head>).
+    Com 'bruto', entrega tuplas (base_url, src, alt, width, height, parent_tag) sem resolver nem
+    deduplicar nada, para que isso seja feito em lote por 'extrair_features_em_lote'.
+    """
+
+    def __init__(self, base_url, encoding=None, backend=None, bruto=False):
+        self.base_url = base_url
+        self.bruto = bruto
+        self.encoding = encoding
+        self.titulo = None
+        self.titulo_definido = False
+        self.backend = backend or ('lxml' if etree is not None else 'html.parser')
+        self._parser = _ParserLxml(self) if self.backend == 'lxml' else _ParserPadrao(self)
+        self._decoder = None
+        self._base_definida = False
+        self._vistas = set()
+        self._prontas = []
+
+    def _emitir(self, src, alt='', width=None, height=None, parent_tag=None):
+        if self.bruto:
+            if src:
+                self._prontas.append((self.base_url, src, alt, width, height, parent_tag))
+            return
+        features = features_de_candidato(src, self.base_url, alt, width, height, parent_tag)
+        if features and features['url'] not in self._vistas:
+            self._vistas.add(features['url'])
+            self._prontas.append(features)
+
+    def _emitir_css(self, css, parent_tag):
+        for src in _REGEX_URL_CSS.findall(css):
+            self._emitir(src, parent_tag=parent_tag)
+
+    def _abrir(self, tag, attrs, parent_tag):
+        if tag == 'base' and attrs.get('href') and not self._base_definida:
+            self.base_url = urllib.parse.urljoin(self.base_url, attrs['href'])
+            self._base_definida = True
+        elif tag == 'body':
+            self.titulo_definido = True
+        elif tag == 'img':
+            srcset = next((attrs[a] for a in ATRIBUTOS_SRCSET if attrs.get(a)), None)
+            src = (next((attrs[a] for a in ATRIBUTOS_LAZY if attrs.get(a)), None)
+                   or (maior_do_srcset(srcset) if srcset else None) or attrs.get('src'))
+            self._emitir(src, attrs.get('alt', ''), attrs.get('width'), attrs.get('height'), parent_tag)
+        elif tag == 'source' and parent_tag == 'picture':
+            srcset = next((attrs[a] for a in ATRIBUTOS_SRCSET if attrs.get(a)), None)
+            if srcset:
+                self._emitir(maior_do_srcset(srcset), parent_tag=parent_tag)
+        if attrs.get('style') and 'url(' in attrs['style']:
+            self._emitir_css(attrs['style'], tag)
+
+    def _fechar(self, tag, texto):
+        if tag == 'title' and self.titulo is None:
+            self.titulo = texto.strip() or None
+            self.titulo_definido = True
+        elif tag == 'head':
+            self.titulo_definido = True
+        elif tag == 'style' and texto:
+            self._emitir_css(texto, 'style')
+
+    def _decodificar(self, bloco, final=False):
+        if self._decoder is None:
+            if not self.encoding:
+                achado = _REGEX_CHARSET.search(bloco[:2048])
+                self.encoding = achado.group(1).decode('ascii') if achado else 'utf-8'
+            try:
+                self._decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+            except LookupError:
+                self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        return self._decoder.decode(bloco, final=final)
+
+    def alimentar(self, bloco):
+        """Processa mais um bloco de bytes e devolve as features das imagens novas encontradas nele."""
+        self._parser.alimentar(self._decodificar(bloco))
+        prontas, self._prontas = self._prontas, []
+        return prontas
+
+    def fechar(self):
+        """Termina a análise e devolve as imagens que ainda estavam pendentes."""
+        self._parser.alimentar(self._decodificar(b'', final=True))
+        self._parser.fechar()
+        self.titulo_definido = True
+        prontas, self._prontas = self._prontas, []
+        return prontas
+
+    def processar(self, blocos):
+        """Gera as features de todas as imagens conforme os blocos são consumidos."""
+        for bloco in blocos:
+            yield from self.alimentar(bloco)
+        yield from self.fechar()
+
+
+class PaginaEmStream:
+    """
+    Página sendo baixada e analisada ao mesmo tempo. Iterar sobre ela gera as features das
+    imagens conforme o HTML chega; 'titulo' e 'titulo_definido' vêm do DescobridorImagens.
+    """
+
+    def __init__(self, url, sessao=None, cache=None, timeout=10, tamanho_bloco=16 * 1024, bruto=False):
+        if cache:
+            url_final, content_type, blocos = cache.obter_em_blocos(url, sessao, timeout, tamanho_bloco)
+        else:
+            resp = (sessao or requests).get(url, stream=True, timeout=timeout)
+            resp.raise_for_status()
+            url_final, content_type, blocos = resp.url, resp.headers.get('Content-Type'), resp.iter_content(tamanho_bloco)
+        encoding = requests.utils.get_encoding_from_headers({'content-type': content_type}) if content_type else None
+        # Sem charset explícito o requests assume ISO-8859-1 para text/*; melhor procurar o <meta charset>
+        if encoding and encoding.lower() == 'iso-8859-1' and 'charset' not in content_type.lower():
+            encoding = None
+        self.url = url_final
+        self.descobridor = DescobridorImagens(url_final, encoding, bruto=bruto)
+        self._blocos = blocos
+
+    @property
+    def titulo(self):
+        return self.descobridor.titulo
+
+    @property
+    def titulo_definido(self):
+        return self.descobridor.titulo_definido
+
+    def __iter__(self):
+        return self.descobridor.processar(self._blocos)
@@ -5,14 +5,29 @@
 # PASSO 1: IMPORTAÇÃO DAS BIBLIOTECAS
 # ==============================================================================
 import pandas as pd
+import numpy as np
 import requests
-from bs4 import BeautifulSoup
 import os
-import shutil
 import urllib.parse
 import re
+import io
+import hashlib
+import struct
+import time
+import tempfile
+import threading
+import contextvars
 import joblib
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from cache_http import CacheHTTP
+from indice_conteudo import IndiceConteudo, caminho_livre
+from metricas import METRICAS
+from caracteristicas_visuais import ExtratorVisual, PREFIXO_VISUAL
+from agendador import verificar_cancelamento, informar_progresso, TarefaCancelada
+from armazenamento_dataset import DatasetSegmentado, carregar_dataset
+from descoberta_imagens import PaginaEmStream, features_de_candidato
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder
@@ -25,115 +40,700 @@ from sklearn.impute import SimpleImputer
 # PASSO 2: DEFINIÇÃO DAS FUNÇÕES AUXILIARES
 # ==============================================================================
 
+COLUNAS_DIMENSOES_REAIS = ['real_width', 'real_height']
+
+# Na coleta assistida, probabilidades >= limiar são pré-marcadas e <= 1 - limiar viram negativos automáticos
+LIMIAR_CONFIANCA_PADRAO = 0.9
+
+# Quantas imagens descobertas são acumuladas antes de cada previsão no modo streaming
+TAMANHO_LOTE_PREVISAO = 32
+
+# Arquivo ao lado do modelo com o ponto do dataset até onde o treino incremental já foi
+SUFIXO_ESTADO_INCREMENTAL = '.incremental.json'
+
+# Marcadores JPEG "Start Of Frame", que trazem altura e largura da imagem
+_MARCADORES_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def ler_cabecalho_imagem(dados):
+    """
+    Lê formato e dimensões a partir dos primeiros bytes de uma imagem (PNG, JPEG, GIF, WebP, BMP).
+    Retorna (largura, altura, formato) ou None se os bytes não bastarem ou o formato for desconhecido.
+    """
+    if dados[:8] == b'\x89PNG\r\n\x1a\n' and len(dados) >= 24 and dados[12:16] == b'IHDR':
+        largura, altura = struct.unpack('>II', dados[16:24])
+        return largura, altura, 'PNG'
+
+    if dados[:6] in (b'GIF87a', b'GIF89a') and len(dados) >= 10:
+        largura, altura = struct.unpack('<HH', dados[6:10])
+        return largura, altura, 'GIF'
+
+    if dados[:4] == b'RIFF' and dados[8:12] == b'WEBP' and len(dados) >= 30:
+        chunk = dados[12:16]
+        if chunk == b'VP8 ' and dados[23:26] == b'\x9d\x01\x2a':
+            largura, altura = struct.unpack('<HH', dados[26:30])
+            return largura & 0x3FFF, altura & 0x3FFF, 'WEBP'
+        if chunk == b'VP8L' and dados[20] == 0x2F:
+            bits = int.from_bytes(dados[21:25], 'little')
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1, 'WEBP'
+        if chunk == b'VP8X':
+            return int.from_bytes(dados[24:27], 'little') + 1, int.from_bytes(dados[27:30], 'little') + 1, 'WEBP'
+        return None
+
+    if dados[:2] == b'BM' and len(dados) >= 26:
+        largura, altura = struct.unpack('<ii', dados[18:26])
+        return largura, abs(altura), 'BMP'
+
+    if dados[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 <= len(dados):
+            if dados[i] != 0xFF:
+                return None
+            marcador = dados[i + 1]
+            if marcador == 0xFF:  # Bytes de preenchimento
+                i += 1
+                continue
+            if marcador in _MARCADORES_SOF:
+                altura, largura = struct.unpack('>HH', dados[i + 5:i + 9])
+                return largura, altura, 'JPEG'
+            if marcador == 0x01 or 0xD0 <= marcador <= 0xD9:  # Marcadores sem tamanho
+                i += 2
+                continue
+            i += 2 + struct.unpack('>H', dados[i + 2:i + 4])[0]
+    return None
+
+
+def sondar_imagem(url, sessao=None, bytes_iniciais=16 * 1024, limite_bytes=256 * 1024, timeout=10, cache=None):
+    """
+    Descobre dimensões e formato reais de uma imagem lendo só o começo do arquivo.
+    Pede um Range dos primeiros bytes e continua lendo (até 'limite_bytes') só se o cabeçalho
+    ainda não estiver completo, como em JPEGs com EXIF grande. Se mesmo assim não der, cai para
+    o download completo decodificado pelo Pillow. Retorna um dict ou None em caso de falha.
+    Com 'cache', reaproveita metadados já sondados ou o corpo já baixado antes de ir à rede.
+    """
+    if cache:
+        return cache.metadados(url) or sondar_para_o_cache(url, sessao, cache, bytes_iniciais, limite_bytes, timeout)
+
+    sessao = sessao or requests
+    try:
+        cabecalho = {'Range': f'bytes=0-{limite_bytes - 1}'}
+        with sessao.get(url, headers=cabecalho, stream=True, timeout=timeout) as resp:
+            resp.raise_for_status()
+            dados = b''
+            for bloco in resp.iter_content(chunk_size=bytes_iniciais):
+                dados += bloco
+                resultado = ler_cabecalho_imagem(dados)
+                if resultado or len(dados) >= limite_bytes:
+                    break
+            else:
+                resultado = ler_cabecalho_imagem(dados)
+        if resultado:
+            largura, altura, formato = resultado
+            return {'real_width': largura, 'real_height': altura, 'format': formato}
+
+        # Fallback: download completo, decodificando só o cabeçalho com o Pillow
+        from PIL import Image
+        resp = sessao.get(url, timeout=timeout)
+        resp.raise_for_status()
+        img_obj = Image.open(io.BytesIO(resp.content))
+        return {'real_width': img_obj.width, 'real_height': img_obj.height, 'format': img_obj.format}
+    except Exception:
+        return None
+
+
+def sondar_para_o_cache(url, sessao, cache, bytes_iniciais=16 * 1024, limite_bytes=256 * 1024, timeout=10):
+    """
+    Parte de 'sondar_imagem' depois de os metadados não estarem no cache: lê o cabeçalho do corpo
+    já guardado ou sonda pela rede e guarda o resultado. Para quem já consultou 'cache.metadados'.
+    """
+    conteudo = cache.conteudo_local(url)
+    resultado = ler_cabecalho_imagem(conteudo) if conteudo else None
+    if resultado:
+        metadados = dict(zip(('real_width', 'real_height', 'format'), resultado))
+        cache.salvar_metadados(url, metadados)
+        return metadados
+    metadados = sondar_imagem(url, sessao, bytes_iniciais, limite_bytes, timeout)
+    if metadados:
+        cache.salvar_metadados(url, metadados)
+    return metadados
+
+
+def adicionar_dimensoes_reais(features_list, sessao=None, max_workers=8, cache=None):
+    """Sonda em paralelo todas as imagens da lista e preenche 'real_width', 'real_height' e 'format'."""
+    with METRICAS.cronometrar('sondagem'), ThreadPoolExecutor(max_workers=max_workers) as executor:
+        resultados = executor.map(lambda f: sondar_imagem(f['url'], sessao, cache=cache), features_list)
+        for features, resultado in zip(features_list, resultados):
+            features.update(resultado or {'real_width': None, 'real_height': None, 'format': None})
+    return features_list
+
+
+def colunas_numericas_do_modelo(model):
+    """Retorna as colunas numéricas que o pré-processador do modelo espera receber."""
+    for nome, _, colunas in model.named_steps['preprocessor'].transformers:
+        if nome == 'num':
+            return list(colunas)
+    return []
+
+
+def completar_features_visuais(loaded_model, df, visuais=None, sessao=None, cache=None, baixar=True):
+    """
+    Garante as colunas 'vis_*' que o modelo espera: calculadas pelo ExtratorVisual 'visuais'
+    (na configuração que gera esse número de colunas) ou, sem ele, preenchidas com NaN
+    (o imputador do modelo usa a mediana do treino).
+    Com 'baixar' False, só os descritores que já estão no cache visual são usados.
+    """
+    colunas = [col for col in colunas_numericas_do_modelo(loaded_model) if col.startswith(PREFIXO_VISUAL)]
+    if not colunas:
+        return df
+    if visuais is not None:
+        with METRICAS.cronometrar('visuais'):
+            df = visuais.para_dimensao(len(colunas)).adicionar_colunas(df, sessao, cache, baixar)
+    for col in colunas:
+        if col not in df.columns:
+            df[col] = np.nan
+    return df
+
+
 def extract_features(img_tag, base_url):
-    """Extrai características (features) de uma única tag <img>."""
-    features = {}
-    src = img_tag.get('data-original') or img_tag.get('src')
-    if not src: return None
-
-    absolute_url = urllib.parse.urljoin(base_url, src)
-    features.update({
-        'url': absolute_url,
-        'extension': os.path.splitext(urllib.parse.urlparse(absolute_url).path)[1].lower(),
-        'alt': img_tag.get('alt', ''),
-        'width': img_tag.get('width'),
-        'height': img_tag.get('height'),
-        'parent_tag': img_tag.parent.name if img_tag.parent else None
-    })
-    return features
+    """Extrai características (features) de uma única tag <img> do BeautifulSoup."""
+    return features_de_candidato(img_tag.get('data-original') or img_tag.get('src'), base_url,
+                                 alt=img_tag.get('alt', ''),
+                                 width=img_tag.get('width'),
+                                 height=img_tag.get('height'),
+                                 parent_tag=img_tag.parent.name if img_tag.parent else None)
+
+
+def sanitizar_titulo(page_title):
+    """Transforma o título da página em um nome de pasta válido."""
+    page_title = page_title or 'Pagina_Sem_Titulo'
+    return re.sub(r'[\\/*?:"<>|]', '', page_title).strip().replace(' ', '_')
 
 
 def clean_dataframe(df):
     """Limpa o DataFrame para o processamento do modelo."""
     for col in ['width', 'height']:
         df[col] = pd.to_numeric(df[col].astype(str).str.replace('px', '', regex=False), errors='coerce')
+    for col in COLUNAS_DIMENSOES_REAIS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
     text_cols = ['url', 'alt']
     for col in text_cols:
         df[col] = df[col].fillna('')
     return df
 
 
+def criar_sessao(max_conexoes=16):
+    """Cria uma Session com pool de conexões keep-alive compartilhado entre threads."""
+    sessao = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_conexoes, pool_maxsize=max_conexoes)
+    sessao.mount('http://', adapter)
+    sessao.mount('https://', adapter)
+    return sessao
+
+
+def obter_conteudo(url, sessao=None, cache=None, timeout=10):
+    """Busca 'url' passando pelo cache quando houver; o retorno tem '.content' e '.url' (final)."""
+    if cache:
+        return cache.obter(url, sessao, timeout=timeout)
+    resp = (sessao or requests).get(url, timeout=timeout)
+    resp.raise_for_status()
+    return resp
+
+
+class BaixadorConcorrente:
+    """
+    Baixa arquivos em paralelo com um pool limitado de workers.
+    Aceita um limite opcional de conexões simultâneas por host, reaproveita conexões
+    via Session, tenta novamente com backoff exponencial e grava em arquivo temporário,
+    renomeando só no final, para nunca deixar um arquivo parcial no disco.
+    Com 'cache', o conteúdo vem do CacheHTTP (revalidado) em vez de ser baixado de novo.
+    Com 'indice' (IndiceConteudo), URLs já baixadas são puladas e imagens duplicadas ou quase
+    duplicadas de arquivos existentes não são gravadas.
+    """
+
+    STATUS_RETENTAVEIS = {429, 500, 502, 503, 504}
+
+    def __init__(self, sessao=None, max_workers=8, max_por_host=None, tentativas=3, backoff=0.5, timeout=10,
+                 cache=None, indice=None):
+        self.sessao = sessao or criar_sessao(max_workers)
+        self.cache = cache
+        self.indice = indice
+        self.max_por_host = max_por_host
+        self.tentativas = tentativas
+        self.backoff = backoff
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._semaforos = {}
+        self._lock = threading.Lock()
+        self._futuros = []
+        self._inicio = None
+        self.arquivos = 0
+        self.bytes = 0
+        self.falhas = 0
+        self.duplicadas = 0
+        self.caminhos = {}  # URL -> arquivo onde o conteúdo ficou (pode ter sufixo ou ser uma duplicata)
+        self._reservados = set()
+
+    def _semaforo_do_host(self, url):
+        if not self.max_por_host:
+            return None
+        host = urllib.parse.urlparse(url).netloc
+        with self._lock:
+            if host not in self._semaforos:
+                self._semaforos[host] = threading.BoundedSemaphore(self.max_por_host)
+            return self._semaforos[host]
+
+    def _gravar_atomicamente(self, blocos, filepath, url):
+        """
+        Grava os blocos em um arquivo temporário no mesmo diretório e só então renomeia.
+        Com índice, o SHA-256 é calculado durante a gravação e o índice decide se o arquivo
+        é novo e onde ele fica; devolve (bytes gravados, caminho final, True se era duplicata).
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or '.', prefix='.', suffix='.part')
+        digest = hashlib.sha256() if self.indice else None
+        total = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for bloco in blocos:
+                    f.write(bloco)
+                    total += len(bloco)
+                    if digest:
+                        digest.update(bloco)
+            if digest:
+                caminho, duplicata = self.indice.gravar_se_novo(url, tmp_path, digest.hexdigest(), filepath)
+                return (0 if duplicata else total), caminho, duplicata
+            os.replace(tmp_path, filepath)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return total, filepath, False
+
+    def _baixar_uma_vez(self, url, filepath):
+        if self.cache:
+            # Em blocos também pelo cache: a imagem nunca fica inteira na memória
+            _, _, blocos = self.cache.obter_em_blocos(url, self.sessao, self.timeout)
+            try:
+                return self._gravar_atomicamente(blocos, filepath, url)
+            finally:
+                blocos.close()
+        with self.sessao.get(url, stream=True, timeout=self.timeout) as img_resp:
+            img_resp.raise_for_status()
+            return self._gravar_atomicamente(img_resp.iter_content(chunk_size=64 * 1024), filepath, url)
+
+    def baixar(self, url, filepath):
+        """
+        Baixa 'url' para 'filepath' na thread atual, com retentativas. Retorna os bytes gravados
+        (0 se a imagem já existia ou era duplicata) ou None se o download falhou.
+        """
+        verificar_cancelamento()
+        if self._inicio is None:
+            self._inicio = time.perf_counter()
+        existente = self.indice.caminho_da_url(url) if self.indice else None
+        if existente:
+            with self._lock:
+                self.caminhos[url] = existente
+                self.duplicadas += 1
+            METRICAS.incrementar('downloads_duplicados')
+            print(f"  - Já baixada: {os.path.basename(existente)}")
+            return 0
+        if not self.indice:
+            # Sem índice, só os nomes já usados nesta execução ganham sufixo (o hash curto da URL)
+            with self._lock:
+                filepath = caminho_livre(filepath, hashlib.sha256(url.encode('utf-8')).hexdigest()[:8],
+                                         self._reservados.__contains__)
+                self._reservados.add(filepath)
+        semaforo = self._semaforo_do_host(url)
+        for tentativa in range(self.tentativas):
+            try:
+                with METRICAS.cronometrar('download'):
+                    if semaforo:
+                        with semaforo:
+                            total, caminho, duplicata = self._baixar_uma_vez(url, filepath)
+                    else:
+                        total, caminho, duplicata = self._baixar_uma_vez(url, filepath)
+                with self._lock:
+                    self.caminhos[url] = caminho
+                    if duplicata:
+                        self.duplicadas += 1
+                    else:
+                        self.arquivos += 1
+                        self.bytes += total
+                if duplicata:
+                    METRICAS.incrementar('downloads_duplicados')
+                    print(f"  - Duplicata de {caminho}, não salva")
+                else:
+                    METRICAS.incrementar('imagens_baixadas')
+                    METRICAS.incrementar('bytes_baixados', total)
+                    print(f"  - Salvo {os.path.basename(caminho)}")
+                return total
+            except (requests.RequestException, OSError) as e:
+                status = getattr(getattr(e, 'response', None), 'status_code', None)
+                ultima = tentativa == self.tentativas - 1
+                if ultima or (status is not None and status not in self.STATUS_RETENTAVEIS):
+                    with self._lock:
+                        self.falhas += 1
+                    METRICAS.incrementar('downloads_falhos')
+                    print(f"  - Falha ao baixar {url}: {e}")
+                    return None
+                time.sleep(self.backoff * (2 ** tentativa))
+                verificar_cancelamento()
+
+    def enviar(self, url, filepath):
+        """Agenda o download de 'url' para 'filepath' e devolve o Future correspondente."""
+        # O contexto é copiado para que o download continue associado à tarefa do agendador (log e cancelamento)
+        futuro = self._executor.submit(contextvars.copy_context().run, self.baixar, url, filepath)
+        self._futuros.append(futuro)
+        return futuro
+
+    def concluir(self):
+        """Espera todos os downloads terminarem e devolve as estatísticas agregadas."""
+        try:
+            for feitos, futuro in enumerate(self._futuros, start=1):
+                futuro.result()
+                informar_progresso(feitos, len(self._futuros))
+        except TarefaCancelada:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        self._executor.shutdown(wait=True)
+        return self.estatisticas()
+
+    def estatisticas(self):
+        """Imprime e devolve o throughput acumulado desde o primeiro download."""
+        duracao = time.perf_counter() - self._inicio if self._inicio else 0.0
+        mb = self.bytes / (1024 * 1024)
+        estatisticas = {
+            'arquivos': self.arquivos,
+            'falhas': self.falhas,
+            'duplicadas': self.duplicadas,
+            'bytes': self.bytes,
+            'segundos': duracao,
+            'arquivos_por_s': self.arquivos / duracao if duracao else 0.0,
+            'mb_por_s': mb / duracao if duracao else 0.0,
+        }
+        print(f"Throughput: {self.arquivos} arquivo(s), {mb:.2f} MB em {duracao:.2f}s "
+              f"({estatisticas['arquivos_por_s']:.1f} arquivos/s, {estatisticas['mb_por_s']:.2f} MB/s), "
+              f"{self.falhas} falha(s), {self.duplicadas} duplicada(s).")
+        return estatisticas
+
+
+class RegistroModelos:
+    """
+    Mantém os modelos já carregados em memória, indexados pelo caminho do arquivo.
+    O arquivo só é lido de novo quando o mtime/tamanho muda e, nesse caso, o hash do
+    conteúdo decide se é preciso mesmo fazer o unpickle outra vez.
+    """
+
+    def __init__(self):
+        self._modelos = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hash_do_arquivo(caminho):
+        digest = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(bloco)
+        return digest.hexdigest()
+
+    def obter(self, model_path, mmap_mode=None):
+        """Devolve o modelo de 'model_path'; levanta FileNotFoundError se ele não existir."""
+        caminho = os.path.abspath(model_path)
+        info = os.stat(caminho)
+        assinatura = (info.st_mtime_ns, info.st_size)
+        with self._lock:
+            entrada = self._modelos.get(caminho)
+            if entrada and entrada['assinatura'] == assinatura and entrada['mmap_mode'] == mmap_mode:
+                return entrada['modelo']
+
+            digest = self._hash_do_arquivo(caminho)
+            if entrada and entrada['hash'] == digest and entrada['mmap_mode'] == mmap_mode:
+                entrada['assinatura'] = assinatura
+                return entrada['modelo']
+
+            modelo = joblib.load(caminho, mmap_mode=mmap_mode)
+            self._modelos[caminho] = {'modelo': modelo, 'assinatura': assinatura, 'hash': digest,
+                                      'mmap_mode': mmap_mode}
+            return modelo
+
+
+REGISTRO_MODELOS = RegistroModelos()
+
+
+def carregar_modelo(model_path, mmap_mode=None):
+    """Carrega o modelo pelo registro compartilhado, reaproveitando a cópia em memória quando possível."""
+    return REGISTRO_MODELOS.obter(model_path, mmap_mode=mmap_mode)
+
+
+def extrair_pagina(url, sessao=None, cache=None, bruto=False):
+    """
+    Busca uma página e devolve (título sanitizado, lista de features das imagens).
+    Com 'bruto', a lista traz as tuplas de atributos do DescobridorImagens, prontas para
+    'extrair_features_em_lote'.
+    """
+    with METRICAS.cronometrar('pagina'):
+        pagina = PaginaEmStream(url, sessao, cache, bruto=bruto)
+        features_list = list(pagina)
+    METRICAS.incrementar('paginas')
+    METRICAS.incrementar('imagens_encontradas', len(features_list))
+    return sanitizar_titulo(pagina.titulo), features_list
+
+
+def prever_imagens(loaded_model, features_list, sessao=None, cache=None, max_workers=8, visuais=None):
+    """
+    Aplica o modelo às features de uma página e devolve o DataFrame das imagens previstas como positivas.
+    Modelos treinados com características visuais as recebem de 'visuais' (ExtratorVisual).
+    """
+    # Modelos treinados com dimensões reais precisam que elas sejam sondadas também na previsão
+    if set(COLUNAS_DIMENSOES_REAIS) & set(colunas_numericas_do_modelo(loaded_model)):
+        print(f"Sondando dimensões reais de {len(features_list)} imagem(ns)...")
+        adicionar_dimensoes_reais(features_list, sessao, max_workers, cache)
+    new_df = completar_features_visuais(loaded_model, pd.DataFrame(features_list), visuais, sessao, cache)
+
+    with METRICAS.cronometrar('previsao'):
+        new_df = clean_dataframe(new_df)
+
+        predictions = loaded_model.predict(new_df)
+    METRICAS.incrementar('imagens_previstas', int((predictions == 1).sum()))
+    return new_df[predictions == 1]
+
+
+def probabilidade_positiva(loaded_model, X):
+    """Probabilidade da classe 1 (imagem desejada) para cada linha de X."""
+    return loaded_model.predict_proba(X)[:, list(loaded_model.classes_).index(1)]
+
+
+def triar_candidatos(loaded_model, features_list, limiar=LIMIAR_CONFIANCA_PADRAO, sessao=None, cache=None,
+                     max_workers=8, visuais=None):
+    """
+    Aprendizado ativo na coleta: pontua as imagens com o modelo atual e as separa em índices
+    'positivas' (probabilidade >= limiar, pré-marcadas), 'negativas' (<= 1 - limiar, rotuladas
+    automaticamente como 0) e 'incertas' (o resto, da mais incerta para a menos incerta).
+    Devolve também a lista 'probabilidades', na ordem de 'features_list'.
+    """
+    if (set(COLUNAS_DIMENSOES_REAIS) & set(colunas_numericas_do_modelo(loaded_model))
+            and any('real_width' not in features for features in features_list)):
+        adicionar_dimensoes_reais(features_list, sessao, max_workers, cache)
+    df = completar_features_visuais(loaded_model, pd.DataFrame(features_list), visuais, sessao, cache)
+    probabilidades = probabilidade_positiva(loaded_model, clean_dataframe(df))
+    incerteza = np.abs(probabilidades - 0.5)
+    return {
+        'probabilidades': probabilidades.tolist(),
+        'positivas': [i for i, p in enumerate(probabilidades) if p >= limiar],
+        'negativas': [i for i, p in enumerate(probabilidades) if p <= 1 - limiar],
+        'incertas': [int(i) for i in np.argsort(incerteza, kind='stable') if 1 - limiar < probabilidades[i] < limiar],
+    }
+
+
+def extrair_features_em_lote(paginas_brutas):
+    """
+    Featurização colunar de várias páginas de uma vez. Recebe uma lista (uma entrada por página)
+    de tuplas (base_url, src, alt, width, height, parent_tag) e devolve um único DataFrame com as
+    mesmas colunas de 'extract_features', mais '_pagina' (posição da página na lista).
+    A resolução de URLs relativas, a extensão e a deduplicação são feitas sobre as colunas inteiras.
+    """
+    colunas = ['base_url', 'src', 'alt', 'width', 'height', 'parent_tag']
+    registros = [tupla for tuplas in paginas_brutas for tupla in tuplas]
+    df = pd.DataFrame(registros, columns=colunas)
+    df['_pagina'] = np.repeat(np.arange(len(paginas_brutas)), [len(tuplas) for tuplas in paginas_brutas])
+
+    src = df['src'].astype(str).str.strip()
+    df = df[~src.str.startswith('data:')]
+    src = src[df.index]
+
+    # Só as URLs relativas passam pelo urljoin, uma vez por par (base, src) distinto
+    absoluta = src.str.match(r'^[a-zA-Z][a-zA-Z0-9+.-]*://')
+    relativas = pd.MultiIndex.from_arrays([df.loc[~absoluta, 'base_url'], src[~absoluta]]).unique()
+    resolvidas = {par: urllib.parse.urljoin(*par) for par in relativas}
+    df['url'] = src.where(absoluta, pd.Series(list(zip(df['base_url'], src)), index=df.index).map(resolvidas))
+
+    caminho = (df['url'].str.replace(r'^[a-zA-Z][a-zA-Z0-9+.-]*://[^/?#]*', '', regex=True)
+               .str.replace(r'[?#].*$', '', regex=True))
+    ultimo_segmento = caminho.str.rsplit('/', n=1).str[-1]
+    df['extension'] = ultimo_segmento.str.extract(r'[^.](\.[^.]*)$', expand=False).fillna('').str.lower()
+    df['alt'] = df['alt'].fillna('')
+
+    df = df.drop_duplicates(subset=['_pagina', 'url'])
+    return df[['url', 'extension', 'alt', 'width', 'height', 'parent_tag', '_pagina']].reset_index(drop=True)
+
+
+def prever_paginas_em_lote(loaded_model, paginas_brutas, sessao=None, cache=None, max_workers=8, visuais=None,
+                           dimensoes=None, features=None):
+    """
+    Pontua as imagens de várias páginas com um único predict_proba e devolve uma lista com,
+    para cada página, o DataFrame das imagens previstas como positivas (coluna 'probabilidade').
+    O índice de cada DataFrame é a posição da imagem dentro da sua página.
+    Com 'dimensoes' ({url: resultado de sondar_imagem}), nada vai à rede aqui: quem chama já
+    sondou as imagens e baixou as que faltavam no cache visual (ex.: o modo em lote, pelo seu agendador).
+    Com 'features' (o DataFrame de 'extrair_features_em_lote' dessas páginas), elas não são featurizadas de novo.
+    """
+    df = extrair_features_em_lote(paginas_brutas) if features is None else features
+    if df.empty:
+        return [df.drop(columns='_pagina') for _ in paginas_brutas]
+
+    baixar = dimensoes is None
+    if set(COLUNAS_DIMENSOES_REAIS) & set(colunas_numericas_do_modelo(loaded_model)):
+        if baixar:
+            sondadas = adicionar_dimensoes_reais(df[['url']].to_dict('records'), sessao, max_workers, cache)
+        else:
+            sondadas = [dict(url=url, **(dimensoes.get(url) or
+                                         {'real_width': None, 'real_height': None, 'format': None}))
+                        for url in df['url']]
+        df = df.join(pd.DataFrame(sondadas, index=df.index).drop(columns='url'))
+    df = completar_features_visuais(loaded_model, df, visuais, sessao, cache, baixar)
+
+    with METRICAS.cronometrar('previsao'):
+        df = clean_dataframe(df)
+        df.index = df.groupby('_pagina').cumcount()
+        df['probabilidade'] = probabilidade_positiva(loaded_model, df.drop(columns='_pagina'))
+
+    selecionadas = df[df['probabilidade'] > 0.5]
+    METRICAS.incrementar('imagens_previstas', len(selecionadas))
+    grupos = {pagina: grupo.drop(columns='_pagina') for pagina, grupo in selecionadas.groupby('_pagina')}
+    vazio = selecionadas.drop(columns='_pagina').iloc[0:0]
+    return [grupos.get(pagina, vazio) for pagina in range(len(paginas_brutas))]
+
+
+def caminho_de_destino(save_dir, img_url, index):
+    """Caminho onde a imagem 'img_url' é salva dentro da pasta da página."""
+    filename = os.path.basename(urllib.parse.urlparse(img_url).path) or f"image_{index}.jpg"
+    return os.path.join(save_dir, filename)
+
+
 # ==============================================================================
 # PASSO 3: FUNÇÕES PRINCIPAIS DA APLICAÇÃO (MODOS)
 # ==============================================================================
 
-def coletar_dados(url, arquivo_saida='image_dataset_features.csv'):
-    """Modo de Coleta: Raspa uma URL, pede a seleção do usuário e salva no CSV."""
+def coletar_dados(url, arquivo_saida='dataset', sondar=True, cache=None, model_path=None,
+                  limiar=LIMIAR_CONFIANCA_PADRAO, visuais=None):
+    """
+    Modo de Coleta: Raspa uma URL, pede a seleção do usuário e anexa as linhas ao dataset segmentado.
+    Com 'sondar', as dimensões reais de cada imagem são lidas dos cabeçalhos antes de salvar.
+    Com 'model_path' apontando para um modelo existente, a coleta é assistida: as imagens com
+    confiança acima de 'limiar' já vêm marcadas, as negativas confiantes são rotuladas sozinhas
+    e só a faixa incerta (mais as pré-marcadas) é mostrada para revisão.
+    """
     print(f"--- Modo de Coleta de Dados: {url} ---")
     try:
-        resp = requests.get(url)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        features_list = [extract_features(img, resp.url) for img in soup.find_all('img') if
-                         extract_features(img, resp.url)]
+        sessao = criar_sessao()
+        _, features_list = extrair_pagina(url, sessao, cache)
 
         if not features_list:
             print("Nenhuma imagem encontrada na página.")
             return
 
-        print("\n--- Por favor, selecione as imagens que você quer ---")
-        for i, features in enumerate(features_list):
-            print(f"[{i + 1}] URL: {features['url']}")
+        if sondar:
+            print(f"Sondando dimensões reais de {len(features_list)} imagem(ns)...")
+            adicionar_dimensoes_reais(features_list, sessao, cache=cache)
+
+        if model_path and os.path.exists(model_path):
+            triagem = triar_candidatos(carregar_modelo(model_path), features_list, limiar, sessao, cache,
+                                       visuais=visuais)
+            probabilidades = triagem['probabilidades']
+            for i in triagem['negativas']:
+                features_list[i]['selected'] = 0
+            for i in triagem['positivas']:
+                features_list[i]['selected'] = 1
+            print(f"Triagem pelo modelo (limiar {limiar:g}): {len(triagem['positivas'])} pré-marcada(s), "
+                  f"{len(triagem['negativas'])} negativa(s) automática(s), {len(triagem['incertas'])} incerta(s).")
+
+            revisao = triagem['incertas'] + triagem['positivas']
+            if revisao:
+                print("\n--- Revise as imagens ([x] = marcada; as incertas vêm primeiro) ---")
+                for numero, i in enumerate(revisao, start=1):
+                    marca = 'x' if i in triagem['positivas'] else ' '
+                    print(f"[{numero}] [{marca}] p={probabilidades[i]:.2f} URL: {features_list[i]['url']}")
+                user_input = input("\nDigite os números das imagens para inverter a marcação, separados por vírgula: ")
+                invertidas = {int(num.strip()) for num in user_input.split(',') if num.strip()}
+                for numero, i in enumerate(revisao, start=1):
+                    selecionada = i in triagem['positivas']
+                    features_list[i]['selected'] = int(selecionada != (numero in invertidas))
+        else:
+            print("\n--- Por favor, selecione as imagens que você quer ---")
+            for i, features in enumerate(features_list):
+                print(f"[{i + 1}] URL: {features['url']}")
 
-        user_input = input("\nDigite os números das imagens, separados por vírgula: ")
-        selected_numbers = {int(num.strip()) for num in user_input.split(',')}
+            user_input = input("\nDigite os números das imagens, separados por vírgula: ")
+            selected_numbers = {int(num.strip()) for num in user_input.split(',') if num.strip()}
 
-        for i, features in enumerate(features_list):
-            features['selected'] = 1 if (i + 1) in selected_numbers else 0
+            for i, features in enumerate(features_list):
+                features['selected'] = 1 if (i + 1) in selected_numbers else 0
 
         df_novos_dados = pd.DataFrame(features_list)
 
-        if os.path.exists(arquivo_saida):
-            df_existente = pd.read_csv(arquivo_saida)
-            df_final = pd.concat([df_existente, df_novos_dados], ignore_index=True)
-            df_final.drop_duplicates(subset=['url'], keep='last', inplace=True)
-        else:
-            df_final = df_novos_dados
-
-        df_final.to_csv(arquivo_saida, index=False)
-        print(f"\n--- Sucesso! Dados salvos em '{arquivo_saida}'. Total de {len(df_final)} entradas. ---")
+        # Só um segmento novo é gravado; a deduplicação por URL acontece pelo índice do dataset
+        dataset = DatasetSegmentado(arquivo_saida)
+        dataset.anexar(df_novos_dados)
+        print(f"\n--- Sucesso! Dados salvos em '{arquivo_saida}'. Total de {len(dataset)} entradas. ---")
+        if cache:
+            print(cache.resumo())
 
     except Exception as e:
         print(f"Ocorreu um erro na coleta de dados: {e}")
 
 
-def treinar_modelo(dataset_path='image_dataset_features.csv', model_path='image_model.joblib'):
-    """Modo de Treinamento: Lê o CSV, treina o modelo de IA e o salva."""
+def preparar_dados_treino(df):
+    """Limpa o dataset e devolve (X, y, colunas numéricas que o modelo deve usar)."""
+    df = clean_dataframe(df)
+    y = df['selected'].astype(int)
+    X = df.drop('selected', axis=1)
+
+    # As dimensões reais e as características visuais só entram no modelo quando o dataset tem valores
+    opcionais = COLUNAS_DIMENSOES_REAIS + [col for col in X.columns if col.startswith(PREFIXO_VISUAL)]
+    numerical_features = ['width', 'height'] + [col for col in opcionais
+                                                if col in X.columns and X[col].notna().any()]
+    return X, y, numerical_features
+
+
+def criar_pipeline(numerical_features):
+    """Pipeline do modo de treinamento completo: TF-IDF + OneHot + LogisticRegression."""
+    categorical_features = ['extension', 'parent_tag']
+
+    # --- ESTA É A CORREÇÃO ---
+    # A definição completa do preprocessor, sem placeholders.
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ('num', SimpleImputer(strategy='median'), numerical_features),
+            ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features),
+            ('url_text', TfidfVectorizer(max_features=100), 'url'),
+            ('alt_text', TfidfVectorizer(max_features=50), 'alt')
+        ],
+        remainder='drop'
+    )
+
+    return Pipeline(steps=[
+        ('preprocessor', preprocessor),
+        ('classifier', LogisticRegression(max_iter=1000, class_weight='balanced'))
+    ])
+
+
+def treinar_modelo(dataset_path='dataset', model_path='image_model.joblib', visuais=None, cache=None):
+    """
+    Modo de Treinamento: Lê o dataset (diretório segmentado ou CSV antigo), treina o modelo de IA e o salva.
+    Com 'visuais' (ExtratorVisual), as características do conteúdo de cada imagem entram como colunas
+    numéricas; só as imagens que ainda não estão no cache visual são baixadas.
+    """
     print(f"--- Modo de Treinamento: Usando '{dataset_path}' ---")
     try:
-        df = pd.read_csv(dataset_path)
-        df = clean_dataframe(df)
+        df = carregar_dataset(dataset_path)
 
         if df['selected'].nunique() < 2:
             print("Erro: O dataset precisa conter exemplos de imagens selecionadas (1) e não selecionadas (0).")
             return
 
-        y = df['selected']
-        X = df.drop('selected', axis=1)
-
-        numerical_features = ['width', 'height']
-        categorical_features = ['extension', 'parent_tag']
-
-        # --- ESTA É A CORREÇÃO ---
-        # A definição completa do preprocessor, sem placeholders.
-        preprocessor = ColumnTransformer(
-            transformers=[
-                ('num', SimpleImputer(strategy='median'), numerical_features),
-                ('cat', OneHotEncoder(handle_unknown='ignore'), categorical_features),
-                ('url_text', TfidfVectorizer(max_features=100), 'url'),
-                ('alt_text', TfidfVectorizer(max_features=50), 'alt')
-            ],
-            remainder='drop'
-        )
-
-        model = Pipeline(steps=[
-            ('preprocessor', preprocessor),
-            ('classifier', LogisticRegression(max_iter=1000, class_weight='balanced'))
-        ])
-
-        model.fit(X, y)
+        if visuais is not None:
+            with METRICAS.cronometrar('visuais'):
+                df = visuais.adicionar_colunas(df, criar_sessao(), cache)
+
+        X, y, numerical_features = preparar_dados_treino(df)
+        model = criar_pipeline(numerical_features)
+
+        with METRICAS.cronometrar('treino'):
+            model.fit(X, y)
         joblib.dump(model, model_path)
+        # Um ajuste completo invalida o estado do treino incremental associado a este arquivo
+        if os.path.exists(model_path + SUFIXO_ESTADO_INCREMENTAL):
+            os.remove(model_path + SUFIXO_ESTADO_INCREMENTAL)
         print(f"--- Sucesso! Modelo treinado e salvo como '{model_path}' ---")
 
     except FileNotFoundError:
@@ -142,57 +742,83 @@ def treinar_modelo(dataset_path='image_dataset_features.csv', model_path='image_
         print(f"Ocorreu um erro no treinamento: {e}")
 
 
-def prever_e_baixar(url, model_path='image_model.joblib', base_save_path='.'):
+def prever_e_baixar(url, model_path='image_model.joblib', base_save_path='.', max_workers=8, max_por_host=None,
+                    cache=None, mmap_mode=None, indice=None, visuais=None, sessao=None):
     """
     Modo de Previsão: Raspa uma URL, usa o modelo para prever e baixa as imagens.
     ALTERAÇÃO: Adicionado 'base_save_path' para definir onde salvar a pasta.
+    Os downloads rodam em paralelo ('max_workers'), com limite opcional por host ('max_por_host').
+    Com 'cache' (CacheHTTP), página, imagens e dimensões sondadas são reaproveitadas entre execuções.
+    O modelo vem do REGISTRO_MODELOS, então chamadas repetidas no mesmo processo não o recarregam.
+    Com 'indice' (IndiceConteudo), imagens já baixadas antes, ou duplicadas, não são gravadas de novo.
+    Com 'visuais' (ExtratorVisual), modelos treinados com características visuais as recebem.
+    Com 'sessao', reaproveita um pool de conexões já aberto (ex.: o do serviço residente).
+    Devolve um resumo da execução (dict), ou None se ela falhou.
     """
     print(f"--- Modo de Previsão: {url} ---")
     try:
-        loaded_model = joblib.load(model_path)
-
-        resp = requests.get(url)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'html.parser')
-
-        page_title = soup.title.string if soup.title else 'Pagina_Sem_Titulo'
-        sanitized_title = re.sub(r'[\\/*?:"<>|]', '', page_title).strip().replace(' ', '_')
-
-        # --- ALTERAÇÃO AQUI ---
-        # Cria o caminho completo para a pasta de salvamento, usando o caminho base
-        save_dir = os.path.join(base_save_path, sanitized_title)
-
-        features_list = [extract_features(img, resp.url) for img in soup.find_all('img') if
-                         extract_features(img, resp.url)]
-
-        if not features_list:
+        loaded_model = carregar_modelo(model_path, mmap_mode)
+
+        sessao = sessao or criar_sessao(max_workers)
+        pagina = PaginaEmStream(url, sessao, cache)
+        baixador = BaixadorConcorrente(sessao=sessao, max_workers=max_workers, max_por_host=max_por_host,
+                                       cache=cache, indice=indice)
+        pendentes = []
+        enviadas = []
+        encontradas = 0
+        previstas = 0
+        save_dir = None
+
+        def prever_pendentes():
+            # Prevê o lote acumulado e já agenda os downloads, sem esperar o fim da página
+            nonlocal previstas, save_dir
+            selected_images = prever_imagens(loaded_model, pendentes, sessao, cache, max_workers, visuais)
+            inicio_do_lote = encontradas - len(pendentes)
+            pendentes.clear()
+            if selected_images.empty:
+                return
+            if save_dir is None:
+                # --- ALTERAÇÃO AQUI ---
+                # Cria o caminho completo para a pasta de salvamento, usando o caminho base
+                save_dir = os.path.join(base_save_path, sanitizar_titulo(pagina.titulo))
+                os.makedirs(save_dir, exist_ok=True)
+                print(f"Baixando imagens para a pasta '{save_dir}'...")
+            for index, row in selected_images.iterrows():
+                destino = caminho_de_destino(save_dir, row['url'], inicio_do_lote + index)
+                baixador.enviar(row['url'], destino)
+                enviadas.append({'url': row['url'], 'arquivo': destino})
+            previstas += len(selected_images)
+
+        for features in pagina:
+            verificar_cancelamento()
+            pendentes.append(features)
+            encontradas += 1
+            # O título precisa estar definido antes de escolher a pasta de destino
+            if len(pendentes) >= TAMANHO_LOTE_PREVISAO and pagina.titulo_definido:
+                prever_pendentes()
+        if pendentes:
+            prever_pendentes()
+
+        METRICAS.incrementar('paginas')
+        METRICAS.incrementar('imagens_encontradas', encontradas)
+        resumo = {'url': url, 'pasta': save_dir, 'encontradas': encontradas, 'previstas': previstas,
+                  'imagens': enviadas, 'downloads': None}
+        if not encontradas:
             print("Nenhuma imagem encontrada para prever.")
-            return
+            return resumo
 
-        new_df = pd.DataFrame(features_list)
-        new_df = clean_dataframe(new_df)
-
-        predictions = loaded_model.predict(new_df)
-        selected_images = new_df[predictions == 1]
-
-        print(f"\nO modelo previu que você vai gostar de {len(selected_images)} imagem(ns).")
+        print(f"\nO modelo previu que você vai gostar de {previstas} imagem(ns).")
 
-        if not selected_images.empty:
-            os.makedirs(save_dir, exist_ok=True)
-            print(f"Baixando imagens para a pasta '{save_dir}'...")
-
-            for index, row in selected_images.iterrows():
-                img_url = row['url']
-                try:
-                    img_resp = requests.get(img_url, stream=True, timeout=10)
-                    filename = os.path.basename(urllib.parse.urlparse(img_url).path) or f"image_{index}.jpg"
-                    filepath = os.path.join(save_dir, filename)  # Agora usa o caminho completo
-                    with open(filepath, 'wb') as f:
-                        shutil.copyfileobj(img_resp.raw, f)
-                    print(f"  - Salvo {filename}")
-                except Exception as e:
-                    print(f"  - Falha ao baixar {img_url}: {e}")
+        if previstas:
+            resumo['downloads'] = baixador.concluir()
+            for imagem in enviadas:
+                imagem['arquivo'] = baixador.caminhos.get(imagem['url'])
             print("--- Download completo ---")
+        if cache:
+            print(cache.resumo())
+        if indice:
+            print(indice.resumo())
+        return resumo
 
     except FileNotFoundError:
         print(f"Erro: Modelo '{model_path}' não encontrado. Execute o modo de treinamento primeiro.")
@@ -208,19 +834,110 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="IA para extrair e baixar imagens de websites.")
     parser.add_argument("--coletar", type=str, help="URL para coletar novos dados de treinamento.")
     parser.add_argument("--treinar", action="store_true", help="Treina o modelo com os dados existentes.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Com --treinar, atualiza o modelo só com as linhas novas (partial_fit).")
+    parser.add_argument("--buscar", action="store_true",
+                        help="Com --treinar, faz a busca de hiperparâmetros com validação cruzada.")
+    parser.add_argument("--folds", type=int, default=5, help="Folds da validação cruzada da busca.")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Processos usados na busca (-1 = todos os núcleos).")
+    parser.add_argument("--refazer", action="store_true", help="Com --incremental, força o ajuste completo.")
+    parser.add_argument("--comparar", action="store_true",
+                        help="Compara a acurácia do treino completo com a do incremental.")
     parser.add_argument("--prever", type=str, help="URL para prever e baixar imagens.")
-    parser.add_argument("--dataset", default="image_dataset_features.csv", help="Caminho para o arquivo do dataset CSV.")
+    parser.add_argument("--lote", type=str, help="Arquivo com uma URL por linha ('-' para stdin) para prever em lote.")
+    parser.add_argument("--servico", nargs='?', const="http://127.0.0.1:8799", metavar="ENDERECO",
+                        help="Com --prever ou --lote, entrega as URLs ao serviço residente (servico.py).")
+    parser.add_argument("--dataset", default="dataset", help="Diretório do dataset segmentado.")
+    parser.add_argument("--importar-csv", type=str, help="Importa um CSV antigo de features para o dataset.")
     parser.add_argument("--modelo", default="image_model.joblib", help="Caminho para o arquivo do modelo .joblib.")
+    parser.add_argument("--mmap", action="store_true", help="Mapeia em memória os arrays grandes do modelo.")
+    parser.add_argument("--sem-sonda", action="store_true", help="Não sonda as dimensões reais das imagens na coleta.")
+    parser.add_argument("--sem-triagem", action="store_true",
+                        help="Na coleta, mostra todas as imagens mesmo que já exista um modelo treinado.")
+    parser.add_argument("--limiar", type=float, default=LIMIAR_CONFIANCA_PADRAO,
+                        help="Confiança a partir da qual a coleta assistida marca ou descarta uma imagem sozinha.")
+    parser.add_argument("--cache", default="cache_http", help="Diretório do cache HTTP local.")
+    parser.add_argument("--sem-cache", action="store_true", help="Desativa o cache HTTP local.")
+    parser.add_argument("--indice", default="indice_conteudo.sqlite3",
+                        help="Índice de conteúdo usado para pular imagens já baixadas ou duplicadas.")
+    parser.add_argument("--sem-indice", action="store_true", help="Baixa tudo, sem consultar o índice de conteúdo.")
+    parser.add_argument("--visuais", action="store_true",
+                        help="Com --treinar, usa também histogramas de cor (e embedding) do conteúdo das imagens.")
+    parser.add_argument("--embedding", action="store_true",
+                        help="Com --visuais, acrescenta o embedding da MobileNetV3-Small (requer torchvision).")
+    parser.add_argument("--cache-visuais", default="caracteristicas_visuais.sqlite3",
+                        help="Arquivo SQLite com as características visuais, indexadas pelo hash do conteúdo.")
+    parser.add_argument("--workers", type=int, default=8, help="Número máximo de downloads simultâneos.")
+    parser.add_argument("--por-host", type=int, default=None, help="Limite de downloads simultâneos por host.")
+    parser.add_argument("--metricas", type=str, help="Arquivo JSON-lines onde cada evento de métrica é anexado.")
+    parser.add_argument("--prometheus", type=str, help="Arquivo com as métricas no formato texto do Prometheus.")
+    parser.add_argument("--porta-metricas", type=int, help="Expõe /metrics (Prometheus) nesta porta local.")
+    parser.add_argument("--checkpoint", default=None, help="Arquivo de checkpoint do modo em lote.")
+    parser.add_argument("--por-dominio", type=int, default=2, help="Requisições simultâneas por domínio no modo em lote.")
+    parser.add_argument("--atraso", type=float, default=1.0,
+                        help="Intervalo mínimo (s) entre requisições ao mesmo domínio no modo em lote.")
     args = parser.parse_args()
-
-    if args.coletar:
-        coletar_dados(args.coletar, arquivo_saida=args.dataset)
+    # Com --servico, quem abre cache, índice e modelo é o serviço
+    local = not (args.servico and (args.prever or args.lote))
+    # O cache só é aberto nos modos que acessam a rede
+    cache = (None if args.sem_cache or not local or not (args.coletar or args.prever or args.lote or args.visuais)
+             else CacheHTTP(args.cache))
+    if args.metricas:
+        METRICAS.registrar_em(args.metricas)
+    if args.porta_metricas:
+        METRICAS.servir_prometheus(args.porta_metricas)
+    indice = None if args.sem_indice or not local or not (args.prever or args.lote) else IndiceConteudo(args.indice)
+    # Na previsão e na triagem, o cache visual só é consultado se o modelo usar essas colunas
+    visuais = (ExtratorVisual(args.cache_visuais, usar_embedding=args.embedding)
+               if local and (args.visuais or args.coletar or args.prever or args.lote) else None)
+
+    if args.importar_csv:
+        DatasetSegmentado(args.dataset).importar_csv(args.importar_csv)
+    elif args.coletar:
+        coletar_dados(args.coletar, arquivo_saida=args.dataset, sondar=not args.sem_sonda, cache=cache,
+                      model_path=None if args.sem_triagem else args.modelo, limiar=args.limiar,
+                      visuais=visuais)
+    elif args.treinar and args.buscar:
+        from busca_hiperparametros import buscar_hiperparametros
+        buscar_hiperparametros(dataset_path=args.dataset, model_path=args.modelo, cv=args.folds, n_jobs=args.n_jobs,
+                               visuais=visuais, cache=cache)
+    elif args.treinar and args.incremental:
+        from treino_incremental import treinar_modelo_incremental
+        treinar_modelo_incremental(dataset_path=args.dataset, model_path=args.modelo, refazer=args.refazer)
     elif args.treinar:
-        treinar_modelo(dataset_path=args.dataset, model_path=args.modelo)
+        treinar_modelo(dataset_path=args.dataset, model_path=args.modelo, visuais=visuais, cache=cache)
+    elif args.comparar:
+        from treino_incremental import comparar_treinamentos
+        comparar_treinamentos(dataset_path=args.dataset)
+    elif not local:
+        from servico import ClienteServico, imprimir_resultado
+        from lote import ler_urls
+        cliente = ClienteServico(args.servico)
+        try:
+            ids = cliente.enviar([args.prever] if args.prever else list(ler_urls(args.lote)))
+            print(f"{len(ids)} trabalho(s) enviado(s) ao serviço em {args.servico}.")
+            for dados in cliente.aguardar(ids):
+                imprimir_resultado(dados)
+        except (requests.RequestException, RuntimeError) as e:
+            print(f"Erro ao usar o serviço em {args.servico}: {e}")
     elif args.prever:
         # --- ALTERAÇÃO AQUI ---
         # Define o caminho base como o diretório atual ao rodar via terminal
-        prever_e_baixar(args.prever, model_path=args.modelo, base_save_path=os.getcwd())
+        prever_e_baixar(args.prever, model_path=args.modelo, base_save_path=os.getcwd(),
+                        max_workers=args.workers, max_por_host=args.por_host, cache=cache,
+                        mmap_mode='r' if args.mmap else None, indice=indice, visuais=visuais)
+    elif args.lote:
+        from lote import prever_em_lote
+        prever_em_lote(args.lote, model_path=args.modelo, base_save_path=os.getcwd(), checkpoint_path=args.checkpoint,
+                       cache=cache, max_concorrencia=args.workers, max_por_dominio=args.por_dominio,
+                       atraso_por_dominio=args.atraso, mmap_mode='r' if args.mmap else None, indice=indice,
+                       visuais=visuais)
     else:
-        print("Nenhum modo selecionado. Use --coletar, --treinar ou --prever.")
-        parser.print_help()
\ No newline at end of file
+        print("Nenhum modo selecionado. Use --coletar, --treinar, --comparar, --prever, --lote ou --importar-csv.")
+        parser.print_help()
+
+    if args.prometheus:
+        METRICAS.salvar_prometheus(args.prometheus)
+    if args.metricas or args.prometheus or args.porta_metricas:
+        print(METRICAS.resumo())
+    METRICAS.fechar()
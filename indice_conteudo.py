@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# Arquivo: indice_conteudo.py
+
+# Índice persistente do conteúdo já baixado pelo Evil★Fetch. Para cada
+# arquivo guarda o SHA-256 e o dHash (hash perceptual de 64 bits); para cada
+# URL, o arquivo que ela gerou. Assim uma URL já baixada é pulada sem ir à
+# rede, e uma imagem idêntica ou quase idêntica (variações de CDN, cópias
+# redimensionadas) não é gravada de novo em outra pasta. A busca por
+# vizinhos próximos usa uma BK-tree em memória com distância de Hamming;
+# imagens lisas ou uniformes, cujo dHash quase não tem informação, só são
+# comparadas pelo SHA-256.
+
+import os
+import sqlite3
+import itertools
+import threading
+from PIL import Image
+
+# Distância de Hamming máxima entre dHashes para considerar duas imagens a mesma
+DISTANCIA_MAXIMA_PADRAO = 6
+
+
+def caminho_livre(filepath, sufixo, ocupado=os.path.exists):
+    """
+    'filepath' se estiver livre; senão 'nome_<sufixo>.ext', 'nome_<sufixo>_2.ext', ... Assim URLs
+    diferentes com o mesmo nome de arquivo (ex.: '/foto.png?id=1' e '?id=2') não se sobrescrevem.
+    """
+    base, extensao = os.path.splitext(filepath)
+    candidatos = itertools.chain([filepath, f"{base}_{sufixo}{extensao}"],
+                                 (f"{base}_{sufixo}_{n}{extensao}" for n in itertools.count(2)))
+    return next(candidato for candidato in candidatos if not ocupado(candidato))
+
+
+def dhash(imagem, tamanho=8):
+    """
+    Hash de diferença: reduz a imagem para (tamanho+1) x tamanho em tons de cinza e
+    marca, linha a linha, se cada pixel é mais claro que o vizinho da direita.
+    """
+    imagem.draft('L', (tamanho * 4, tamanho * 4))  # Só tem efeito em JPEG: decodifica já reduzido
+    pixels = list(imagem.convert('L').resize((tamanho + 1, tamanho), Image.LANCZOS).getdata())
+    valor = 0
+    for linha in range(tamanho):
+        inicio = linha * (tamanho + 1)
+        for coluna in range(tamanho):
+            valor = (valor << 1) | (pixels[inicio + coluna] > pixels[inicio + coluna + 1])
+    return valor
+
+
+def dhash_do_arquivo(caminho):
+    """dHash de um arquivo de imagem, ou None se o Pillow não conseguir decodificá-lo (ex.: SVG)."""
+    try:
+        with Image.open(caminho) as imagem:
+            return dhash(imagem)
+    except Exception:
+        return None
+
+
+def distancia_hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def dhash_degenerado(valor, distancia_maxima=DISTANCIA_MAXIMA_PADRAO, bits=64):
+    """
+    True para dHashes com quase todos os bits iguais (imagens lisas, uniformes ou gradientes
+    simples): dentro do raio de busca, todas elas pareceriam a mesma imagem.
+    """
+    uns = bin(valor).count('1')
+    return min(uns, bits - uns) <= distancia_maxima
+
+
+class ArvoreBK:
+    """BK-tree sobre inteiros com distância de Hamming: busca por raio sem comparar com todos os itens."""
+
+    def __init__(self):
+        self._raiz = None  # (valor, dado, {distancia: filho})
+        self.tamanho = 0
+
+    def adicionar(self, valor, dado):
+        self.tamanho += 1
+        if self._raiz is None:
+            self._raiz = (valor, dado, {})
+            return
+        no = self._raiz
+        while True:
+            distancia = distancia_hamming(valor, no[0])
+            if distancia in no[2]:
+                no = no[2][distancia]
+            else:
+                no[2][distancia] = (valor, dado, {})
+                return
+
+    def dentro_do_raio(self, valor, raio):
+        """Devolve [(distancia, dado), ...] de todos os itens dentro de 'raio', do mais próximo ao mais distante."""
+        achados = []
+        pendentes = [self._raiz] if self._raiz else []
+        while pendentes:
+            no = pendentes.pop()
+            distancia = distancia_hamming(valor, no[0])
+            if distancia <= raio:
+                achados.append((distancia, no[1]))
+            # Pela desigualdade triangular, só os filhos nessa faixa podem estar dentro do raio
+            pendentes.extend(filho for d, filho in no[2].items() if distancia - raio <= d <= distancia + raio)
+        return sorted(achados, key=lambda achado: achado[0])
+
+
+class IndiceConteudo:
+    """
+    Índice SQLite url -> arquivo e arquivo -> (sha256, dhash), com uma BK-tree dos dHashes
+    carregada na abertura. Seguro para uso a partir das threads do BaixadorConcorrente.
+    """
+
+    def __init__(self, caminho, distancia_maxima=DISTANCIA_MAXIMA_PADRAO):
+        self.caminho = caminho
+        self.distancia_maxima = distancia_maxima
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(caminho, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS arquivos (caminho TEXT PRIMARY KEY, sha256 TEXT, dhash TEXT);
+            CREATE INDEX IF NOT EXISTS arquivos_sha256 ON arquivos (sha256);
+            CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, caminho TEXT);
+        """)
+        self._db.commit()
+        self._arvore = ArvoreBK()
+        for caminho_arquivo, valor in self._db.execute("SELECT caminho, dhash FROM arquivos WHERE dhash IS NOT NULL"):
+            if not dhash_degenerado(int(valor, 16), distancia_maxima):
+                self._arvore.adicionar(int(valor, 16), caminho_arquivo)
+        self.duplicadas = 0
+        self.quase_duplicadas = 0
+        self.urls_conhecidas = 0
+        self.bytes_economizados = 0
+
+    def caminho_da_url(self, url):
+        """Arquivo já baixado a partir de 'url', se ele ainda existir no disco."""
+        with self._lock:
+            linha = self._db.execute("SELECT caminho FROM urls WHERE url = ?", (url,)).fetchone()
+            if linha and os.path.exists(linha[0]):
+                self.urls_conhecidas += 1
+                return linha[0]
+        return None
+
+    def _procurar(self, sha256, valor_dhash):
+        for (caminho,) in self._db.execute("SELECT caminho FROM arquivos WHERE sha256 = ?", (sha256,)):
+            if os.path.exists(caminho):
+                return caminho, 0
+        if valor_dhash is not None and not dhash_degenerado(valor_dhash, self.distancia_maxima):
+            # Itens cujo arquivo foi apagado continuam na árvore: vale o mais próximo que ainda existe
+            for distancia, caminho in self._arvore.dentro_do_raio(valor_dhash, self.distancia_maxima):
+                if os.path.exists(caminho):
+                    return caminho, distancia
+        return None, None
+
+    def _ocupado(self, caminho):
+        return (os.path.exists(caminho) or
+                self._db.execute("SELECT 1 FROM arquivos WHERE caminho = ?", (os.path.abspath(caminho),)).fetchone()
+                is not None)
+
+    def gravar_se_novo(self, url, tmp_path, sha256, filepath):
+        """
+        Move 'tmp_path' para 'filepath' e o registra, a menos que o mesmo conteúdo (SHA-256)
+        ou uma imagem quase idêntica (dHash) já esteja no índice. Nesse caso o temporário é
+        descartado e a URL passa a apontar para o arquivo existente. Se 'filepath' já existe ou
+        pertence a outro conteúdo do índice, o nome ganha o SHA-256 curto como sufixo.
+        Devolve (caminho do conteúdo, True se era duplicata).
+        """
+        valor_dhash = dhash_do_arquivo(tmp_path)
+        with self._lock:
+            existente, distancia = self._procurar(sha256, valor_dhash)
+            if existente is None:
+                filepath = caminho_livre(filepath, sha256[:8], self._ocupado)
+                os.replace(tmp_path, filepath)
+                caminho = os.path.abspath(filepath)
+                with self._db:
+                    self._db.execute("INSERT OR REPLACE INTO arquivos VALUES (?, ?, ?)",
+                                     (caminho, sha256, None if valor_dhash is None else f"{valor_dhash:016x}"))
+                    self._db.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, caminho))
+                if valor_dhash is not None and not dhash_degenerado(valor_dhash, self.distancia_maxima):
+                    self._arvore.adicionar(valor_dhash, caminho)
+                return caminho, False
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (url, existente))
+            if distancia:
+                self.quase_duplicadas += 1
+            else:
+                self.duplicadas += 1
+            self.bytes_economizados += os.path.getsize(tmp_path)
+        os.remove(tmp_path)
+        return existente, True
+
+    def resumo(self):
+        return (f"Índice de conteúdo: {self.urls_conhecidas} URL(s) já baixada(s) pulada(s), "
+                f"{self.duplicadas} duplicata(s) exata(s) e {self.quase_duplicadas} quase duplicata(s) descartada(s), "
+                f"{self.bytes_economizados / (1024 * 1024):.2f} MB não gravados.")
+
+    def fechar(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+# Arquivo: lote.py
+
+# Modo em lote do Evil★Fetch: roda a previsão sobre milhares de URLs
+# carregando o modelo uma única vez. Páginas e imagens passam por um
+# agendador asyncio com limite global, limite por domínio e intervalo de
+# cortesia entre requisições ao mesmo domínio. Um arquivo de checkpoint
+# registra as páginas concluídas para que uma execução interrompida
+# continue de onde parou; só entram nele as páginas cujos downloads deram
+# todos certo. As imagens de várias páginas são pontuadas juntas por um
+# único predict_proba (ver PontuadorEmLote). Toda requisição às imagens,
+# inclusive a sondagem de dimensões e os bytes das características visuais,
+# passa pelo agendador.
+
+import os
+import sys
+import asyncio
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from agendador import verificar_cancelamento, informar_progresso
+from caracteristicas_visuais import PREFIXO_VISUAL
+from extrator_ia import (criar_sessao, extrair_pagina, extrair_features_em_lote, prever_paginas_em_lote,
+                         caminho_de_destino, sondar_imagem, sondar_para_o_cache, obter_conteudo,
+                         colunas_numericas_do_modelo, COLUNAS_DIMENSOES_REAIS, BaixadorConcorrente, carregar_modelo)
+
+
+def ler_urls(origem):
+    """Gera as URLs de um arquivo (uma por linha) ou da entrada padrão quando 'origem' é '-'."""
+    arquivo = sys.stdin if origem == '-' else open(origem, encoding='utf-8')
+    try:
+        for linha in arquivo:
+            linha = linha.strip()
+            if linha and not linha.startswith('#'):
+                yield linha
+    finally:
+        if arquivo is not sys.stdin:
+            arquivo.close()
+
+
+class Checkpoint:
+    """Arquivo append-only com as URLs de páginas já concluídas."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.concluidas = set()
+        if os.path.exists(caminho):
+            with open(caminho, encoding='utf-8') as f:
+                self.concluidas = {linha.strip() for linha in f if linha.strip()}
+        self._arquivo = open(caminho, 'a', encoding='utf-8')
+
+    def __contains__(self, url):
+        return url in self.concluidas
+
+    def registrar(self, url):
+        self.concluidas.add(url)
+        self._arquivo.write(url + '\n')
+        self._arquivo.flush()
+        os.fsync(self._arquivo.fileno())
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+class AgendadorLote:
+    """
+    Agenda as requisições do lote no event loop. Cada requisição bloqueante roda em
+    um pool de threads, mas só depois de obter uma vaga do seu domínio, respeitar o intervalo
+    mínimo desde a última requisição àquele domínio e, por último, obter uma vaga global.
+    """
+
+    def __init__(self, max_concorrencia=16, max_por_dominio=2, atraso_por_dominio=1.0):
+        self.max_concorrencia = max_concorrencia
+        self.max_por_dominio = max_por_dominio
+        self.atraso_por_dominio = atraso_por_dominio
+        self._global = asyncio.Semaphore(max_concorrencia)
+        self._dominios = {}
+
+    def _estado_do_dominio(self, url):
+        dominio = urllib.parse.urlparse(url).netloc
+        if dominio not in self._dominios:
+            self._dominios[dominio] = {'semaforo': asyncio.Semaphore(self.max_por_dominio),
+                                       'lock': asyncio.Lock(), 'proximo': 0.0}
+        return self._dominios[dominio]
+
+    async def _aguardar_cortesia(self, estado):
+        loop = asyncio.get_running_loop()
+        async with estado['lock']:
+            agora = loop.time()
+            espera = max(0.0, estado['proximo'] - agora)
+            estado['proximo'] = max(agora, estado['proximo']) + self.atraso_por_dominio
+        if espera:
+            await asyncio.sleep(espera)
+
+    async def requisitar(self, url, funcao, *args):
+        """Executa 'funcao(*args)' (que acessa 'url') respeitando os limites do agendador."""
+        estado = self._estado_do_dominio(url)
+        async with estado['semaforo']:
+            await self._aguardar_cortesia(estado)
+            # A vaga global só é ocupada durante a requisição: quem espera um domínio lento não trava os outros
+            async with self._global:
+                return await asyncio.to_thread(funcao, *args)
+
+
+class PontuadorEmLote:
+    """
+    Junta as páginas que ficam prontas ao mesmo tempo e pontua todas as suas imagens de uma vez.
+    Um lote é fechado quando chega a 'max_paginas' ou quando 'espera' segundos se passam desde a
+    primeira página dele; cada chamada a 'pontuar' recebe de volta só as imagens da sua página.
+    A previsão não acessa a rede: as dimensões chegam prontas e os descritores visuais já estão no cache.
+    """
+
+    def __init__(self, loaded_model, sessao=None, cache=None, max_paginas=16, espera=0.05, visuais=None):
+        self.loaded_model = loaded_model
+        self.sessao = sessao
+        self.cache = cache
+        self.visuais = visuais
+        self.max_paginas = max_paginas
+        self.espera = espera
+        self._fila = asyncio.Queue()
+        self._tarefa = None
+
+    async def pontuar(self, paginas_brutas, features, dimensoes=None):
+        """
+        Enfileira as tuplas brutas de uma página, com suas features (DataFrame de
+        'extrair_features_em_lote') e as dimensões já sondadas ({url: dict}),
+        e aguarda o DataFrame das imagens previstas.
+        """
+        if self._tarefa is None:
+            self._tarefa = asyncio.create_task(self._consumir())
+        futuro = asyncio.get_running_loop().create_future()
+        await self._fila.put((paginas_brutas, features, dimensoes or {}, futuro))
+        return await futuro
+
+    async def _consumir(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self._fila.get()]
+            prazo = loop.time() + self.espera
+            while len(lote) < self.max_paginas:
+                try:
+                    lote.append(await asyncio.wait_for(self._fila.get(), max(0.0, prazo - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            dimensoes = {}
+            for _, _, dimensoes_da_pagina, _ in lote:
+                dimensoes.update(dimensoes_da_pagina)
+            # Cada página foi featurizada sozinha (página 0); aqui ela recebe a sua posição no lote
+            features = pd.concat([df.assign(_pagina=pagina) for pagina, (_, df, _, _) in enumerate(lote)],
+                                 ignore_index=True)
+            try:
+                resultados = await asyncio.to_thread(prever_paginas_em_lote, self.loaded_model,
+                                                     [brutas for brutas, _, _, _ in lote], self.sessao, self.cache,
+                                                     visuais=self.visuais, dimensoes=dimensoes, features=features)
+            except Exception as e:
+                for _, _, _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+            for (_, _, _, futuro), resultado in zip(lote, resultados):
+                if not futuro.done():
+                    futuro.set_result(resultado)
+
+    def encerrar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+
+
+async def _executar_lote(urls, loaded_model, base_save_path, checkpoint, cache, max_concorrencia,
+                         max_por_dominio, atraso_por_dominio, max_paginas_em_voo, indice=None, visuais=None):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=max_concorrencia))
+    agendador = AgendadorLote(max_concorrencia, max_por_dominio, atraso_por_dominio)
+    sessao = criar_sessao(max_concorrencia)
+    # O pool do baixador não é usado: cada download passa pelo agendador via 'baixar'
+    baixador = BaixadorConcorrente(sessao=sessao, max_workers=1, cache=cache, indice=indice)
+    pontuador = PontuadorEmLote(loaded_model, sessao, cache, visuais=visuais)
+    vagas_de_paginas = asyncio.Semaphore(max_paginas_em_voo)
+    resumo = {'paginas': 0, 'puladas': 0, 'falhas': 0, 'imagens': 0}
+    colunas_do_modelo = colunas_numericas_do_modelo(loaded_model)
+    precisa_dimensoes = bool(set(COLUNAS_DIMENSOES_REAIS) & set(colunas_do_modelo))
+    colunas_visuais = [col for col in colunas_do_modelo if col.startswith(PREFIXO_VISUAL)]
+    precisa_visuais = visuais is not None and bool(colunas_visuais)
+    if precisa_visuais:
+        visuais = visuais.para_dimensao(len(colunas_visuais))
+
+    async def sondar(img_url):
+        if not cache:
+            return await agendador.requisitar(img_url, sondar_imagem, img_url, sessao)
+        # Metadados já no cache não gastam a vez do domínio
+        return cache.metadados(img_url) or await agendador.requisitar(
+            img_url, sondar_para_o_cache, img_url, sessao, cache)
+
+    async def buscar_conteudo(img_url):
+        try:
+            return (await agendador.requisitar(img_url, obter_conteudo, img_url, sessao, cache)).content
+        except Exception:
+            return None
+
+    async def preparar_imagens(features):
+        """Sonda as dimensões e descreve as imagens da página que o modelo precisa, pelo agendador."""
+        urls = features['url'].tolist()
+        dimensoes = {}
+        if precisa_dimensoes:
+            dimensoes = dict(zip(urls, await asyncio.gather(*(sondar(img_url) for img_url in urls))))
+        if precisa_visuais:
+            conhecidos = visuais.conhecidos(urls)
+            faltando = [img_url for img_url in urls if img_url not in conhecidos]
+            if faltando:
+                conteudos = await asyncio.gather(*(buscar_conteudo(img_url) for img_url in faltando))
+                await asyncio.to_thread(visuais.descrever_conteudos, dict(zip(faltando, conteudos)))
+        return dimensoes
+
+    async def processar_pagina(url):
+        try:
+            sanitized_title, features_list = await agendador.requisitar(url, extrair_pagina, url, sessao, cache, True)
+            completa = True
+            if features_list:
+                features = extrair_features_em_lote([features_list])
+                dimensoes = await preparar_imagens(features)
+                selected_images = await pontuador.pontuar(features_list, features, dimensoes)
+                save_dir = os.path.join(base_save_path, sanitized_title)
+                os.makedirs(save_dir, exist_ok=True)
+                downloads = [agendador.requisitar(row['url'], baixador.baixar, row['url'],
+                                                  caminho_de_destino(save_dir, row['url'], index))
+                             for index, row in selected_images.iterrows()]
+                resultados = await asyncio.gather(*downloads)
+                resumo['imagens'] += len(downloads)
+                print(f"[{url}] {len(downloads)} imagem(ns) prevista(s) em '{save_dir}'.")
+                completa = all(resultado is not None for resultado in resultados)
+            else:
+                print(f"[{url}] Nenhuma imagem encontrada.")
+            if not completa:
+                # Fora do checkpoint, a próxima execução tenta a página de novo
+                resumo['falhas'] += 1
+                print(f"[{url}] Downloads com falha; a página fica fora do checkpoint.")
+                return
+            checkpoint.registrar(url)
+            resumo['paginas'] += 1
+        except Exception as e:
+            resumo['falhas'] += 1
+            print(f"[{url}] Falha: {e}")
+        finally:
+            vagas_de_paginas.release()
+            informar_progresso(resumo['paginas'] + resumo['falhas'])
+
+    tarefas = set()
+    iterador = iter(urls)
+    while True:
+        # A leitura é feita fora do loop para não travar o agendador enquanto o stdin espera
+        url = await asyncio.to_thread(next, iterador, None)
+        if url is None:
+            break
+        verificar_cancelamento()
+        if url in checkpoint:
+            resumo['puladas'] += 1
+            continue
+        await vagas_de_paginas.acquire()
+        tarefa = asyncio.create_task(processar_pagina(url))
+        tarefas.add(tarefa)
+        tarefa.add_done_callback(tarefas.discard)
+    if tarefas:
+        await asyncio.gather(*tarefas)
+    pontuador.encerrar()
+
+    baixador.estatisticas()
+    return resumo
+
+
+def prever_em_lote(origem, model_path='image_model.joblib', base_save_path='.', checkpoint_path=None,
+                   cache=None, max_concorrencia=16, max_por_dominio=2, atraso_por_dominio=1.0,
+                   max_paginas_em_voo=None, mmap_mode=None, indice=None, visuais=None):
+    """
+    Modo em Lote: aplica o Evil★Fetch a cada URL de 'origem' (arquivo ou '-' para stdin).
+    As páginas já registradas no checkpoint são puladas, então basta rodar de novo para retomar.
+    Com 'indice' (IndiceConteudo), imagens já baixadas ou duplicadas entre páginas não são gravadas.
+    Com 'visuais' (ExtratorVisual), modelos treinados com características visuais as recebem.
+    """
+    checkpoint_path = checkpoint_path or ('lote.checkpoint' if origem == '-' else f"{origem}.checkpoint")
+    print(f"--- Modo em Lote: '{origem}' (checkpoint em '{checkpoint_path}') ---")
+    try:
+        loaded_model = carregar_modelo(model_path, mmap_mode)
+    except FileNotFoundError:
+        print(f"Erro: Modelo '{model_path}' não encontrado. Execute o modo de treinamento primeiro.")
+        return
+
+    checkpoint = Checkpoint(checkpoint_path)
+    try:
+        resumo = asyncio.run(_executar_lote(
+            ler_urls(origem), loaded_model, base_save_path, checkpoint, cache, max_concorrencia,
+            max_por_dominio, atraso_por_dominio, max_paginas_em_voo or max_concorrencia * 2, indice,
+            visuais))
+    finally:
+        checkpoint.fechar()
+
+    print(f"--- Lote concluído: {resumo['paginas']} página(s), {resumo['imagens']} imagem(ns), "
+          f"{resumo['puladas']} já concluída(s), {resumo['falhas']} falha(s). ---")
+    if cache:
+        print(cache.resumo())
+    if indice:
+        print(indice.resumo())
+    return resumo
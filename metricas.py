@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# Arquivo: metricas.py
+
+# Instrumentação do extrator: cronômetros por etapa (histogramas de
+# latência), contadores e exportação. Cada evento pode ir para um arquivo
+# JSON-lines, e o estado agregado sai no formato texto do Prometheus, em um
+# arquivo (para o textfile collector do node_exporter) ou em um endpoint
+# HTTP local. O registro global METRICAS é compartilhado por CLI, lote e GUI.
+
+import os
+import json
+import time
+import atexit
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Limites (em segundos) dos buckets dos histogramas de latência
+LIMITES_HISTOGRAMA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Descrição de cada contador, usada no # HELP do Prometheus e no painel da GUI
+CONTADORES = {
+    'paginas': 'Páginas processadas',
+    'imagens_encontradas': 'Imagens encontradas nas páginas',
+    'imagens_previstas': 'Imagens previstas como positivas',
+    'imagens_baixadas': 'Imagens gravadas no disco',
+    'downloads_falhos': 'Downloads que falharam após as retentativas',
+    'downloads_duplicados': 'Downloads evitados pelo índice de conteúdo',
+    'bytes_baixados': 'Bytes gravados no disco',
+}
+
+
+class Histograma:
+    """Histograma cumulativo no estilo do Prometheus, com soma e contagem."""
+
+    def __init__(self, limites=LIMITES_HISTOGRAMA):
+        self.limites = limites
+        self.buckets = [0] * len(limites)
+        self.soma = 0.0
+        self.contagem = 0
+
+    def observar(self, valor):
+        self.soma += valor
+        self.contagem += 1
+        for i, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.buckets[i] += 1
+
+    def quantil(self, q):
+        """Estimativa do quantil 'q' pelo limite do primeiro bucket que o alcança."""
+        if not self.contagem:
+            return None
+        alvo = q * self.contagem
+        for limite, acumulado in zip(self.limites, self.buckets):
+            if acumulado >= alvo:
+                return limite
+        return float('inf')
+
+
+class Metricas:
+    """
+    Registro thread-safe de contadores e histogramas por etapa. Com 'registrar_em', cada
+    observação também é anexada como uma linha JSON ao arquivo informado.
+    """
+
+    def __init__(self, prefixo='extrator'):
+        self.prefixo = prefixo
+        self._lock = threading.Lock()
+        self._contadores = dict.fromkeys(CONTADORES, 0)
+        self._etapas = {}
+        self._arquivo = None
+        self._servidor = None
+        self._versao = 0  # Muda a cada observação; evita regravar o Prometheus sem novidades
+        self._versoes_salvas = {}
+
+    def registrar_em(self, caminho):
+        """Passa a anexar os eventos ao arquivo JSON-lines 'caminho'."""
+        with self._lock:
+            if self._arquivo:
+                self._arquivo.close()
+            if os.path.dirname(caminho):
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            self._arquivo = open(caminho, 'a', encoding='utf-8')
+        atexit.register(self.fechar)
+
+    def parar_registro(self):
+        """Deixa de anexar eventos ao arquivo de 'registrar_em'."""
+        with self._lock:
+            if self._arquivo:
+                self._arquivo.close()
+                self._arquivo = None
+
+    def _evento(self, tipo, nome, valor):
+        self._versao += 1
+        if self._arquivo:
+            self._arquivo.write(json.dumps({'ts': time.time(), 'tipo': tipo, 'nome': nome, 'valor': valor}) + '\n')
+
+    def incrementar(self, nome, valor=1):
+        with self._lock:
+            self._contadores[nome] = self._contadores.get(nome, 0) + valor
+            self._evento('contador', nome, valor)
+
+    def observar(self, etapa, segundos):
+        with self._lock:
+            if etapa not in self._etapas:
+                self._etapas[etapa] = Histograma()
+            self._etapas[etapa].observar(segundos)
+            self._evento('etapa', etapa, segundos)
+
+    @contextlib.contextmanager
+    def cronometrar(self, etapa):
+        """Mede o bloco e registra a duração no histograma da etapa (também quando ele falha)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(etapa, time.perf_counter() - inicio)
+
+    def instantaneo(self):
+        """Cópia do estado atual: {'contadores': {...}, 'etapas': {etapa: {contagem, soma, p50, p95}}}."""
+        with self._lock:
+            return {
+                'contadores': dict(self._contadores),
+                'etapas': {etapa: {'contagem': h.contagem, 'soma': h.soma, 'p50': h.quantil(0.5),
+                                   'p95': h.quantil(0.95)}
+                           for etapa, h in self._etapas.items()},
+            }
+
+    def texto_prometheus(self):
+        """Estado agregado no formato de exposição em texto do Prometheus."""
+        linhas = []
+        with self._lock:
+            for nome, valor in self._contadores.items():
+                metrica = f"{self.prefixo}_{nome}_total"
+                linhas.append(f"# HELP {metrica} {CONTADORES.get(nome, nome)}")
+                linhas.append(f"# TYPE {metrica} counter")
+                linhas.append(f"{metrica} {valor}")
+            metrica = f"{self.prefixo}_etapa_segundos"
+            linhas.append(f"# HELP {metrica} Duração de cada etapa do pipeline")
+            linhas.append(f"# TYPE {metrica} histogram")
+            for etapa, h in self._etapas.items():
+                for limite, acumulado in zip(h.limites, h.buckets):
+                    linhas.append(f'{metrica}_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+                linhas.append(f'{metrica}_bucket{{etapa="{etapa}",le="+Inf"}} {h.contagem}')
+                linhas.append(f'{metrica}_sum{{etapa="{etapa}"}} {h.soma}')
+                linhas.append(f'{metrica}_count{{etapa="{etapa}"}} {h.contagem}')
+        return '\n'.join(linhas) + '\n'
+
+    def salvar_prometheus(self, caminho):
+        """
+        Grava o texto do Prometheus de forma atômica (temporário + rename), só se algo mudou
+        desde a última gravação em 'caminho'. Retorna True se gravou.
+        """
+        versao = self._versao
+        if self._versoes_salvas.get(caminho) == versao and os.path.exists(caminho):
+            return False
+        tmp_path = caminho + '.part'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.texto_prometheus())
+        os.replace(tmp_path, caminho)
+        self._versoes_salvas[caminho] = versao
+        return True
+
+    def servir_prometheus(self, porta, endereco='127.0.0.1'):
+        """Expõe '/metrics' em uma thread daemon; devolve o servidor HTTP."""
+        metricas = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                corpo = metricas.texto_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer((endereco, porta), Manipulador)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self._servidor
+
+    def resumo(self):
+        """Texto curto com contadores e latências, para o painel da GUI e o fim dos modos da CLI."""
+        estado = self.instantaneo()
+        linhas = [' | '.join(f"{nome.replace('_', ' ')}: {valor}" for nome, valor in estado['contadores'].items()
+                             if nome != 'bytes_baixados')
+                  + f" | MB baixados: {estado['contadores']['bytes_baixados'] / (1024 * 1024):.2f}"]
+        for etapa, dados in estado['etapas'].items():
+            linhas.append(f"{etapa}: {dados['contagem']}x, total {dados['soma']:.2f}s, "
+                          f"p50 <= {dados['p50']}s, p95 <= {dados['p95']}s")
+        return '\n'.join(linhas)
+
+    def descarregar(self):
+        with self._lock:
+            if self._arquivo:
+                self._arquivo.flush()
+
+    def fechar(self):
+        with self._lock:
+            if self._arquivo:
+                self._arquivo.close()
+                self._arquivo = None
+        if self._servidor:
+            self._servidor.shutdown()
+            self._servidor = None
+
+
+# Registro compartilhado por todos os modos do processo
+METRICAS = Metricas()
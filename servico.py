@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+# Arquivo: servico.py
+
+# Serviço residente do Evil★Fetch. Mantém o modelo carregado, o pool de
+# conexões HTTP, o cache e o índice de conteúdo abertos entre os pedidos, que
+# chegam por uma API HTTP/JSON local: enviar URLs, consultar o estado de cada
+# trabalho e listar os resultados. A fila fica em SQLite, então os trabalhos
+# pendentes (ou interrompidos no meio) são retomados quando o serviço volta.
+# A execução usa o mesmo AgendadorTarefas da GUI, com concorrência limitada,
+# log por trabalho e cancelamento cooperativo. ClienteServico é o cliente
+# usado pela CLI (--servico do extrator_ia.py, ou este arquivo com --enviar,
+# que não importa pandas/sklearn) e pela GUI.
+#
+#   POST   /trabalhos        {"urls": [...]}  -> {"trabalhos": [ids]}
+#   GET    /trabalhos        ?estado=...&limite=...
+#   GET    /trabalhos/<id>   estado, progresso, resultado e log
+#   DELETE /trabalhos/<id>   cancela
+#   GET    /saude            GET /metrics (Prometheus)
+#
+# As rotas /trabalhos exigem o cabeçalho 'X-Token' com o conteúdo do arquivo
+# de token (criado pelo serviço, legível só pelo usuário) e o POST exige
+# 'Content-Type: application/json'; todas as rotas recusam um 'Host' que não
+# seja local. Assim uma página aberta no navegador não consegue enfileirar
+# downloads (nem por um POST "simples", nem por DNS rebinding).
+
+import os
+import hmac
+import json
+import time
+import signal
+import sqlite3
+import secrets
+import argparse
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+from agendador import (AgendadorTarefas, verificar_cancelamento, informar_progresso, TarefaCancelada,
+                       NA_FILA, EXECUTANDO, CONCLUIDA, FALHOU, CANCELADA)
+from metricas import METRICAS
+
+PORTA_PADRAO = 8799
+ENDERECO_PADRAO = f"http://127.0.0.1:{PORTA_PADRAO}"
+ESTADOS_FINAIS = (CONCLUIDA, FALHOU, CANCELADA)
+# Últimas linhas do log de cada trabalho guardadas na fila quando ele termina
+MAX_LINHAS_LOG_SALVAS = 200
+MAX_CORPO_PEDIDO = 1024 * 1024
+ARQUIVO_TOKEN_PADRAO = os.path.join(os.path.expanduser('~'), '.evil_fetch_servico.token')
+HOSTS_LOCAIS = {'127.0.0.1', 'localhost', '[::1]'}
+
+
+def ler_token(caminho=ARQUIVO_TOKEN_PADRAO):
+    """Token compartilhado entre serviço e clientes, ou None se o arquivo não existe."""
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def criar_token(caminho=ARQUIVO_TOKEN_PADRAO):
+    """Reaproveita o token do arquivo ou cria um novo, legível só pelo usuário."""
+    token = ler_token(caminho)
+    if token:
+        return token
+    token = secrets.token_urlsafe(32)
+    if os.path.dirname(caminho):
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    fd = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(token)
+    return token
+
+
+class FilaPersistente:
+    """
+    Trabalhos do serviço em SQLite (uma linha por URL enviada). Ao abrir, os trabalhos que
+    estavam em execução quando o processo parou voltam para a fila.
+    """
+
+    def __init__(self, caminho):
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(caminho, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS trabalhos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, estado TEXT NOT NULL,
+                criado_em REAL, inicio REAL, fim REAL, resultado TEXT, erro TEXT, log TEXT);
+            CREATE INDEX IF NOT EXISTS trabalhos_estado ON trabalhos (estado);
+        """)
+        with self._db:
+            self._db.execute("UPDATE trabalhos SET estado = ?, inicio = NULL WHERE estado = ?", (NA_FILA, EXECUTANDO))
+
+    @staticmethod
+    def _como_dict(linha):
+        dados = dict(linha)
+        dados['resultado'] = json.loads(dados['resultado']) if dados['resultado'] else None
+        return dados
+
+    def adicionar(self, urls):
+        """Enfileira as URLs e devolve os ids dos novos trabalhos, na mesma ordem."""
+        agora = time.time()
+        with self._lock, self._db:
+            return [self._db.execute("INSERT INTO trabalhos (url, estado, criado_em) VALUES (?, ?, ?)",
+                                     (url, NA_FILA, agora)).lastrowid
+                    for url in urls]
+
+    def atualizar(self, identificador, **campos):
+        if 'resultado' in campos:
+            campos['resultado'] = json.dumps(campos['resultado'], ensure_ascii=False)
+        with self._lock, self._db:
+            self._db.execute(f"UPDATE trabalhos SET {', '.join(f'{campo} = ?' for campo in campos)} WHERE id = ?",
+                             [*campos.values(), identificador])
+
+    def obter(self, identificador):
+        with self._lock:
+            linha = self._db.execute("SELECT * FROM trabalhos WHERE id = ?", (identificador,)).fetchone()
+        return None if linha is None else self._como_dict(linha)
+
+    def listar(self, estado=None, limite=100):
+        """Trabalhos mais recentes primeiro, sem o log."""
+        consulta = "SELECT id, url, estado, criado_em, inicio, fim, resultado, erro FROM trabalhos"
+        parametros = []
+        if estado:
+            consulta += " WHERE estado = ?"
+            parametros.append(estado)
+        with self._lock:
+            linhas = self._db.execute(consulta + " ORDER BY id DESC LIMIT ?", [*parametros, limite]).fetchall()
+        return [self._como_dict(linha) for linha in linhas]
+
+    def pendentes(self):
+        """(id, url) dos trabalhos na fila, na ordem de chegada."""
+        with self._lock:
+            return self._db.execute("SELECT id, url FROM trabalhos WHERE estado = ? ORDER BY id",
+                                    (NA_FILA,)).fetchall()
+
+    def contagem_por_estado(self):
+        with self._lock:
+            return dict(self._db.execute("SELECT estado, COUNT(*) FROM trabalhos GROUP BY estado").fetchall())
+
+    def fechar(self):
+        with self._lock:
+            self._db.close()
+
+
+class ServicoFetch:
+    """
+    Executa os trabalhos da FilaPersistente com no máximo 'max_trabalhos' ao mesmo tempo,
+    reaproveitando sessão HTTP, cache, índice e modelo entre eles. O estado de cada trabalho é
+    gravado na fila a cada mudança; o progresso e o log ao vivo vêm da Tarefa em memória.
+    """
+
+    def __init__(self, model_path, base_save_path, fila, max_trabalhos=2, max_workers=8, max_por_host=None,
+                 cache=None, indice=None, visuais=None):
+        from extrator_ia import criar_sessao
+        self.model_path = model_path
+        self.base_save_path = base_save_path
+        self.fila = fila
+        self.max_workers = max_workers
+        self.max_por_host = max_por_host
+        self.cache = cache
+        self.indice = indice
+        self.visuais = visuais
+        self.sessao = criar_sessao(max_workers * max_trabalhos)
+        self.iniciado_em = time.time()
+        # RLock: 'enviar' notifica na própria thread enquanto registra a tarefa
+        self._lock = threading.RLock()
+        self._tarefas = {}  # id do trabalho -> Tarefa ativa
+        self._trabalho_da_tarefa = {}  # Tarefa.id -> id do trabalho
+        self._encerrando = False
+        self.agendador = AgendadorTarefas(max_trabalhos, ao_atualizar=self._ao_atualizar)
+
+    def iniciar(self):
+        """Aquece o modelo e retoma os trabalhos que ficaram na fila."""
+        from extrator_ia import carregar_modelo
+        try:
+            carregar_modelo(self.model_path)
+        except FileNotFoundError:
+            print(f"Aviso: Modelo '{self.model_path}' não encontrado; os trabalhos vão falhar até ele existir.")
+        pendentes = self.fila.pendentes()
+        if pendentes:
+            print(f"Retomando {len(pendentes)} trabalho(s) da fila.")
+        for identificador, url in pendentes:
+            self._agendar(identificador, url)
+
+    def _agendar(self, identificador, url):
+        with self._lock:
+            tarefa = self.agendador.enviar(f"#{identificador} {url}", self._executar, identificador, url)
+            self._tarefas[identificador] = tarefa
+            self._trabalho_da_tarefa[tarefa.id] = identificador
+
+    def _executar(self, identificador, url):
+        from extrator_ia import prever_e_baixar
+        resultado = prever_e_baixar(url, self.model_path, self.base_save_path, self.max_workers, self.max_por_host,
+                                    cache=self.cache, indice=self.indice, visuais=self.visuais, sessao=self.sessao)
+        if resultado is None:
+            raise RuntimeError("A previsão falhou; veja o log do trabalho.")
+        self.fila.atualizar(identificador, resultado=resultado)
+
+    def _ao_atualizar(self, tarefa, linha):
+        if linha is not None or self._encerrando:
+            return
+        with self._lock:
+            identificador = self._trabalho_da_tarefa.get(tarefa.id)
+            if identificador is None or tarefa.estado == NA_FILA:
+                return
+            final = tarefa.estado in ESTADOS_FINAIS
+            if final:
+                self._tarefas.pop(identificador, None)
+                self._trabalho_da_tarefa.pop(tarefa.id, None)
+        if tarefa.estado == EXECUTANDO:
+            self.fila.atualizar(identificador, estado=EXECUTANDO, inicio=tarefa.inicio)
+        elif final:
+            self.fila.atualizar(identificador, estado=tarefa.estado, fim=tarefa.fim or time.time(), erro=tarefa.erro,
+                                log='\n'.join(list(tarefa.log)[-MAX_LINHAS_LOG_SALVAS:]))
+            self.agendador.esquecer(tarefa)
+
+    def enviar(self, urls):
+        """Valida e enfileira as URLs; devolve os ids dos trabalhos criados."""
+        for url in urls:
+            if urllib.parse.urlparse(url).scheme not in ('http', 'https'):
+                raise ValueError(f"URL inválida: {url!r}")
+        ids = self.fila.adicionar(urls)
+        for identificador, url in zip(ids, urls):
+            self._agendar(identificador, url)
+        return ids
+
+    def trabalho(self, identificador):
+        """Estado gravado do trabalho, com progresso e log ao vivo enquanto ele está ativo."""
+        dados = self.fila.obter(identificador)
+        with self._lock:
+            tarefa = self._tarefas.get(identificador)
+        if dados is not None and tarefa is not None:
+            dados['estado'] = tarefa.estado
+            dados['progresso'] = list(tarefa.progresso) if tarefa.progresso else None
+            dados['log'] = '\n'.join(list(tarefa.log)[-MAX_LINHAS_LOG_SALVAS:])
+        return dados
+
+    def cancelar(self, identificador):
+        """Cancela um trabalho ativo; devolve False se ele já terminou ou não existe."""
+        with self._lock:
+            tarefa = self._tarefas.get(identificador)
+        if tarefa is None:
+            return False
+        tarefa.cancelar()
+        return True
+
+    def saude(self):
+        return {'modelo': os.path.abspath(self.model_path), 'destino': os.path.abspath(self.base_save_path),
+                'trabalhos': self.fila.contagem_por_estado(), 'ativos': len(self._tarefas),
+                'no_ar_ha_segundos': round(time.time() - self.iniciado_em, 1)}
+
+    def encerrar(self):
+        """
+        Para sem marcar nada como cancelado: o que estava na fila ou em execução fica assim
+        na fila persistente e é retomado na próxima vez que o serviço subir.
+        """
+        self._encerrando = True
+        self.agendador.encerrar()
+
+
+def criar_servidor(servico, token, porta=PORTA_PADRAO, endereco='127.0.0.1'):
+    """
+    Servidor HTTP (uma thread por conexão) com a API JSON do 'servico'. As rotas /trabalhos
+    exigem 'token' no cabeçalho X-Token; só são aceitos os nomes locais (e 'endereco') no Host.
+    """
+    hosts_permitidos = HOSTS_LOCAIS | {endereco}
+
+    class Manipulador(BaseHTTPRequestHandler):
+        def _responder(self, status, dados):
+            corpo = json.dumps(dados, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def _rota(self):
+            partes = urllib.parse.urlparse(self.path)
+            return [p for p in partes.path.split('/') if p], urllib.parse.parse_qs(partes.query)
+
+        def _permitido(self, caminho):
+            """Confere Host e token; responde 403 e devolve False quando o pedido não pode seguir."""
+            host = self.headers.get('Host', '')
+            nome = host[:host.find(']') + 1] if host.startswith('[') else host.split(':')[0]
+            if nome not in hosts_permitidos:
+                self._responder(403, {'erro': 'Host não permitido.'})
+                return False
+            if caminho[:1] == ['trabalhos'] and not hmac.compare_digest(self.headers.get('X-Token', ''), token):
+                self._responder(403, {'erro': 'Token ausente ou inválido.'})
+                return False
+            return True
+
+        def _trabalho_da_rota(self, caminho):
+            if len(caminho) != 2 or caminho[0] != 'trabalhos' or not caminho[1].isdigit():
+                self._responder(404, {'erro': 'Rota não encontrada.'})
+                return None
+            return int(caminho[1])
+
+        def do_GET(self):
+            caminho, consulta = self._rota()
+            if not self._permitido(caminho):
+                return
+            if caminho == ['metrics']:
+                corpo = METRICAS.texto_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+            elif caminho == ['saude']:
+                self._responder(200, servico.saude())
+            elif caminho == ['trabalhos']:
+                try:
+                    limite = int(consulta.get('limite', ['100'])[0])
+                except ValueError:
+                    self._responder(400, {'erro': "'limite' precisa ser um número inteiro."})
+                    return
+                self._responder(200, {'trabalhos': servico.fila.listar(consulta.get('estado', [None])[0], limite)})
+            else:
+                identificador = self._trabalho_da_rota(caminho)
+                if identificador is None:
+                    return
+                dados = servico.trabalho(identificador)
+                if dados is None:
+                    self._responder(404, {'erro': f'Trabalho {identificador} não existe.'})
+                else:
+                    self._responder(200, dados)
+
+        def do_POST(self):
+            caminho, _ = self._rota()
+            if not self._permitido(caminho):
+                return
+            if caminho != ['trabalhos']:
+                self._responder(404, {'erro': 'Rota não encontrada.'})
+                return
+            if self.headers.get_content_type() != 'application/json':
+                self._responder(415, {'erro': "Use 'Content-Type: application/json'."})
+                return
+            try:
+                tamanho = int(self.headers.get('Content-Length') or 0)
+                if tamanho > MAX_CORPO_PEDIDO:
+                    raise ValueError("Pedido grande demais.")
+                pedido = json.loads(self.rfile.read(tamanho) or b'{}')
+                urls = pedido.get('urls') or pedido.get('url') or []
+                urls = [urls] if isinstance(urls, str) else urls
+                if not urls or not all(isinstance(url, str) for url in urls):
+                    raise ValueError("Informe 'url' ou uma lista 'urls'.")
+                self._responder(202, {'trabalhos': servico.enviar(urls)})
+            except (ValueError, AttributeError) as e:
+                self._responder(400, {'erro': str(e)})
+
+        def do_DELETE(self):
+            caminho, _ = self._rota()
+            if not self._permitido(caminho):
+                return
+            identificador = self._trabalho_da_rota(caminho)
+            if identificador is None:
+                return
+            if servico.cancelar(identificador):
+                self._responder(202, {'cancelado': identificador})
+            else:
+                self._responder(409, {'erro': f'Trabalho {identificador} não está ativo.'})
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((endereco, porta), Manipulador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+class ClienteServico:
+    """Cliente da API do serviço, usado pela CLI e pela GUI."""
+
+    def __init__(self, endereco=ENDERECO_PADRAO, timeout=10, token=None, arquivo_token=ARQUIVO_TOKEN_PADRAO):
+        self.endereco = endereco.rstrip('/')
+        self.timeout = timeout
+        self.sessao = requests.Session()
+        token = token or ler_token(arquivo_token)
+        if token:
+            self.sessao.headers['X-Token'] = token
+
+    def _requisitar(self, metodo, caminho, **kwargs):
+        resp = self.sessao.request(metodo, self.endereco + caminho, timeout=self.timeout, **kwargs)
+        if resp.status_code >= 400:
+            try:
+                mensagem = resp.json().get('erro')
+            except ValueError:
+                mensagem = resp.text
+            raise RuntimeError(f"Serviço respondeu {resp.status_code}: {mensagem}")
+        return resp.json()
+
+    def disponivel(self):
+        try:
+            self._requisitar('GET', '/saude')
+            return True
+        except (requests.RequestException, RuntimeError):
+            return False
+
+    def enviar(self, urls):
+        return self._requisitar('POST', '/trabalhos', json={'urls': list(urls)})['trabalhos']
+
+    def trabalho(self, identificador):
+        return self._requisitar('GET', f'/trabalhos/{identificador}')
+
+    def listar(self, estado=None, limite=100):
+        params = {'limite': limite, **({'estado': estado} if estado else {})}
+        return self._requisitar('GET', '/trabalhos', params=params)['trabalhos']
+
+    def cancelar(self, identificador):
+        return self._requisitar('DELETE', f'/trabalhos/{identificador}')
+
+    def aguardar(self, ids, intervalo=1.0):
+        """
+        Acompanha os trabalhos até todos terminarem, imprimindo cada mudança de estado, e devolve
+        os dados finais. Dentro de uma tarefa do agendador, cancelar a tarefa cancela os trabalhos.
+        """
+        ids = list(ids)
+        finais = {}
+        vistos = {}
+        try:
+            while len(finais) < len(ids):
+                verificar_cancelamento()
+                for identificador in ids:
+                    if identificador in finais:
+                        continue
+                    dados = self.trabalho(identificador)
+                    if vistos.get(identificador) != dados['estado']:
+                        vistos[identificador] = dados['estado']
+                        print(f"Trabalho #{identificador} ({dados['url']}): {dados['estado']}")
+                    if dados['estado'] in ESTADOS_FINAIS:
+                        finais[identificador] = dados
+                        if dados['estado'] == FALHOU and dados.get('log'):
+                            print(dados['log'])
+                    elif len(ids) == 1 and dados.get('progresso'):
+                        informar_progresso(*dados['progresso'])
+                if len(ids) > 1:
+                    informar_progresso(len(finais), len(ids))
+                if len(finais) < len(ids):
+                    time.sleep(intervalo)
+        except TarefaCancelada:
+            for identificador in ids:
+                if identificador not in finais:
+                    try:
+                        self.cancelar(identificador)
+                    except (requests.RequestException, RuntimeError):
+                        pass
+            raise
+        return [finais[identificador] for identificador in ids]
+
+
+def _interromper(*_):
+    raise KeyboardInterrupt
+
+
+def imprimir_resultado(dados):
+    """Resumo de um trabalho terminado, no formato do modo de previsão."""
+    resultado = dados.get('resultado')
+    if dados['estado'] != CONCLUIDA or not resultado:
+        erro = f" ({dados['erro']})" if dados.get('erro') else ''
+        print(f"#{dados['id']} {dados['url']}: {dados['estado']}{erro}")
+        return
+    print(f"#{dados['id']} {dados['url']}: {resultado['previstas']} de {resultado['encontradas']} imagem(ns) "
+          f"prevista(s)" + (f" em '{resultado['pasta']}'" if resultado['pasta'] else '') + '.')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço residente do Evil★Fetch com API HTTP/JSON local.")
+    parser.add_argument("--porta", type=int, default=PORTA_PADRAO, help="Porta local da API.")
+    parser.add_argument("--endereco", default="127.0.0.1", help="Endereço em que a API escuta.")
+    parser.add_argument("--modelo", default="image_model.joblib", help="Caminho para o arquivo do modelo .joblib.")
+    parser.add_argument("--destino", default=os.getcwd(), help="Diretório onde as pastas das páginas são criadas.")
+    parser.add_argument("--fila", default="servico_fila.sqlite3", help="Arquivo SQLite da fila de trabalhos.")
+    parser.add_argument("--trabalhos", type=int, default=2, help="Trabalhos (páginas) executados ao mesmo tempo.")
+    parser.add_argument("--workers", type=int, default=8, help="Downloads simultâneos por trabalho.")
+    parser.add_argument("--por-host", type=int, default=None, help="Limite de downloads simultâneos por host.")
+    parser.add_argument("--cache", default="cache_http", help="Diretório do cache HTTP local.")
+    parser.add_argument("--sem-cache", action="store_true", help="Desativa o cache HTTP local.")
+    parser.add_argument("--indice", default="indice_conteudo.sqlite3",
+                        help="Arquivo SQLite do índice de conteúdo (imagens já baixadas).")
+    parser.add_argument("--sem-indice", action="store_true", help="Baixa tudo, sem consultar o índice de conteúdo.")
+    parser.add_argument("--cache-visuais", default="caracteristicas_visuais.sqlite3",
+                        help="Arquivo SQLite com as características visuais, indexadas pelo hash do conteúdo.")
+    parser.add_argument("--embedding", action="store_true",
+                        help="Para modelos treinados com --visuais --embedding.")
+    parser.add_argument("--metricas", type=str, help="Arquivo JSON-lines onde cada evento de métrica é anexado.")
+    parser.add_argument("--arquivo-token", default=ARQUIVO_TOKEN_PADRAO,
+                        help="Arquivo com o token exigido pela API (criado pelo serviço se não existir).")
+    cliente_grupo = parser.add_argument_group("cliente",
+                                              "Falam com um serviço já em execução em vez de iniciar um.")
+    cliente_grupo.add_argument("--enviar", nargs='+', metavar="URL", help="Envia URLs e espera os resultados.")
+    cliente_grupo.add_argument("--nao-aguardar", action="store_true", help="Com --enviar, só mostra os ids.")
+    cliente_grupo.add_argument("--estado", type=int, metavar="ID", help="Mostra o estado e o log de um trabalho.")
+    cliente_grupo.add_argument("--listar", action="store_true", help="Lista os trabalhos mais recentes.")
+    cliente_grupo.add_argument("--cancelar", type=int, metavar="ID", help="Cancela um trabalho ativo.")
+    args = parser.parse_args()
+
+    if args.enviar or args.estado or args.listar or args.cancelar:
+        cliente = ClienteServico(f"http://{args.endereco}:{args.porta}", arquivo_token=args.arquivo_token)
+        try:
+            if args.enviar:
+                ids = cliente.enviar(args.enviar)
+                print(f"Trabalho(s) enviado(s): {', '.join(f'#{i}' for i in ids)}")
+                if not args.nao_aguardar:
+                    for dados in cliente.aguardar(ids):
+                        imprimir_resultado(dados)
+            elif args.estado:
+                dados = cliente.trabalho(args.estado)
+                imprimir_resultado(dados)
+                if dados.get('log'):
+                    print(dados['log'])
+            elif args.listar:
+                for dados in cliente.listar():
+                    imprimir_resultado(dados)
+            else:
+                cliente.cancelar(args.cancelar)
+                print(f"Cancelamento do trabalho #{args.cancelar} pedido.")
+        except requests.RequestException as e:
+            print(f"Erro: não foi possível falar com o serviço em {cliente.endereco}: {e}")
+        except RuntimeError as e:
+            print(f"Erro: {e}")
+        raise SystemExit(0)
+
+    # Os imports pesados (pandas, sklearn, bs4) são pagos uma única vez, aqui
+    from cache_http import CacheHTTP
+    from indice_conteudo import IndiceConteudo
+    from caracteristicas_visuais import ExtratorVisual
+
+    if args.metricas:
+        METRICAS.registrar_em(args.metricas)
+    fila = FilaPersistente(args.fila)
+    servico = ServicoFetch(args.modelo, args.destino, fila, max_trabalhos=args.trabalhos, max_workers=args.workers,
+                           max_por_host=args.por_host, cache=None if args.sem_cache else CacheHTTP(args.cache),
+                           indice=None if args.sem_indice else IndiceConteudo(args.indice),
+                           visuais=ExtratorVisual(args.cache_visuais, usar_embedding=args.embedding))
+    servidor = criar_servidor(servico, criar_token(args.arquivo_token), args.porta, args.endereco)
+    servico.iniciar()
+    # SIGTERM (ex.: systemd, kill) encerra do mesmo jeito que Ctrl+C
+    signal.signal(signal.SIGTERM, _interromper)
+    print(f"--- Serviço Evil★Fetch em http://{args.endereco}:{args.porta} (Ctrl+C para parar) ---")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\nEncerrando; os trabalhos pendentes continuam na fila para a próxima execução.")
+    finally:
+        servidor.server_close()
+        servico.encerrar()
+        fila.fechar()
+        METRICAS.fechar()
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+# Os módulos do projeto ficam na raiz do repositório, ao lado desta pasta.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# Arquivo: tests/test_agendador.py
+
+import threading
+
+import pytest
+
+from agendador import (AgendadorTarefas, verificar_cancelamento, informar_progresso,
+                       NA_FILA, CONCLUIDA, FALHOU, CANCELADA)
+
+
+@pytest.fixture
+def agendador():
+    eventos = []
+    agendador = AgendadorTarefas(1, ao_atualizar=lambda tarefa, linha: eventos.append(
+        (tarefa.id, tarefa.estado, linha)))
+    agendador.eventos = eventos
+    yield agendador
+    agendador.encerrar()
+
+
+def test_log_progresso_e_estado_final():
+    # Criado dentro do teste: o pytest troca o sys.stdout entre as fases e desfaria o desvio do log
+    agendador = AgendadorTarefas(1)
+
+    def trabalho():
+        print("primeira linha")
+        informar_progresso(1, 2)
+        print("segunda", "linha")
+
+    tarefa = agendador.enviar('ok', trabalho)
+    tarefa.futuro.result()
+
+    assert tarefa.estado == CONCLUIDA and not tarefa.ativa
+    assert list(tarefa.log) == ['primeira linha', 'segunda linha']
+    assert tarefa.texto_progresso() == '1/2'
+    agendador.encerrar()
+
+
+def test_erro_marca_a_tarefa_como_falha(agendador):
+    tarefa = agendador.enviar('erro', lambda: 1 / 0)
+    tarefa.futuro.result()
+
+    assert tarefa.estado == FALHOU and 'division' in tarefa.erro
+
+
+def test_cancelar_na_fila_e_durante_a_execucao(agendador):
+    liberar, comecou = threading.Event(), threading.Event()
+
+    def longa():
+        comecou.set()
+        liberar.wait()
+        verificar_cancelamento()
+
+    em_execucao = agendador.enviar('longa', longa)
+    na_fila = agendador.enviar('na fila', print, 'nunca')
+    comecou.wait()
+    na_fila.cancelar()
+    em_execucao.cancelar()
+    liberar.set()
+    em_execucao.futuro.result()
+
+    assert na_fila.estado == CANCELADA and na_fila.fim is not None
+    assert em_execucao.estado == CANCELADA
+
+
+def test_cancelada_depois_de_sair_da_fila_do_pool(agendador):
+    liberar = threading.Event()
+    agendador.enviar('bloqueia', liberar.wait)
+    tarefa = agendador.enviar('x', print, 'nunca')
+    # Como se 'futuro.cancel()' tivesse chegado depois de o pool pegar a tarefa
+    tarefa.cancelamento.set()
+    assert tarefa.estado == NA_FILA
+    liberar.set()
+    tarefa.futuro.result()
+
+    assert tarefa.estado == CANCELADA and not tarefa.ativa and tarefa.fim is not None
+    assert agendador.eventos[-1][:2] == (tarefa.id, CANCELADA)
+    assert list(tarefa.log) == []
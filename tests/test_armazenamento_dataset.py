@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Arquivo: tests/test_armazenamento_dataset.py
+
+import pandas as pd
+import pytest
+
+from armazenamento_dataset import DatasetSegmentado, carregar_dataset, COLUNAS_DATASET
+
+
+def _linhas(urls, **colunas):
+    dados = {'url': urls, 'extension': ['.jpg'] * len(urls), 'alt': [''] * len(urls),
+             'width': [None] * len(urls), 'height': [None] * len(urls),
+             'parent_tag': ['div'] * len(urls), 'selected': [0] * len(urls)}
+    dados.update(colunas)
+    return pd.DataFrame(dados)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    dataset = DatasetSegmentado(str(tmp_path / 'dataset'))
+    yield dataset
+    dataset._db.close()
+
+
+def test_ultima_escrita_vence(dataset):
+    dataset.anexar(_linhas(['http://a/1.jpg', 'http://a/2.jpg'], selected=[0, 0]))
+    dataset.anexar(_linhas(['http://a/2.jpg', 'http://a/3.jpg'], selected=[1, 1]))
+
+    df = dataset.ler()
+    assert list(df['url']) == ['http://a/1.jpg', 'http://a/2.jpg', 'http://a/3.jpg']
+    assert list(df['selected']) == [0, 1, 1]
+    assert list(df.columns) == COLUNAS_DATASET
+    assert len(dataset) == 3 and 'http://a/2.jpg' in dataset
+
+
+def test_ler_desde_seq_devolve_so_as_linhas_novas(dataset):
+    dataset.anexar(_linhas(['http://a/1.jpg']))
+    ponto = dataset.ultimo_seq()
+    dataset.anexar(_linhas(['http://a/2.jpg']))
+
+    assert list(dataset.ler(desde_seq=ponto)['url']) == ['http://a/2.jpg']
+    assert list(dataset.ler(desde_seq=ponto, colunas=['url'], incluir_seq=True).columns) == ['url', '_seq']
+
+
+def test_compactacao_junta_segmentos_e_descarta_linhas_obsoletas(dataset):
+    for selecionada in (0, 1, 0):
+        dataset.anexar(_linhas(['http://a/1.jpg'], selected=[selecionada]))
+    dataset.anexar(_linhas(['http://a/2.jpg']))
+    antes = dataset.ler(incluir_seq=True)
+
+    dataset.compactar()
+
+    assert len(dataset._segmentos()) == 1
+    pd.testing.assert_frame_equal(dataset.ler(incluir_seq=True), antes)
+    # Depois da compactação, o dataset continua aceitando anexações
+    dataset.anexar(_linhas(['http://a/1.jpg'], selected=[1]))
+    assert dataset.ler().set_index('url').loc['http://a/1.jpg', 'selected'] == 1
+
+
+def test_importar_csv_antigo_anexar_raspagem_e_compactar(tmp_path):
+    caminho_csv = tmp_path / 'antigo.csv'
+    _linhas(['http://a/1.jpg', 'http://a/2.jpg'], alt=['', 'x'], width=[100.0, None], height=[80, None],
+            parent_tag=['div', 'a'], selected=[1, 0]).to_csv(caminho_csv, index=False)
+    # Um segmento no máximo: a segunda gravação já dispara a compactação
+    dataset = DatasetSegmentado(str(tmp_path / 'dataset'), max_segmentos=1)
+    try:
+        assert dataset.importar_csv(str(caminho_csv)) == 2
+        dataset.anexar(_linhas(['http://a/2.jpg', 'http://a/3.png'], extension=['.jpg', '.png'], alt=['y', ''],
+                               width=['100px', '50'], height=['80px', None], selected=[1, 0]))
+
+        assert len(dataset._segmentos()) == 1
+        df = dataset.ler()
+        assert list(df['url']) == ['http://a/1.jpg', 'http://a/2.jpg', 'http://a/3.png']
+        assert list(df['width']) == ['100.0', '100px', '50']
+        assert df.loc[2, 'height'] is None
+        assert list(df['selected']) == [1, 1, 0]
+    finally:
+        dataset._db.close()
+
+
+def test_carregar_dataset_aceita_diretorio_e_csv(tmp_path, dataset):
+    dataset.anexar(_linhas(['http://a/1.jpg']))
+    caminho_csv = tmp_path / 'antigo.csv'
+    _linhas(['http://b/1.jpg']).to_csv(caminho_csv, index=False)
+
+    assert list(carregar_dataset(dataset.diretorio)['url']) == ['http://a/1.jpg']
+    assert list(carregar_dataset(str(caminho_csv), colunas=['url'])['url']) == ['http://b/1.jpg']
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+# Arquivo: tests/test_cache_http.py
+
+import os
+import sqlite3
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+from cache_http import CacheHTTP, validade
+
+CORPO = b'x' * (256 * 1024)
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    # Rota -> cabeçalhos extras da resposta
+    ROTAS = {
+        '/sem-validadores': {},
+        '/etag': {'ETag': '"v1"'},
+        '/max-age': {'Cache-Control': 'public, max-age=3600'},
+        '/expirada': {'Cache-Control': 'max-age=0', 'ETag': '"v1"'},
+        '/expires': {'Expires': 'Thu, 01 Jan 2099 00:00:00 GMT'},
+    }
+
+    def do_GET(self):
+        self.server.pedidos.append(self.path)
+        cabecalhos = self.ROTAS.get(self.path)
+        if cabecalhos is None:
+            self.send_error(404)
+            return
+        if cabecalhos.get('ETag') and self.headers.get('If-None-Match') == cabecalhos['ETag']:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(CORPO)))
+        for nome, valor in cabecalhos.items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(CORPO)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Manipulador)
+    servidor.pedidos = []
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    servidor.url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheHTTP(str(tmp_path / 'cache'))
+
+
+def test_validade():
+    assert validade({'Cache-Control': 'max-age=60'}, agora=1000) == 1060
+    assert validade({'Cache-Control': 'max-age=60', 'Age': '20'}, agora=1000) == 1040
+    assert validade({'Cache-Control': 'no-cache, max-age=60'}, agora=1000) is None
+    assert validade({'Expires': 'Thu, 01 Jan 1970 00:16:40 GMT'}, agora=0) == 1000
+    assert validade({'Expires': '0'}, agora=0) is None
+    assert validade({}, agora=0) is None
+
+
+def test_resposta_fresca_nao_vai_a_rede(servidor, cache):
+    for rota in ('/max-age', '/expires'):
+        assert cache.obter(servidor.url + rota).content == CORPO
+        resposta = cache.obter(servidor.url + rota)
+        assert resposta.content == CORPO and resposta.do_cache
+    assert servidor.pedidos == ['/max-age', '/expires']
+    assert cache.estatisticas()['hits'] == 2 and cache.estatisticas()['revalidacoes'] == 0
+
+
+def test_resposta_com_etag_e_revalidada(servidor, cache):
+    cache.obter(servidor.url + '/expirada')
+    assert cache.obter(servidor.url + '/expirada').do_cache
+    assert servidor.pedidos == ['/expirada', '/expirada']
+    e = cache.estatisticas()
+    assert (e['hits'], e['misses'], e['revalidacoes'], e['bytes_economizados']) == (1, 1, 1, len(CORPO))
+
+
+def test_resposta_sem_validadores_nem_validade_e_baixada_de_novo(servidor, cache):
+    cache.obter(servidor.url + '/sem-validadores')
+    assert not cache.obter(servidor.url + '/sem-validadores').do_cache
+    assert cache.estatisticas()['misses'] == 2
+
+
+def test_obter_em_blocos_interrompido_nao_grava(servidor, cache):
+    _, _, blocos = cache.obter_em_blocos(servidor.url + '/etag', tamanho_bloco=1024)
+    next(blocos)
+    blocos.close()
+    assert cache.conteudo_local(servidor.url + '/etag') is None
+    assert [nome for nome in os.listdir(cache.diretorio) if nome.endswith('.part')] == []
+
+    _, _, blocos = cache.obter_em_blocos(servidor.url + '/etag')
+    assert b''.join(blocos) == CORPO
+    assert cache.conteudo_local(servidor.url + '/etag') == CORPO
+
+
+def test_erro_http_nao_e_guardado(servidor, cache):
+    with pytest.raises(requests.HTTPError):
+        cache.obter(servidor.url + '/nao-existe')
+    assert cache.conteudo_local(servidor.url + '/nao-existe') is None
+
+
+def test_metadados_contam_hits_e_misses_separados(cache):
+    assert cache.metadados('http://ex.com/a.jpg') is None
+    cache.salvar_metadados('http://ex.com/a.jpg', {'real_width': 10, 'real_height': 20, 'format': 'PNG'})
+    assert cache.metadados('http://ex.com/a.jpg') == {'real_width': 10, 'real_height': 20, 'format': 'PNG'}
+    e = cache.estatisticas()
+    assert (e['hits_metadados'], e['misses_metadados'], e['hits'], e['misses']) == (1, 1, 0, 0)
+
+
+def test_limite_de_tamanho_descarta_as_entradas_menos_usadas(servidor, tmp_path):
+    cache = CacheHTTP(str(tmp_path / 'cache'), limite_bytes=len(CORPO) * 2)
+    for rota in ('/etag', '/max-age', '/expires'):
+        cache.obter(servidor.url + rota)
+    assert cache.conteudo_local(servidor.url + '/etag') is None
+    assert cache.estatisticas()['bytes_em_disco'] == len(CORPO) * 2
+
+
+def test_cache_antigo_ganha_a_coluna_de_validade(servidor, tmp_path):
+    diretorio = tmp_path / 'cache'
+    diretorio.mkdir()
+    db = sqlite3.connect(str(diretorio / 'indice.sqlite3'))
+    db.execute("CREATE TABLE entradas (url TEXT PRIMARY KEY, url_final TEXT, etag TEXT, last_modified TEXT, "
+               "content_type TEXT, tamanho INTEGER, ultimo_acesso REAL)")
+    db.commit()
+    db.close()
+
+    cache = CacheHTTP(str(diretorio))
+    cache.obter(servidor.url + '/max-age')
+    assert cache.obter(servidor.url + '/max-age').do_cache
+    assert servidor.pedidos == ['/max-age']
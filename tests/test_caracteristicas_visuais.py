@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Arquivo: tests/test_caracteristicas_visuais.py
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from PIL import Image
+
+import caracteristicas_visuais
+from caracteristicas_visuais import ExtratorVisual, DIMENSAO_COR, DIMENSAO_EMBEDDING
+
+
+def _jpeg(tamanho=(1200, 900)):
+    # Gradiente com detalhe fino: a miniatura reduzida pelo 'draft' perde parte dele
+    x = np.linspace(0, 255, tamanho[0], dtype=np.uint8)
+    pixels = np.stack([np.tile(x, (tamanho[1], 1)),
+                       (np.indices(tamanho[::-1]).sum(axis=0) % 7 * 36).astype(np.uint8),
+                       np.full(tamanho[::-1], 90, dtype=np.uint8)], axis=-1)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=95)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def extrator(tmp_path):
+    extrator = ExtratorVisual(str(tmp_path / 'visuais.sqlite3'), max_processos=1)
+    yield extrator
+    extrator.fechar()
+
+
+def test_registrar_usa_os_bytes_completos(extrator):
+    conteudo = _jpeg()
+    extrator.registrar('http://ex.com/a.jpg', conteudo)
+    vetores = extrator.descrever_conteudos({'http://ex.com/b.jpg': conteudo})
+
+    np.testing.assert_array_equal(extrator.conhecidos(['http://ex.com/a.jpg'])['http://ex.com/a.jpg'],
+                                  vetores['http://ex.com/b.jpg'])
+
+
+def test_mesmo_conteudo_em_urls_diferentes_e_descrito_uma_vez(extrator, monkeypatch):
+    conteudo = _jpeg((64, 48))
+    chamadas = []
+    original = caracteristicas_visuais._descrever_lote
+    monkeypatch.setattr(caracteristicas_visuais, '_descrever_lote',
+                        lambda conteudos, usar_embedding=False: chamadas.append(len(conteudos)) or
+                        original(conteudos, usar_embedding))
+    extrator.registrar('http://ex.com/a.jpg', conteudo)
+    extrator.registrar('http://ex.com/b.jpg', conteudo)
+
+    assert chamadas == [1]
+    assert set(extrator.conhecidos(['http://ex.com/a.jpg', 'http://ex.com/b.jpg'])) == {'http://ex.com/a.jpg',
+                                                                                       'http://ex.com/b.jpg'}
+
+
+def test_adicionar_colunas_sem_baixar_deixa_nan_no_que_falta(extrator):
+    extrator.registrar('http://ex.com/a.jpg', _jpeg((64, 48)))
+    df = extrator.adicionar_colunas(pd.DataFrame({'url': ['http://ex.com/a.jpg', 'http://ex.com/x.jpg']}),
+                                    baixar=False)
+
+    assert list(df.columns) == ['url'] + extrator.colunas
+    assert not df.loc[0, extrator.colunas].isna().any()
+    assert df.loc[1, extrator.colunas].isna().all()
+
+
+def test_para_dimensao_segue_o_modelo(extrator):
+    assert extrator.para_dimensao(DIMENSAO_COR) is extrator
+    with pytest.raises(ValueError):
+        extrator.para_dimensao(5)
+    if caracteristicas_visuais.torch is None:
+        with pytest.raises(RuntimeError):
+            extrator.para_dimensao(DIMENSAO_COR + DIMENSAO_EMBEDDING)
+    else:
+        assert extrator.para_dimensao(DIMENSAO_COR + DIMENSAO_EMBEDDING).usar_embedding
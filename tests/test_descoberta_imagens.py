@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Arquivo: tests/test_descoberta_imagens.py
+
+import pytest
+
+import descoberta_imagens
+from descoberta_imagens import DescobridorImagens, maior_do_srcset
+
+BACKENDS = ['html.parser'] + (['lxml'] if descoberta_imagens.etree is not None else [])
+
+PAGINA = """<html><head><title> Galeria de Teste </title>
+<style>.capa { background-image: url('/css/capa.png'); }</style></head>
+<body>
+<div><img src="a.jpg" alt="foto a" width="100px" height="80"></div>
+<a href="#"><img data-src="/lazy/b.png" src="placeholder.gif"></a>
+<img srcset="c-320.jpg 320w, c-1280.jpg 1280w, c-640.jpg 640w">
+<picture><source srcset="d-1x.webp 1x, d-2x.webp 2x"><img src="d.jpg"></picture>
+<div style="background: url(e.gif) no-repeat"></div>
+<img src="data:image/png;base64,AAAA">
+<img src="a.jpg" alt="repetida">
+</body></html>"""
+
+
+def _descobrir(html, backend, tamanho_bloco=None, base_url='http://ex.com/galeria/', **opcoes):
+    dados = html.encode('utf-8') if isinstance(html, str) else html
+    tamanho_bloco = tamanho_bloco or len(dados)
+    descobridor = DescobridorImagens(base_url, backend=backend, **opcoes)
+    imagens = list(descobridor.processar(dados[i:i + tamanho_bloco] for i in range(0, len(dados), tamanho_bloco)))
+    return descobridor, imagens
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_encontra_imagens_de_todas_as_origens(backend):
+    descobridor, imagens = _descobrir(PAGINA, backend)
+
+    assert descobridor.titulo == 'Galeria de Teste' and descobridor.titulo_definido
+    assert sorted(f['url'] for f in imagens) == sorted([
+        'http://ex.com/css/capa.png',
+        'http://ex.com/galeria/a.jpg',
+        'http://ex.com/lazy/b.png',
+        'http://ex.com/galeria/c-1280.jpg',
+        'http://ex.com/galeria/d-2x.webp',
+        'http://ex.com/galeria/d.jpg',
+        'http://ex.com/galeria/e.gif',
+    ])
+    primeira = next(f for f in imagens if f['url'].endswith('/a.jpg'))
+    assert primeira == {'url': 'http://ex.com/galeria/a.jpg', 'extension': '.jpg', 'alt': 'foto a',
+                        'width': '100px', 'height': '80', 'parent_tag': 'div'}
+    assert next(f for f in imagens if f['url'].endswith('/b.png'))['parent_tag'] == 'a'
+    assert next(f for f in imagens if f['url'].endswith('.webp'))['parent_tag'] == 'picture'
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('tamanho_bloco', [1, 7, 64])
+def test_resultado_nao_depende_do_tamanho_dos_blocos(backend, tamanho_bloco):
+    _, inteiro = _descobrir(PAGINA, backend)
+    descobridor, em_blocos = _descobrir(PAGINA, backend, tamanho_bloco)
+
+    assert em_blocos == inteiro
+    assert descobridor.titulo == 'Galeria de Teste'
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_imagens_saem_antes_do_fim_do_documento(backend):
+    descobridor = DescobridorImagens('http://ex.com/', backend=backend)
+    prontas = descobridor.alimentar(b'<html><head><title>T</title></head><body><p><img src="x.png"></p><p>')
+    prontas += descobridor.alimentar(b'mais texto</p>')
+
+    assert [f['url'] for f in prontas] == ['http://ex.com/x.png']
+    assert descobridor.titulo_definido
+    assert descobridor.fechar() == []
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_base_href_e_charset_do_meta(backend):
+    html = ('<html><head><meta charset="iso-8859-1"><base href="http://cdn.ex.com/img/">'
+            '<title>Ação</title></head><body><img src="f.jpg" alt="ça"></body></html>').encode('iso-8859-1')
+    # O charset é procurado no primeiro bloco, como acontece com os blocos de 16 KB da PaginaEmStream
+    descobridor, imagens = _descobrir(html, backend)
+
+    assert descobridor.titulo == 'Ação'
+    assert [(f['url'], f['alt']) for f in imagens] == [('http://cdn.ex.com/img/f.jpg', 'ça')]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_modo_bruto_entrega_tuplas_sem_resolver(backend):
+    _, imagens = _descobrir('<body><div><img src="a.jpg" alt="x" width="10"><img src="a.jpg"></div></body>',
+                            backend, bruto=True)
+
+    assert imagens == [('http://ex.com/galeria/', 'a.jpg', 'x', '10', None, 'div'),
+                       ('http://ex.com/galeria/', 'a.jpg', '', None, None, 'div')]
+
+
+def test_maior_do_srcset():
+    assert maior_do_srcset('a.jpg 1x, b.jpg 2x') == 'b.jpg'
+    assert maior_do_srcset('a.jpg 320w, b.jpg 1280w, c.jpg 640w') == 'b.jpg'
+    assert maior_do_srcset('a.jpg') == 'a.jpg'
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Arquivo: tests/test_extrator_ia.py
+
+import io
+
+import pytest
+from PIL import Image
+
+from extrator_ia import ler_cabecalho_imagem
+
+
+def _imagem(formato, tamanho=(37, 23), **opcoes):
+    buffer = io.BytesIO()
+    Image.new('RGB', tamanho, (200, 30, 90)).save(buffer, formato, **opcoes)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('formato, opcoes', [
+    ('PNG', {}),
+    ('GIF', {}),
+    ('BMP', {}),
+    ('JPEG', {}),
+    ('JPEG', {'progressive': True}),
+    ('WEBP', {}),
+    ('WEBP', {'lossless': True}),
+])
+def test_le_dimensoes_e_formato(formato, opcoes):
+    assert ler_cabecalho_imagem(_imagem(formato, **opcoes)) == (37, 23, formato)
+
+
+def test_jpeg_com_exif_grande_antes_do_sof():
+    exif = Image.Exif()
+    exif[0x010E] = 'x' * 20000  # ImageDescription: empurra o SOF para depois de 20 KB
+    dados = _imagem('JPEG', (640, 480), exif=exif.tobytes())
+
+    assert ler_cabecalho_imagem(dados[:16 * 1024]) is None
+    assert ler_cabecalho_imagem(dados) == (640, 480, 'JPEG')
+
+
+@pytest.mark.parametrize('formato', ['PNG', 'GIF', 'BMP', 'JPEG', 'WEBP'])
+def test_bytes_insuficientes_devolvem_none(formato):
+    assert ler_cabecalho_imagem(_imagem(formato)[:8]) is None
+
+
+def test_formato_desconhecido_devolve_none():
+    assert ler_cabecalho_imagem(b'<html><body>404</body></html>') is None
+    assert ler_cabecalho_imagem(b'') is None
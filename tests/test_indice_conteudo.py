@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Arquivo: tests/test_indice_conteudo.py
+
+import hashlib
+import random
+
+import pytest
+from PIL import Image
+
+from indice_conteudo import IndiceConteudo, ArvoreBK, caminho_livre, dhash_do_arquivo, dhash_degenerado
+
+
+def _salvar(caminho, imagem, formato='PNG'):
+    imagem.save(caminho, formato)
+    with open(caminho, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _ruido(semente, tamanho=(64, 64)):
+    gerador = random.Random(semente)
+    imagem = Image.new('L', tamanho)
+    imagem.putdata([gerador.randrange(256) for _ in range(tamanho[0] * tamanho[1])])
+    return imagem.resize((256, 256)).convert('RGB')
+
+
+@pytest.fixture
+def indice(tmp_path):
+    indice = IndiceConteudo(str(tmp_path / 'indice.sqlite3'))
+    yield indice
+    indice.fechar()
+
+
+def _gravar(indice, tmp_path, nome, imagem, formato='PNG'):
+    tmp = tmp_path / f"{nome}.part"
+    sha256 = _salvar(tmp, imagem, formato)
+    return indice.gravar_se_novo(f"http://ex.com/{nome}", str(tmp), sha256, str(tmp_path / nome))
+
+
+def test_caminho_livre_acrescenta_sufixo(tmp_path):
+    ocupados = {'a/foto.png', 'a/foto_abc.png'}
+    assert caminho_livre('a/nova.png', 'abc', ocupados.__contains__) == 'a/nova.png'
+    assert caminho_livre('a/foto.png', 'abc', ocupados.__contains__) == 'a/foto_abc_2.png'
+
+
+def test_arvore_bk_devolve_todos_os_itens_do_raio_em_ordem():
+    arvore = ArvoreBK()
+    for valor in (0b0000, 0b0001, 0b0011, 0b1111, 0b0111):
+        arvore.adicionar(valor, bin(valor))
+    assert arvore.dentro_do_raio(0b0000, 2) == [(0, '0b0'), (1, '0b1'), (2, '0b11')]
+    assert arvore.dentro_do_raio(0b1000, 0) == []
+
+
+def test_duplicata_exata_e_quase_duplicata_nao_sao_gravadas(indice, tmp_path):
+    original, duplicata = _gravar(indice, tmp_path, 'a.png', _ruido(1))
+    assert not duplicata
+
+    assert _gravar(indice, tmp_path, 'b.png', _ruido(1)) == (original, True)
+    # Mesmo conteúdo recomprimido em JPEG: bytes diferentes, dHash próximo
+    assert _gravar(indice, tmp_path, 'c.jpg', _ruido(1), 'JPEG') == (original, True)
+    assert indice.duplicadas == 1 and indice.quase_duplicadas == 1
+    assert indice.caminho_da_url('http://ex.com/c.jpg') == original
+
+    novo, duplicata = _gravar(indice, tmp_path, 'd.png', _ruido(2))
+    assert not duplicata and novo != original
+
+
+def test_quase_duplicata_ignora_arquivos_apagados(indice, tmp_path):
+    apagado, _ = _gravar(indice, tmp_path, 'a.png', _ruido(1))
+    # Recomprimida em JPEG, a segunda cópia entra no índice (e na árvore) com o mesmo dHash
+    indice.distancia_maxima = -1
+    mantido, _ = _gravar(indice, tmp_path, 'b.jpg', _ruido(1), 'JPEG')
+    indice.distancia_maxima = 6
+    (tmp_path / 'a.png').unlink()
+
+    # O item mais próximo (a.png) não existe mais; b.jpg ainda está dentro do raio
+    assert _gravar(indice, tmp_path, 'c.png', _ruido(1).rotate(0.5)) == (mantido, True)
+
+
+def test_imagens_lisas_nao_sao_quase_duplicatas_umas_das_outras(indice, tmp_path):
+    vermelha, _ = _gravar(indice, tmp_path, 'vermelha.png', Image.new('RGB', (50, 50), (255, 0, 0)))
+    assert dhash_degenerado(dhash_do_arquivo(vermelha))
+
+    azul, duplicata = _gravar(indice, tmp_path, 'azul.png', Image.new('RGB', (80, 30), (0, 0, 255)))
+    assert not duplicata and azul != vermelha
+    # A cópia exata continua sendo reconhecida pelo SHA-256
+    assert _gravar(indice, tmp_path, 'azul2.png', Image.new('RGB', (80, 30), (0, 0, 255))) == (azul, True)
+
+
+def test_nome_repetido_com_conteudo_diferente_nao_sobrescreve(indice, tmp_path):
+    primeiro, _ = _gravar(indice, tmp_path, 'foto.png', _ruido(1))
+    tmp = tmp_path / 'outra.part'
+    sha256 = _salvar(tmp, _ruido(3))
+    segundo, duplicata = indice.gravar_se_novo('http://ex.com/foto.png?id=2', str(tmp), sha256,
+                                               str(tmp_path / 'foto.png'))
+
+    assert not duplicata and segundo != primeiro
+    assert segundo.endswith(f"foto_{sha256[:8]}.png")
+    assert dhash_do_arquivo(primeiro) != dhash_do_arquivo(segundo)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Arquivo: tests/test_lote.py
+
+import time
+import asyncio
+import threading
+
+from lote import AgendadorLote, Checkpoint
+
+
+def _executar(agendador, urls, duracao=0.0):
+    async def principal():
+        inicio = asyncio.get_running_loop().time()
+        fim = {}
+
+        async def requisitar(url):
+            await agendador.requisitar(url, time.sleep, duracao)
+            fim[url] = asyncio.get_running_loop().time() - inicio
+
+        await asyncio.gather(*(requisitar(url) for url in urls))
+        return fim
+
+    return asyncio.run(principal())
+
+
+def test_dominio_lento_nao_prende_as_vagas_globais():
+    agendador = AgendadorLote(max_concorrencia=4, max_por_dominio=1, atraso_por_dominio=0.2)
+    fim = _executar(agendador, [f"http://a.com/{i}" for i in range(6)] + ["http://b.com/x"])
+
+    assert fim["http://b.com/x"] < 0.1
+    assert fim["http://a.com/5"] >= 1.0  # Cinco intervalos de cortesia no mesmo domínio
+
+
+def test_limite_global_de_concorrencia():
+    agendador = AgendadorLote(max_concorrencia=2, max_por_dominio=4, atraso_por_dominio=0)
+    em_andamento, maximo = [0], [0]
+    trava = threading.Lock()
+
+    def requisicao():
+        with trava:
+            em_andamento[0] += 1
+            maximo[0] = max(maximo[0], em_andamento[0])
+        time.sleep(0.05)
+        with trava:
+            em_andamento[0] -= 1
+
+    async def principal():
+        await asyncio.gather(*(agendador.requisitar(f"http://{d}.com/", requisicao) for d in 'abcdef'))
+
+    asyncio.run(principal())
+    assert maximo[0] == 2
+
+
+def test_checkpoint_persiste_as_paginas_concluidas(tmp_path):
+    caminho = str(tmp_path / 'lote.checkpoint')
+    checkpoint = Checkpoint(caminho)
+    checkpoint.registrar('http://ex.com/1')
+    checkpoint.fechar()
+
+    retomado = Checkpoint(caminho)
+    assert 'http://ex.com/1' in retomado and 'http://ex.com/2' not in retomado
+    retomado.fechar()
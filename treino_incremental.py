@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Arquivo: treino_incremental.py
+
+# Treinamento incremental: um featurizador sem estado (hashing) e um
+# classificador com partial_fit, de modo que cada treino processe só as
+# linhas rotuladas desde o treino anterior. O ponto do dataset até onde o
+# modelo já aprendeu fica em '<modelo>.incremental.json'.
+#
+# Observação: o aprendizado online não "desaprende" um rótulo antigo quando
+# uma URL é rotulada de novo; para isso use --refazer (ajuste completo).
+
+import os
+import json
+import time
+import functools
+import joblib
+import numpy as np
+from scipy import sparse
+from sklearn.pipeline import Pipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import FunctionTransformer
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.utils.class_weight import compute_sample_weight
+
+from metricas import METRICAS
+from agendador import verificar_cancelamento
+from armazenamento_dataset import DatasetSegmentado, carregar_dataset
+from extrator_ia import (preparar_dados_treino, criar_pipeline, clean_dataframe, colunas_numericas_do_modelo,
+                         SUFIXO_ESTADO_INCREMENTAL)
+
+CLASSES = np.array([0, 1])
+
+
+def _dimensoes_em_log(X):
+    """Escala fixa (sem estado) para as dimensões: log1p, com ausentes valendo 0."""
+    return np.log1p(X.astype(float).fillna(0).clip(lower=0).to_numpy())
+
+
+def _categorias_como_texto(X):
+    """Transforma as colunas categóricas em tokens 'coluna=valor' para o hashing."""
+    partes = [col + '=' + X[col].fillna('').astype(str) for col in X.columns]
+    return functools.reduce(lambda a, b: a + ' ' + b, partes).tolist()
+
+
+def criar_pipeline_incremental(numerical_features):
+    """Pipeline com pré-processamento sem estado e SGDClassifier (regressão logística online)."""
+    categorical_features = ['extension', 'parent_tag']
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ('num', FunctionTransformer(_dimensoes_em_log), numerical_features),
+            ('cat', Pipeline([
+                ('texto', FunctionTransformer(_categorias_como_texto)),
+                ('hash', HashingVectorizer(n_features=2 ** 8, token_pattern=r'\S+', lowercase=False,
+                                           alternate_sign=False)),
+            ]), categorical_features),
+            ('url_text', HashingVectorizer(n_features=2 ** 12, alternate_sign=False), 'url'),
+            ('alt_text', HashingVectorizer(n_features=2 ** 10, alternate_sign=False), 'alt')
+        ],
+        remainder='drop'
+    )
+    return Pipeline(steps=[
+        ('preprocessor', preprocessor),
+        ('classifier', SGDClassifier(loss='log_loss', alpha=1e-4, random_state=42))
+    ])
+
+
+def ajustar_em_epocas(modelo, X, y, epocas=5, primeira_vez=False):
+    """Passa 'epocas' vezes pelas linhas com partial_fit, pesando as classes pelo lote ('balanced')."""
+    preprocessor = modelo.named_steps['preprocessor']
+    if primeira_vez:
+        preprocessor.fit(X)  # Sem estado: só registra as colunas de entrada
+    Xt = sparse.csr_matrix(preprocessor.transform(X))
+    y = np.asarray(y)
+    pesos = compute_sample_weight('balanced', y)
+    rng = np.random.default_rng(42)
+    for _ in range(epocas):
+        verificar_cancelamento()
+        ordem = rng.permutation(len(y))
+        modelo.named_steps['classifier'].partial_fit(Xt[ordem], y[ordem], classes=CLASSES,
+                                                     sample_weight=pesos[ordem])
+    return modelo
+
+
+def _ler_estado(model_path):
+    caminho = model_path + SUFIXO_ESTADO_INCREMENTAL
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _salvar_estado(model_path, estado):
+    with open(model_path + SUFIXO_ESTADO_INCREMENTAL, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2)
+
+
+def treinar_modelo_incremental(dataset_path='dataset', model_path='image_model.joblib', refazer=False, epocas=5):
+    """
+    Modo de Treinamento Incremental: atualiza o modelo só com as linhas gravadas no dataset
+    segmentado desde o último treino. Faz o ajuste completo quando não há estado anterior,
+    quando o modelo salvo não suporta partial_fit, quando o dataset é um CSV ou com 'refazer'.
+    """
+    print(f"--- Modo de Treinamento Incremental: Usando '{dataset_path}' ---")
+    try:
+        segmentado = os.path.isdir(dataset_path)
+        dataset = DatasetSegmentado(dataset_path) if segmentado else None
+        # O limite é lido antes das linhas para que nada gravado durante o treino fique para trás
+        limite_seq = dataset.ultimo_seq() if segmentado else None
+        estado = _ler_estado(model_path)
+        modelo = joblib.load(model_path) if estado and os.path.exists(model_path) else None
+
+        pode_incrementar = (not refazer and segmentado and modelo is not None
+                            and estado.get('ultimo_seq') is not None
+                            and estado.get('dataset') == os.path.abspath(dataset_path)
+                            and hasattr(modelo.named_steps['classifier'], 'partial_fit'))
+
+        if pode_incrementar:
+            df = dataset.ler(desde_seq=estado['ultimo_seq'], incluir_seq=True)
+            df = df[df['_seq'] <= limite_seq].drop(columns='_seq')
+            if df.empty:
+                print("Nenhuma linha nova desde o último treino. O modelo já está atualizado.")
+                return
+            df = clean_dataframe(df)
+            y = df['selected'].astype(int)
+            X = df.drop('selected', axis=1)
+            for col in colunas_numericas_do_modelo(modelo):
+                if col not in X.columns:
+                    X[col] = np.nan
+            with METRICAS.cronometrar('treino'):
+                ajustar_em_epocas(modelo, X, y, epocas)
+            print(f"Modelo atualizado com {len(df)} linha(s) nova(s) (partial_fit).")
+        else:
+            print("Fazendo o ajuste completo do modelo incremental...")
+            df = dataset.ler() if segmentado else carregar_dataset(dataset_path)
+            if df['selected'].nunique() < 2:
+                print("Erro: O dataset precisa conter exemplos de imagens selecionadas (1) e não selecionadas (0).")
+                return
+            X, y, numerical_features = preparar_dados_treino(df)
+            modelo = criar_pipeline_incremental(numerical_features)
+            with METRICAS.cronometrar('treino'):
+                ajustar_em_epocas(modelo, X, y, epocas, primeira_vez=True)
+
+        joblib.dump(modelo, model_path)
+        _salvar_estado(model_path, {'dataset': os.path.abspath(dataset_path), 'ultimo_seq': limite_seq})
+        print(f"--- Sucesso! Modelo incremental salvo como '{model_path}' ---")
+
+    except FileNotFoundError:
+        print(f"Erro: Arquivo de dataset '{dataset_path}' não encontrado. Execute o modo de coleta primeiro.")
+    except Exception as e:
+        print(f"Ocorreu um erro no treinamento incremental: {e}")
+
+
+def comparar_treinamentos(dataset_path='dataset', test_size=0.25, lotes=4, epocas=5):
+    """
+    Relatório comparando o modelo completo (TF-IDF + LogisticRegression) com o incremental.
+    O incremental é ajustado na primeira metade do treino e recebe o resto em 'lotes' partial_fits,
+    simulando sessões de rotulagem sucessivas. Ambos são avaliados no mesmo conjunto de teste.
+    """
+    print(f"--- Comparação de Treinamentos: Usando '{dataset_path}' ---")
+    try:
+        X, y, numerical_features = preparar_dados_treino(carregar_dataset(dataset_path))
+        X_treino, X_teste, y_treino, y_teste = train_test_split(X, y, test_size=test_size, stratify=y,
+                                                                random_state=42)
+
+        inicio = time.perf_counter()
+        completo = criar_pipeline(numerical_features).fit(X_treino, y_treino)
+        tempo_completo = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        incremental = criar_pipeline_incremental(numerical_features)
+        metade = len(X_treino) // 2
+        ajustar_em_epocas(incremental, X_treino.iloc[:metade], y_treino.iloc[:metade], epocas, primeira_vez=True)
+        for indices in np.array_split(np.arange(metade, len(X_treino)), lotes):
+            if len(indices):
+                ajustar_em_epocas(incremental, X_treino.iloc[indices], y_treino.iloc[indices], epocas)
+        tempo_incremental = time.perf_counter() - inicio
+
+        relatorio = {}
+        for nome, modelo, tempo in (('completo', completo, tempo_completo),
+                                    ('incremental', incremental, tempo_incremental)):
+            previsto = modelo.predict(X_teste)
+            relatorio[nome] = {'acuracia': accuracy_score(y_teste, previsto),
+                               'f1': f1_score(y_teste, previsto, zero_division=0),
+                               'segundos_treino': tempo}
+            print(f"  {nome:<12} acurácia={relatorio[nome]['acuracia']:.3f}  f1={relatorio[nome]['f1']:.3f}  "
+                  f"treino={tempo:.2f}s")
+        print(f"--- Diferença de acurácia (incremental - completo): "
+              f"{relatorio['incremental']['acuracia'] - relatorio['completo']['acuracia']:+.3f} ---")
+        return relatorio
+
+    except FileNotFoundError:
+        print(f"Erro: Arquivo de dataset '{dataset_path}' não encontrado. Execute o modo de coleta primeiro.")
+    except Exception as e:
+        print(f"Ocorreu um erro na comparação: {e}")